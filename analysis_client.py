@@ -0,0 +1,72 @@
+# analysis_client.py
+
+import json
+import argparse
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION ---
+# Kept in sync with analysis_server.py; not imported from there so the client stays free of model dependencies
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+def request_analysis(url: str, collection: str, persona: str = None, job: str = None, output_file: str = None, timeout: float = 600):
+    """Sends one analysis request to a running analysis server and returns (status, response, round-trip seconds)."""
+    payload = {"collection": collection}
+    if persona:
+        payload["persona"] = persona
+    if job:
+        payload["job_to_be_done"] = job
+    if output_file:
+        payload["output_file"] = output_file
+
+    req = urllib.request.Request(
+        f"{url}/analyze",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, body = resp.status, json.load(resp)
+    except urllib.error.HTTPError as e:
+        status, body = e.code, json.load(e)
+    return status, body, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Send collection analysis requests to a running analysis server.")
+    parser.add_argument("collections", nargs="+", help="Collection directories to analyze (e.g., 'Collection 1').")
+    parser.add_argument("--persona", help="Override the persona role from the collection's input.json.")
+    parser.add_argument("--job", help="Override the job-to-be-done task from the collection's input.json.")
+    parser.add_argument("--output-file", help="Write the result here instead of the collection's output.json; relative to the collection directory, which the path may not leave.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of requests in flight at once.")
+    parser.add_argument("--repeat", type=int, default=1, help="Send each collection this many times (load testing).")
+    args = parser.parse_args()
+
+    url = f"http://{args.host}:{args.port}"
+    collections = args.collections * args.repeat
+
+    def send(collection):
+        return collection, request_analysis(url, collection, args.persona, args.job, args.output_file)
+
+    round_trips = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for collection, (status, body, round_trip) in pool.map(send, collections):
+            round_trips.append(round_trip)
+            latency = body.get("latency") or {}
+            outcome = "ok" if status == 200 else f"HTTP {status}: {body.get('error')}"
+            print(f"{collection}: {outcome} | round trip {round_trip:.2f}s, "
+                  f"queued {latency.get('queue_wait_s', 0):.2f}s, run {latency.get('run_s', 0):.2f}s")
+
+    if len(round_trips) > 1:
+        print(f"\n{len(round_trips)} requests, concurrency {args.concurrency}: "
+              f"mean {statistics.mean(round_trips):.2f}s, max {max(round_trips):.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,135 +1,372 @@
 # analysis_logic.py
 
-from sentence_transformers import SentenceTransformer, util
-from llama_cpp import Llama
 import json
-import os
+import time
 from datetime import datetime
 from pathlib import Path
-import torch
+
+from verification_logic import (VerificationScheduler, YesNoScorer, LLMWorkerPool, LLM_RELEVANCE_THRESHOLD,
+                                AUTO_ACCEPT_SCORE, AUTO_REJECT_SCORE)
+from result_cache import open_result_caches, hash_key
+from lexical_index import hybrid_search, HYBRID_SHORTLIST
+from prompt_builder import (PromptBuilder, EXCERPT_TOKEN_BUDGET, PACK_SHORT_EXCERPTS, PACK_TOKEN_BUDGET, MAX_PACKED_ITEMS,
+                            SHORT_EXCERPT_TOKENS)
+from cpu_budget import allocate
+import initialize_model
+import pipeline_profiler
 
 # --- CONFIGURATION ---
 EMBEDDING_MODEL_PATH = './models/embedding_model'
 LLM_MODEL_PATH = "./models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"
 LLM_CONTEXT_SIZE = 4096
 NUM_RESULTS_TO_FETCH = 15 # Fetch more results to give the LLM a good selection
+NUM_RESULTS_TO_RETURN = 5 # Verification stops once this many sections are confirmed relevant
+# "logits": score P(Yes) in one forward pass reusing the cached prompt prefix; "generate": sample an answer
+LLM_VERIFIER = "logits"
+RANK_BY_LLM_SCORE = False # Order confirmed sections by the LLM's P(Yes) instead of search rank (logits only)
+# With more than one worker, verification runs in that many processes, each with its own model
+LLM_WORKERS = 1
+LLM_THREADS_PER_WORKER = None # None splits the CPU budget evenly between the workers
+# "dense": cosine search over every chunk; "hybrid": BM25 prefilter, then cosine scoring of the shortlist only
+RETRIEVAL_MODE = "dense"
+HYBRID_FUSION = None # None orders the shortlist by cosine similarity; "rrf" fuses the BM25 and dense ranks
+# Reuse the final output of an identical earlier request, and the LLM verdicts of sections seen before
+USE_RESULT_CACHE = True
+ANALYSIS_VERSION = "1" # Bump whenever a change to the analysis can change its output for the same inputs
 
-def run_analysis(challenge_id: str, persona_dict: dict, job_dict: dict, document_list: list, in_memory_db: dict, output_file_path: str):
-    
-    # --- Step 1: Load Models ---
-    print("\nStep 1: Loading models for analysis...")
-    embedding_model = SentenceTransformer(EMBEDDING_MODEL_PATH, device='cpu')
-    llm = Llama(
+def load_embedding_model():
+    """Loads the sentence embedding model used for search (and, when shared, for ingestion)."""
+    # Heavy dependencies (torch, sentence_transformers, llama_cpp) are imported by the stage that uses them
+    if initialize_model.QUANTIZED_EMBEDDING_MODEL:
+        return initialize_model.load_quantized_embedding_model()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_PATH, device='cpu')
+
+def load_llm():
+    """
+    Loads the TinyLlama model used to verify search results, or a pool of worker processes
+    that each load it when LLM_WORKERS > 1.
+    """
+    if LLM_WORKERS > 1:
+        return LLMWorkerPool(LLM_MODEL_PATH, LLM_CONTEXT_SIZE, LLM_WORKERS, LLM_THREADS_PER_WORKER)
+    from llama_cpp import Llama
+    n_threads = allocate("llm_threads")
+    return Llama(
         model_path=LLM_MODEL_PATH,
         n_ctx=LLM_CONTEXT_SIZE,
-        n_threads=max(os.cpu_count() - 1, 1),
+        n_threads=n_threads,
+        n_threads_batch=n_threads,
         n_gpu_layers=0,
         verbose=False
     )
 
-    # --- Step 2: Generate a Highly Specific Search Query ---
-    # This is a major improvement to get more relevant results
-    print("Step 2: Generating a specific search query...")
+def analysis_settings(in_memory_db: dict) -> dict:
+    """Every setting that shapes the output for a given corpus, persona and job; part of the output cache key."""
+    return {
+        "version": ANALYSIS_VERSION,
+        "embedding_model": EMBEDDING_MODEL_PATH,
+        "embedding_quantized": initialize_model.QUANTIZED_EMBEDDING_MODEL,
+        "llm": Path(LLM_MODEL_PATH).name,
+        "verifier": LLM_VERIFIER,
+        "rank_by_llm_score": RANK_BY_LLM_SCORE,
+        "results": [NUM_RESULTS_TO_FETCH, NUM_RESULTS_TO_RETURN],
+        "thresholds": [AUTO_ACCEPT_SCORE, AUTO_REJECT_SCORE, LLM_RELEVANCE_THRESHOLD],
+        "index": in_memory_db['index'].kind if 'index' in in_memory_db else None,
+        "retrieval": [RETRIEVAL_MODE, HYBRID_FUSION, HYBRID_SHORTLIST],
+        "prompt": [EXCERPT_TOKEN_BUDGET, PACK_SHORT_EXCERPTS, PACK_TOKEN_BUDGET, MAX_PACKED_ITEMS, SHORT_EXCERPT_TOKENS],
+    }
+
+def with_verdict_cache(verify_batch, verdict_cache, prompt_hash, prompt_suffix, llm_scores, packed_ids=()):
+    """
+    Returns (cached_verdicts, storing_verify_batch) for the VerificationScheduler: sections whose
+    prompt was verified before reuse the stored verdict (and P(Yes)), and the verdicts of the
+    others are stored as `verify_batch` returns them. Sections in `packed_ids` were judged next to
+    other excerpts, so their verdicts do not belong to their own prompt and are not stored.
+    """
+    def cache_key(result):
+        return hash_key(prompt_hash, prompt_suffix(result))
+
+    def cached_verdicts(results):
+        keys = [cache_key(r) for r in results]
+        cached = verdict_cache.get_many(keys)
+        verdicts = []
+        for result, key in zip(results, keys):
+            entry = cached.get(key)
+            if entry is None:
+                verdicts.append(None)
+            elif entry["p_yes"] is None:
+                verdicts.append(entry["relevant"])
+            else:
+                # The threshold is applied again, since it is not part of the key
+                llm_scores[result['corpus_id']] = entry["p_yes"]
+                verdicts.append(entry["p_yes"] >= LLM_RELEVANCE_THRESHOLD)
+        return verdicts
+
+    def storing_verify_batch(results):
+        verdicts = verify_batch(results)
+        verdict_cache.put_many({cache_key(r): {"p_yes": llm_scores.get(r['corpus_id']), "relevant": bool(verdict)}
+                                for r, verdict in zip(results, verdicts) if r['corpus_id'] not in packed_ids})
+        return verdicts
+    return cached_verdicts, storing_verify_batch
+
+def write_output(final_output: dict, output_file_path: str):
+    output_path = Path(output_file_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with pipeline_profiler.stage("write_output"), open(output_path, "w", encoding="utf-8") as f:
+        json.dump(final_output, f, indent=4)
+        
+    print(f"\n--- Success! ---")
+    print(f"Analysis complete. Output saved to: {output_path}")
+
+def run_analysis(challenge_id: str, persona_dict: dict, job_dict: dict, document_list: list, in_memory_db: dict, output_file_path: str,
+                 embedding_model=None, llm=None):
+    """
+    Searches the ingested chunks for the persona's job, verifies the hits with the LLM and writes
+    the result to `output_file_path`. Already-loaded models can be passed in (e.g. by the analysis
+    server) to skip loading them. Returns the output dict.
+    """
     persona = persona_dict.get("role")
     task = job_dict.get("task")
-    search_query = f"As a {persona}, I need to find the best activities, locations, food, and logistics for a {task}. I am looking for information on nightlife, group activities, beaches, city guides, and affordable restaurants suitable for young adults."
-    print(f"  - Generated Query: {search_query}")
-
-    # --- Step 3: Perform Semantic Search ---
-    print(f"Step 3: Searching for the top {NUM_RESULTS_TO_FETCH} most relevant document sections...")
-    query_embedding = embedding_model.encode(search_query, convert_to_tensor=True)
-    search_results = util.semantic_search(
-        query_embedding, 
-        in_memory_db['embeddings'], 
-        top_k=NUM_RESULTS_TO_FETCH
-    )[0]
-
-    # --- Step 4: Use LLM to Verify Results and Extract Text ---
-    print(f"Step 4: Using LLM to verify {len(search_results)} sections and extract text...")
+
+    # --- Cached Result: the same corpus, persona and job were analyzed before ---
+    output_cache = verdict_cache = None
+    if USE_RESULT_CACHE:
+        output_cache, verdict_cache = open_result_caches()
+        with pipeline_profiler.stage("result_cache"):
+            output_key = hash_key(in_memory_db['corpus_key'], persona, task,
+                                  [d["filename"] for d in document_list], analysis_settings(in_memory_db))
+            cached_output = output_cache.get(output_key)
+        print(f"\nResult cache: {'hit' if cached_output is not None else 'miss'} "
+              f"({output_cache.stats['hits']} hits, {output_cache.stats['misses']} misses in this process)")
+        if cached_output is not None:
+            print("Skipping search and verification; this corpus, persona and job were analyzed before.")
+            cached_output["metadata"]["processing_timestamp"] = datetime.now().isoformat()
+            write_output(cached_output, output_file_path)
+            return cached_output
+
+    # --- Step 1: Load Models ---
+    print("\nStep 1: Loading models for analysis...")
+    with pipeline_profiler.stage("load_models"):
+        if embedding_model is None:
+            embedding_model = load_embedding_model()
+        # A model loaded here belongs to this call and is closed when it ends (a worker pool's processes exit)
+        owns_llm = llm is None
+        if owns_llm:
+            llm = load_llm()
+
+    try:
+        # --- Step 2: Generate a Highly Specific Search Query ---
+        # This is a major improvement to get more relevant results
+        print("Step 2: Generating a specific search query...")
+        search_query = f"As a {persona}, I need to find the best activities, locations, food, and logistics for a {task}. I am looking for information on nightlife, group activities, beaches, city guides, and affordable restaurants suitable for young adults."
+        print(f"  - Generated Query: {search_query}")
+
+        # --- Step 3: Perform Semantic Search ---
+        print(f"Step 3: Searching for the top {NUM_RESULTS_TO_FETCH} most relevant document sections...")
+        if 'index' in in_memory_db:
+            # The vector index built at ingestion time (exact by default, IVF for large corpora)
+            with pipeline_profiler.stage("query_embedding"):
+                query_embedding = embedding_model.encode(search_query)
+            with pipeline_profiler.stage("search"):
+                search_results = None
+                if RETRIEVAL_MODE == "hybrid" and 'lexical_index' in in_memory_db:
+                    search_results = hybrid_search(in_memory_db['lexical_index'], in_memory_db['embeddings'], search_query,
+                                                   query_embedding, NUM_RESULTS_TO_FETCH, fusion=HYBRID_FUSION)
+                    if search_results is None:
+                        print("  - Too few keyword matches for the hybrid search; searching all sections instead.")
+                elif RETRIEVAL_MODE == "hybrid":
+                    print("  - No lexical index was built at ingestion; searching all sections instead.")
+                if search_results is None:
+                    search_results = in_memory_db['index'].search(query_embedding, top_k=NUM_RESULTS_TO_FETCH)
+        else:
+            from sentence_transformers import util
+            with pipeline_profiler.stage("query_embedding"):
+                query_embedding = embedding_model.encode(search_query, convert_to_tensor=True)
+            with pipeline_profiler.stage("search"):
+                search_results = util.semantic_search(
+                    query_embedding, 
+                    in_memory_db['embeddings'], 
+                    top_k=NUM_RESULTS_TO_FETCH
+                )[0]
+
+        # --- Step 4: Use LLM to Verify Results and Extract Text ---
+        print(f"Step 4: Using LLM to verify {len(search_results)} sections and extract text...")
     
-    final_sections_metadata = []
-    all_subsection_analysis = []
+        final_sections_metadata = []
+        relevance_scores = []
+        relevant_subsection_analysis = [] # One entry per confirmed section, in step with final_sections_metadata
     
-    # This prompt is more targeted to the specific task
-    system_prompt = "You are a travel planner. Your goal is to plan a fun trip for college friends. Evaluate if the following text is useful for this goal."
+        # This prompt is more targeted to the specific task
+        system_prompt = "You are a travel planner. Your goal is to plan a fun trip for college friends. Evaluate if the following text is useful for this goal."
+        question = "Is this text useful for planning a 4-day trip for college friends focused on activities, food, and nightlife? Answer only 'Yes' or 'No'."
+        packed_question = "Is Excerpt {number} useful for planning a 4-day trip for college friends focused on activities, food, and nightlife? Answer only 'Yes' or 'No'."
+        # The prefix is identical for every section, so the logit scorer evaluates it only once
+        prompt_prefix = f"<|system|>\n{system_prompt}</s>\n<|user|>\n"
+        # Chunk text is cut to a token budget, counted with the LLM's tokenizer, before it goes into a prompt
+        builder = PromptBuilder(lambda text: llm.tokenize(text.encode("utf-8"), add_bos=False),
+                                in_memory_db['chunks'], embedding_model, query_embedding, EXCERPT_TOKEN_BUDGET)
 
-    for i, result in enumerate(search_results):
-        chunk_index = result['corpus_id']
-        chunk_text = in_memory_db['documents'][chunk_index]
-        metadata = in_memory_db['metadatas'][chunk_index]
-        
-        prompt = f"""
-        <|system|>
-        {system_prompt}</s>
-        <|user|>
-        Excerpt from document '{metadata['source_pdf']}':
-        ---
-        {chunk_text}
-        ---
-        Is this text useful for planning a 4-day trip for college friends focused on activities, food, and nightlife? Answer only 'Yes' or 'No'.</s>
-        <|assistant|>
-        """
-        
-        llm_output = llm(prompt, max_tokens=8, temperature=0.0, stop=["</s>", "\n"])
-        answer = llm_output['choices'][0]['text'].strip().lower()
+        def prompt_suffix(result):
+            excerpt = builder.excerpt(result['corpus_id'])
+            metadata = in_memory_db['chunks'].metadata(result['corpus_id'])
+            return f"Excerpt from document '{metadata['source_pdf']}':\n---\n{excerpt}\n---\n{question}</s>\n<|assistant|>\n"
+
+        def packed_prompt(results):
+            """The excerpts of `results` as one numbered block, and the question for each excerpt."""
+            excerpts = "".join(f"Excerpt {number} from document '{in_memory_db['chunks'].metadata(r['corpus_id'])['source_pdf']}':\n"
+                               f"---\n{builder.excerpt(r['corpus_id'])}\n---\n" for number, r in enumerate(results, 1))
+            return excerpts, [f"{packed_question.format(number=number)}</s>\n<|assistant|>\n" for number in range(1, len(results) + 1)]
+
+        llm_scores = {}
+        packed_ids = set() # Sections scored in a packed group, whose verdict depends on the other excerpts
+        scorer = None
+        if isinstance(llm, LLMWorkerPool):
+            pool_stats_before = dict(llm.stats)
+
+            def verify_batch(results):
+                verdicts = llm.verify(LLM_VERIFIER, prompt_prefix, [prompt_suffix(r) for r in results])
+                for result, (p_yes, _) in zip(results, verdicts):
+                    if p_yes is not None:
+                        llm_scores[result['corpus_id']] = p_yes
+                return [verdict for _, verdict in verdicts]
+            batch_size = llm.num_workers
+        else:
+            if LLM_VERIFIER == "logits":
+                scorer = YesNoScorer(llm, prompt_prefix)
+
+                def verify_batch(results):
+                    if PACK_SHORT_EXCERPTS:
+                        groups = builder.pack(results, PACK_TOKEN_BUDGET, MAX_PACKED_ITEMS, SHORT_EXCERPT_TOKENS)
+                    else:
+                        groups = [[r] for r in results]
+                    # A packed group evaluates its excerpts once and then one short question per section
+                    for group in groups:
+                        if len(group) == 1:
+                            p_yes = [scorer.score(prompt_suffix(group[0]))]
+                        else:
+                            p_yes = scorer.score_many(*packed_prompt(group))
+                            packed_ids.update(r['corpus_id'] for r in group)
+                        for result, p in zip(group, p_yes):
+                            llm_scores[result['corpus_id']] = p
+                    return [llm_scores[r['corpus_id']] >= LLM_RELEVANCE_THRESHOLD for r in results]
+                batch_size = MAX_PACKED_ITEMS if PACK_SHORT_EXCERPTS else 1
+            else:
+                def ask_llm(result):
+                    start = time.perf_counter()
+                    llm_output = llm(prompt_prefix + prompt_suffix(result), max_tokens=8, temperature=0.0, stop=["</s>", "\n"])
+                    pipeline_profiler.record("llm_call", mode="generate", prompt_tokens=llm_output['usage']['prompt_tokens'],
+                                             generated_tokens=llm_output['usage']['completion_tokens'], seconds=time.perf_counter() - start, items=1)
+                    answer = llm_output['choices'][0]['text'].strip().lower()
+                    return 'yes' in answer
+
+                def verify_batch(results):
+                    return [ask_llm(r) for r in results]
+                batch_size = 1
+
+        if verdict_cache is not None:
+            verdict_stats_before = dict(verdict_cache.stats)
+            # Only verdicts of a section's own prompt are stored, so packing settings are not part of the key
+            prompt_hash = hash_key(Path(LLM_MODEL_PATH).name, LLM_VERIFIER, prompt_prefix)
+            cached_verdicts, verify_batch = with_verdict_cache(verify_batch, verdict_cache, prompt_hash, prompt_suffix,
+                                                               llm_scores, packed_ids)
+        else:
+            cached_verdicts = None
+
+        # Stops as soon as enough sections are confirmed, and decides clear-cut hits by score alone if thresholds are set
+        scheduler = VerificationScheduler(
+            verify_batch=verify_batch,
+            num_required=NUM_RESULTS_TO_RETURN,
+            batch_size=batch_size,
+            cached_verdicts=cached_verdicts
+        )
+
+        with pipeline_profiler.stage("verification"):
+            verified = scheduler.run(search_results)
 
-        is_relevant = 'yes' in answer
-        print(f"  - Section {i+1}/{NUM_RESULTS_TO_FETCH}: '{metadata['section_title'][:50]}...' -> Relevant: {is_relevant}")
+        for i, (result, is_relevant, decided_by) in enumerate(verified):
+            chunk_text = in_memory_db['chunks'].text(result['corpus_id'])
+            metadata = in_memory_db['chunks'].metadata(result['corpus_id'])
+            llm_score = f", P(yes) {llm_scores[result['corpus_id']]:.3f}" if result['corpus_id'] in llm_scores else ""
+            print(f"  - Section {i+1}/{len(search_results)}: '{metadata['section_title'][:50]}...' -> Relevant: {is_relevant} "
+                  f"(by {decided_by}, score {result['score']:.3f}{llm_score})")
         
-        # Create the analysis object, including the CRITICAL refined_text field
-        analysis_item = {
-            "document": metadata['source_pdf'],
-            "refined_text": chunk_text.split('\n\n', 1)[-1], # Clean up the "Section: ..." prefix for output
-            "page_number": metadata['page_number'],
-            "section_title": metadata['section_title'], # Keep title for filtering later
-            "is_relevant": is_relevant
-        }
-        all_subsection_analysis.append(analysis_item)
+            # Create the analysis object, including the CRITICAL refined_text field
+            analysis_item = {
+                "document": metadata['source_pdf'],
+                "refined_text": chunk_text.split('\n\n', 1)[-1], # Clean up the "Section: ..." prefix for output
+                "page_number": metadata['page_number'],
+                "section_title": metadata['section_title'], # Keep title for filtering later
+                "is_relevant": is_relevant
+            }
+
+            if is_relevant:
+                # We store the full metadata object for later ranking
+                final_sections_metadata.append(metadata)
+                relevant_subsection_analysis.append(analysis_item)
+                relevance_scores.append(llm_scores.get(result['corpus_id'], 1.0)) # Auto-accepted sections rank first
+
+        stats = scheduler.stats
+        print(f"  - LLM calls: {stats['llm_calls']}, skipped: {scheduler.skipped_llm_calls} "
+              f"(cached verdicts {stats['cached']}, auto-accepted {stats['auto_accepted']}, auto-rejected {stats['auto_rejected']}, not needed {stats['not_needed']})")
+        if verdict_cache is not None:
+            print(f"  - Verdict cache: {verdict_cache.stats['hits'] - verdict_stats_before['hits']} hits, "
+                  f"{verdict_cache.stats['misses'] - verdict_stats_before['misses']} misses")
+        if builder.stats['sections']:
+            print(f"  - Prompt budget: {builder.stats['trimmed']} of {builder.stats['sections']} sections trimmed to "
+                  f"{EXCERPT_TOKEN_BUDGET} tokens ({builder.stats['chunk_tokens']} -> {builder.stats['excerpt_tokens']} excerpt tokens)")
+        if scorer is not None and scorer.stats['calls']:
+            print(f"  - Logit scoring: {scorer.stats['prefix_tokens']} prefix tokens evaluated once, "
+                  f"{scorer.stats['suffix_tokens'] / scorer.stats['items']:.0f} tokens and "
+                  f"{scorer.stats['seconds'] / scorer.stats['items'] * 1000:.0f} ms per verified section "
+                  f"({scorer.stats['calls']} prompts for {scorer.stats['items']} sections)")
+        if isinstance(llm, LLMWorkerPool) and llm.stats['calls'] > pool_stats_before['calls']:
+            calls = llm.stats['calls'] - pool_stats_before['calls']
+            print(f"  - {llm.num_workers} LLM workers x {llm.threads_per_worker} threads: "
+                  f"{(llm.stats['prompt_tokens'] - pool_stats_before['prompt_tokens']) / calls:.0f} tokens and "
+                  f"{(llm.stats['seconds'] - pool_stats_before['seconds']) / calls * 1000:.0f} ms per section (per worker)")
 
-        if is_relevant:
-            # We store the full metadata object for later ranking
-            final_sections_metadata.append(metadata)
+        if RANK_BY_LLM_SCORE and LLM_VERIFIER == "logits":
+            order = sorted(range(len(final_sections_metadata)), key=lambda i: -relevance_scores[i])
+            final_sections_metadata = [final_sections_metadata[i] for i in order]
+            relevant_subsection_analysis = [relevant_subsection_analysis[i] for i in order]
 
-    # --- Step 5: Assemble Final Output from Top 5 Results ---
-    print(f"\nStep 5: Assembling final output from the top 5 verified sections...")
+        # --- Step 5: Assemble Final Output from Top 5 Results ---
+        print(f"\nStep 5: Assembling final output from the top {NUM_RESULTS_TO_RETURN} verified sections...")
     
-    # IMPORTANT: Limit the results to the top 5
-    top_5_metadata = final_sections_metadata[:5]
-
-    # Create the ranked list for the final "extracted_sections"
-    ranked_sections = [
-        {
-            "document": s['source_pdf'],
-            "section_title": s['section_title'],
-            "importance_rank": i + 1,
-            "page_number": s['page_number']
-        } for i, s in enumerate(top_5_metadata)
-    ]
-
-    # Filter the detailed analysis to only include the text for the top 5 sections
-    top_5_titles = {s['section_title'] for s in top_5_metadata}
-    final_subsection_analysis = [
-        {k: v for k, v in analysis.items() if k != 'is_relevant' and k != 'section_title'} 
-        for analysis in all_subsection_analysis 
-        if analysis['section_title'] in top_5_titles and analysis['is_relevant']
-    ][:5]
+        # IMPORTANT: Limit the results to the top 5
+        top_5_metadata = final_sections_metadata[:NUM_RESULTS_TO_RETURN]
 
-    output_path = Path(output_file_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Create the ranked list for the final "extracted_sections"
+        ranked_sections = [
+            {
+                "document": s['source_pdf'],
+                "section_title": s['section_title'],
+                "importance_rank": i + 1,
+                "page_number": s['page_number']
+            } for i, s in enumerate(top_5_metadata)
+        ]
 
-    final_output = {
-        "metadata": {
-            "input_documents": [d["filename"] for d in document_list], 
-            "persona": persona, 
-            "job_to_be_done": task, 
-            "processing_timestamp": datetime.now().isoformat()
-        }, 
-        "extracted_sections": ranked_sections, 
-        "subsection_analysis": final_subsection_analysis
-    }
+        # The detailed analysis of the same top 5 sections, in the same order as their importance_rank
+        final_subsection_analysis = [
+            {k: v for k, v in analysis.items() if k != 'is_relevant' and k != 'section_title'} 
+            for analysis in relevant_subsection_analysis[:NUM_RESULTS_TO_RETURN]
+        ]
+
+        final_output = {
+            "metadata": {
+                "input_documents": [d["filename"] for d in document_list], 
+                "persona": persona, 
+                "job_to_be_done": task, 
+                "processing_timestamp": datetime.now().isoformat()
+            }, 
+            "extracted_sections": ranked_sections, 
+            "subsection_analysis": final_subsection_analysis
+        }
     
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(final_output, f, indent=4)
-        
-    print(f"\n--- Success! ---")
-    print(f"Analysis complete. Output saved to: {output_path}")
\ No newline at end of file
+        if output_cache is not None:
+            output_cache.put(output_key, final_output)
+        write_output(final_output, output_file_path)
+        return final_output
+    finally:
+        if owns_llm:
+            llm.close()
\ No newline at end of file
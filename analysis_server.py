@@ -0,0 +1,235 @@
+# analysis_server.py
+
+import os
+os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+import cpu_budget
+# Before NumPy or torch are imported, so their thread pools start at the CPU budget
+cpu_budget.limit_native_threads()
+
+import json
+import argparse
+import queue
+import statistics
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from analysis_logic import load_embedding_model, load_llm
+from run_challenge import ensure_models, run_collection
+from result_cache import cache_stats
+
+# --- CONFIGURATION ---
+DEFAULT_HOST = '127.0.0.1' # Local-only by default; the server has no authentication
+DEFAULT_PORT = 8765
+MAX_QUEUED_REQUESTS = 64 # Further requests are rejected with 503 until the queue drains
+COLLECTIONS_ROOT = '.' # A requested collection must be a directory inside this one
+
+class AnalysisJob:
+    """One queued collection/persona/job request and, once processed, its result and timings."""
+
+    def __init__(self, collection, persona, job, output_file):
+        self.collection = collection
+        self.persona = persona
+        self.job = job
+        self.output_file = output_file
+        self.result = None
+        self.error = None
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def latency(self):
+        return {
+            "queue_wait_s": round(self.started_at - self.enqueued_at, 4),
+            "run_s": round(self.finished_at - self.started_at, 4),
+            "total_s": round(self.finished_at - self.enqueued_at, 4),
+        }
+
+class AnalysisServer:
+    """
+    Keeps the embedding model and the LLM loaded and runs queued analysis requests against them.
+    Requests are processed one at a time by a single worker thread, because neither model is
+    safe to call concurrently; HTTP handler threads only enqueue and wait.
+    """
+
+    def __init__(self, embedding_model, llm, max_queued=MAX_QUEUED_REQUESTS):
+        self.embedding_model = embedding_model
+        self.llm = llm
+        self.jobs = queue.Queue(maxsize=max_queued)
+        self.run_times = []
+        self.stats_lock = threading.Lock()
+        self.worker = threading.Thread(target=self._work, name="analysis-worker", daemon=True)
+        self.worker.start()
+
+    def submit(self, collection, persona=None, job=None, output_file=None):
+        """Enqueues a request; raises queue.Full when the server is saturated."""
+        analysis_job = AnalysisJob(collection, persona, job, output_file)
+        self.jobs.put_nowait(analysis_job)
+        return analysis_job
+
+    def _work(self):
+        while True:
+            analysis_job = self.jobs.get()
+            analysis_job.started_at = time.perf_counter()
+            try:
+                analysis_job.result = run_collection(
+                    analysis_job.collection,
+                    persona_info=analysis_job.persona,
+                    job_info=analysis_job.job,
+                    output_file_path=analysis_job.output_file,
+                    embedding_model=self.embedding_model,
+                    llm=self.llm
+                )
+                if analysis_job.result is None:
+                    analysis_job.error = f"Collection '{analysis_job.collection}' could not be processed."
+            except Exception as e:
+                analysis_job.error = f"{type(e).__name__}: {e}"
+            analysis_job.finished_at = time.perf_counter()
+
+            latency = analysis_job.latency()
+            with self.stats_lock:
+                self.run_times.append(latency["total_s"])
+            print(f"[server] '{analysis_job.collection}' done in {latency['total_s']:.2f}s "
+                  f"(queued {latency['queue_wait_s']:.2f}s, run {latency['run_s']:.2f}s)")
+            analysis_job.done.set()
+            self.jobs.task_done()
+
+    def stats(self):
+        with self.stats_lock:
+            times = sorted(self.run_times)
+        summary = {"completed": len(times), "queued": self.jobs.qsize(), "result_cache": cache_stats()}
+        if times:
+            summary.update(
+                mean_total_s=round(statistics.mean(times), 4),
+                p50_total_s=times[len(times) // 2],
+                p95_total_s=times[min(len(times) - 1, int(len(times) * 0.95))],
+            )
+        return summary
+
+def _as_dict(value, key):
+    """Accepts either the config-file form ({"role": ...}) or a bare string."""
+    if value is None or isinstance(value, dict):
+        return value
+    return {key: str(value)}
+
+def confined_collection_path(collections_root, collection):
+    """
+    Resolves a client's `collection` against `collections_root`. Returns None if it points outside
+    that directory, for the same reason as `confined_output_path`: the client must not be able to
+    make the server read configs and PDFs from, or write outputs to, anywhere else on the host.
+    """
+    root = Path(collections_root).resolve()
+    path = (root / collection).resolve()
+    return path if path != root and path.is_relative_to(root) else None
+
+def confined_output_path(collection, output_file):
+    """
+    Resolves a client's `output_file` against the collection directory. Returns None if it points
+    outside that directory: the server has no authentication, so a client must not be able to
+    choose which file on the host gets created or overwritten.
+    """
+    collection_dir = Path(collection).resolve()
+    path = (collection_dir / output_file).resolve()
+    return path if path != collection_dir and path.is_relative_to(collection_dir) else None
+
+def make_handler(server: AnalysisServer, collections_root=COLLECTIONS_ROOT):
+    class AnalysisRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok", **server.stats()})
+            else:
+                self._send_json(404, {"error": "Unknown endpoint."})
+
+        def do_POST(self):
+            if self.path != "/analyze":
+                self._send_json(404, {"error": "Unknown endpoint."})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                collection = payload["collection"]
+                if not isinstance(collection, str):
+                    raise ValueError
+            except (ValueError, KeyError):
+                self._send_json(400, {"error": "Expected a JSON body with at least a 'collection' key."})
+                return
+
+            collection_dir = confined_collection_path(collections_root, collection)
+            if collection_dir is None:
+                self._send_json(400, {"error": "'collection' must be a path inside the server's collections root."})
+                return
+
+            output_file = payload.get("output_file")
+            if output_file is not None:
+                output_file = confined_output_path(collection_dir, output_file) if isinstance(output_file, str) else None
+                if output_file is None:
+                    self._send_json(400, {"error": "'output_file' must be a path inside the collection directory."})
+                    return
+
+            try:
+                analysis_job = server.submit(
+                    str(collection_dir),
+                    persona=_as_dict(payload.get("persona"), "role"),
+                    job=_as_dict(payload.get("job_to_be_done"), "task"),
+                    output_file=output_file
+                )
+            except queue.Full:
+                self._send_json(503, {"error": "Server is busy, try again later."})
+                return
+
+            analysis_job.done.wait()
+            status = 200 if analysis_job.error is None else 500
+            self._send_json(status, {
+                "collection": collection,
+                "error": analysis_job.error,
+                "latency": analysis_job.latency(),
+                "result": analysis_job.result
+            })
+
+        def log_message(self, format, *args):
+            pass # The worker prints one line per request instead
+
+    return AnalysisRequestHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve collection analyses over HTTP with the models kept loaded.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Interface to bind (default: {DEFAULT_HOST}).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT}).")
+    parser.add_argument("--root", default=COLLECTIONS_ROOT,
+                        help=f"Directory that requested collections must be inside (default: '{COLLECTIONS_ROOT}').")
+    args = parser.parse_args()
+
+    ensure_models()
+
+    print("Loading models once for the lifetime of the server...")
+    start = time.perf_counter()
+    embedding_model = load_embedding_model()
+    llm = load_llm()
+    try:
+        server = AnalysisServer(embedding_model, llm)
+        print(f"Models loaded in {time.perf_counter() - start:.2f}s.")
+
+        httpd = ThreadingHTTPServer((args.host, args.port), make_handler(server, args.root))
+        print(f"Analysis server listening on http://{args.host}:{args.port} (POST /analyze, GET /health)")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nShutting down.")
+        finally:
+            httpd.server_close()
+    finally:
+        # Stops the LLM worker processes when LLM_WORKERS > 1
+        llm.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# benchmarks/__init__.py
+#
+# Performance benchmarks for the ingestion and analysis pipeline.
+# Run individual benchmarks as modules from the repository root, e.g.
+#   python -m benchmarks.bench_outline "Collection 2/PDFs"
+# run_suite benchmarks every stage on a generated corpus and compares against an earlier run:
+#   python -m benchmarks.run_suite --output baseline.json
+#   python -m benchmarks.run_suite --baseline baseline.json
@@ -0,0 +1,61 @@
+# benchmarks/bench_chunk_store.py
+
+import argparse
+import pickle
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from chunk_store import ChunkStore
+from ingestion_logic import process_single_pdf
+
+def allocated(build):
+    """Returns (result, bytes it keeps allocated) of `build()`, as traced by tracemalloc."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory, pickle size and access time of chunks as a list of dicts vs. a columnar ChunkStore.")
+    parser.add_argument("pdf_dirs", nargs="+", help="Directories with PDFs to take the chunks from.")
+    parser.add_argument("--replicate", type=int, default=100, help="Repeat the chunks this many times to measure at scale.")
+    parser.add_argument("--reads", type=int, default=10000, help="Random chunks read in the access benchmark.")
+    args = parser.parse_args()
+
+    stores = [process_single_pdf(str(p))[1] for d in args.pdf_dirs for p in sorted(Path(d).glob("*.pdf"))]
+    # Decoding every replica afresh gives each chunk its own dict and strings, as in a real corpus
+    chunks, dict_bytes = allocated(lambda: [chunk for _ in range(args.replicate) for store in stores for chunk in store])
+    store, store_bytes = allocated(lambda: ChunkStore.concat(stores * args.replicate))
+    texts = sum(len(chunk['chunk_text'].encode("utf-8")) for chunk in chunks)
+    print(f"{len(chunks)} chunks, {texts / 2**20:.1f} MiB of UTF-8 text\n")
+
+    print(f"{'format':>12} {'memory MiB':>11} {'pickle MiB':>11} {'us/read':>8}")
+    ids = random.Random(0).choices(range(len(chunks)), k=args.reads)
+    start = time.perf_counter()
+    for i in ids:
+        chunks[i]['chunk_text'], chunks[i]['metadata']['section_title']
+    dict_read = (time.perf_counter() - start) / len(ids)
+    start = time.perf_counter()
+    for i in ids:
+        store.text(i), store.metadata(i)
+    store_read = (time.perf_counter() - start) / len(ids)
+    print(f"{'dicts':>12} {dict_bytes / 2**20:>11.1f} {len(pickle.dumps(chunks)) / 2**20:>11.1f} {dict_read * 1e6:>8.2f}")
+    print(f"{'ChunkStore':>12} {store_bytes / 2**20:>11.1f} {len(pickle.dumps(store)) / 2**20:>11.1f} {store_read * 1e6:>8.2f}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        store.save(Path(tmp_dir) / "chunks")
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = ChunkStore.load(Path(tmp_dir) / "chunks")
+        opened = time.perf_counter() - start
+        print(f"\nSaved in {saved:.3f}s, memory-mapped back in {opened * 1000:.2f}ms; "
+              f"identical: {loaded.fingerprint() == store.fingerprint()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_cpu_budget.py
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+def run_ingestion(pdf_paths, use_budget, streaming):
+    """Child side: ingests `pdf_paths` from scratch and prints the timings as the last line."""
+    import cpu_budget
+    cpu_budget.USE_CPU_BUDGET = use_budget
+    cpu_budget.limit_native_threads() # Before NumPy and torch are imported, as the entry points do
+    import ingestion_logic
+    from ingestion_logic import load_ingestion_model, ingest_pdfs
+
+    ingestion_logic.USE_EMBEDDING_CACHE = False
+    ingestion_logic.STREAMING_INGESTION = streaming
+    model = load_ingestion_model()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    results = ingest_pdfs(pdf_paths, model=model)
+    print(json.dumps({
+        "seconds": time.perf_counter() - start,
+        "main_cpu_seconds": time.process_time() - cpu_start,
+        "chunks": sum(len(chunks) for chunks, _ in results.values()),
+    }))
+
+def measure(pdf_dirs, cores, use_budget, streaming):
+    """Runs ingestion in a fresh interpreter pinned to `cores`; returns (timings, CPU budget lines it printed)."""
+    command = [sys.executable, "-m", "benchmarks.bench_cpu_budget", *pdf_dirs, "--child", "budget" if use_budget else "legacy"]
+    if not streaming:
+        command.append("--two-phase")
+    # The mask is inherited by the interpreter, its PDF workers and every native thread pool
+    output = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True,
+                            preexec_fn=lambda: os.sched_setaffinity(0, cores)).stdout.splitlines()
+    return json.loads(output[-1]), [line for line in output if line.startswith("CPU budget:")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion (parse + embed) with each stage sized from os.cpu_count() vs. the CPU budget, under restricted affinity masks.")
+    parser.add_argument("pdf_dirs", nargs="+", help="Directories with PDFs to ingest.")
+    parser.add_argument("--cpus", type=int, nargs="+", default=[1, 2, 4], help="Affinity mask sizes to run under.")
+    parser.add_argument("--repeat", type=int, default=2, help="Runs per setting; the best time is reported.")
+    parser.add_argument("--two-phase", action="store_true", help="Parse everything before embedding instead of streaming.")
+    parser.add_argument("--child", choices=["legacy", "budget"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        pdf_paths = [str(p) for d in args.pdf_dirs for p in sorted(Path(d).glob("*.pdf"))]
+        run_ingestion(pdf_paths, args.child == "budget", not args.two_phase)
+        return
+
+    available = sorted(os.sched_getaffinity(0))
+    print(f"{os.cpu_count()} host CPUs, {len(available)} in this process's affinity mask\n")
+    print(f"{'cpus':>5} {'mode':>8} {'seconds':>8} {'main cpu s':>11} {'chunks/s':>9}")
+    for num_cpus in args.cpus:
+        if num_cpus > len(available):
+            print(f"{num_cpus:>5} skipped: only {len(available)} CPUs available")
+            continue
+        cores = available[:num_cpus]
+        timings = {}
+        for use_budget in (False, True):
+            runs = [measure(args.pdf_dirs, cores, use_budget, not args.two_phase) for _ in range(args.repeat)]
+            best, plan = min(runs, key=lambda run: run[0]["seconds"])
+            timings[use_budget] = best["seconds"]
+            mode = "budget" if use_budget else "legacy"
+            print(f"{num_cpus:>5} {mode:>8} {best['seconds']:>8.2f} {best['main_cpu_seconds']:>11.2f} "
+                  f"{best['chunks'] / best['seconds']:>9.1f}")
+            for line in plan:
+                print(f"{'':>15}{line}")
+        print(f"{'':>15}speedup: {timings[False] / timings[True]:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# benchmarks/bench_embedding_batches.py
+
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+
+from ingestion_logic import load_ingestion_model, parse_pdfs
+from embedding_batches import TokenBudgetEmbedder, BATCH_TOKEN_BUDGET
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of fixed-size model.encode batches vs. token-budgeted, length-sorted batches.")
+    parser.add_argument("pdf_dirs", nargs="+", help="Directories with PDFs to take chunks from.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size of the model.encode baseline.")
+    parser.add_argument("--token-budgets", type=int, nargs="+", default=[BATCH_TOKEN_BUDGET])
+    args = parser.parse_args()
+
+    pdf_paths = [str(p) for d in args.pdf_dirs for p in sorted(Path(d).glob("*.pdf"))]
+    texts = [text for _, chunks in parse_pdfs(pdf_paths) for text in chunks.texts()]
+    model = load_ingestion_model()
+
+    lengths = np.array([len(ids) for ids in model.tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]])
+    limit = model.max_seq_length - 2
+    print(f"{len(texts)} chunks, {lengths.sum()} tokens; {np.mean(lengths > limit):.1%} of chunks exceed the "
+          f"{model.max_seq_length}-token limit ({np.maximum(lengths - limit, 0).sum()} tokens truncated by model.encode)\n")
+
+    start = time.perf_counter()
+    baseline = model.encode(texts, batch_size=args.batch_size)
+    seconds = time.perf_counter() - start
+    embedded_tokens = np.minimum(lengths, limit).sum() + 2 * len(texts)
+    print(f"{'batching':>20} {'seconds':>8} {'chunks/s':>9} {'tokens/s':>9} {'padding':>8}")
+    print(f"{f'encode/{args.batch_size}':>20} {seconds:>8.2f} {len(texts) / seconds:>9.1f} {embedded_tokens / seconds:>9.0f} {'-':>8}")
+
+    for token_budget in args.token_budgets:
+        embedder = TokenBudgetEmbedder(model, token_budget=token_budget)
+        embeddings = embedder.embed(texts)
+        stats = embedder.stats
+        padding = 1 - stats['tokens'] / stats['padded_tokens']
+        print(f"{f'budget/{token_budget}':>20} {stats['seconds']:>8.2f} {len(texts) / stats['seconds']:>9.1f} "
+              f"{stats['tokens'] / stats['seconds']:>9.0f} {padding:>8.1%}")
+
+    # Chunks within the limit must embed the same as with model.encode
+    within = lengths <= limit
+    print(f"\nMax difference to model.encode on chunks within the limit: {np.abs(embeddings[within] - baseline[within]).max():.2e}")
+
+if __name__ == "__main__":
+    main()
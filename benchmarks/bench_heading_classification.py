@@ -0,0 +1,60 @@
+# benchmarks/bench_heading_classification.py
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import extract_outline
+from extract_outline import PDFOutlineExtractor
+from benchmarks.synthetic_pdfs import make_corpus
+
+def classify_all(extractor, documents, vectorized):
+    """Runs heading classification over preloaded documents; returns (seconds, headings per document)."""
+    extract_outline.VECTORIZED_HEADINGS = vectorized
+    start = time.perf_counter()
+    headings = [extractor.find_heading_candidates(layouts, body, footers) for layouts, body, footers in documents]
+    return time.perf_counter() - start, headings
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-block is_heading vs. vectorized classify_blocks on span-heavy documents.")
+    parser.add_argument("paths", nargs="*", help="PDF files or directories to add to the synthetic corpus.")
+    parser.add_argument("--pdfs", type=int, default=10, help="Number of synthetic PDFs.")
+    parser.add_argument("--pages", type=int, default=40, help="Pages per synthetic PDF.")
+    parser.add_argument("--spans-per-line", type=int, default=8, help="Spans per body line of the synthetic PDFs.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the fastest is reported.")
+    args = parser.parse_args()
+
+    pdf_paths = []
+    for p in map(Path, args.paths):
+        pdf_paths.extend(sorted(p.glob("*.pdf")) if p.is_dir() else [p])
+
+    extractor = PDFOutlineExtractor()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_paths += make_corpus(tmp_dir, [args.pages] * args.pdfs, font_tiers=3, numbered=False,
+                                 spans_per_line=args.spans_per_line)
+        # Layouts, body size and footers are computed up front; only the classification is timed
+        documents = []
+        for pdf_path in pdf_paths:
+            _, layouts = extractor.extract_outline_and_layouts(str(pdf_path))
+            if layouts:
+                documents.append((layouts, extractor.analyze_text_properties(layouts), extractor.identify_footers(layouts)))
+
+    blocks = sum(len(layout["blocks"]) for layouts, _, _ in documents for layout in layouts)
+    spans = sum(len(line["spans"]) for layouts, _, _ in documents for layout in layouts
+                for block in layout["blocks"] for line in block["lines"])
+    print(f"{len(documents)} documents, {blocks} blocks, {spans} spans\n")
+
+    timings, results = {}, {}
+    for vectorized in (False, True):
+        runs = [classify_all(extractor, documents, vectorized) for _ in range(args.repeat)]
+        timings[vectorized] = min(seconds for seconds, _ in runs)
+        results[vectorized] = runs[-1][1]
+
+    print(f"{'classifier':>16} {'seconds':>8} {'blocks/s':>10}")
+    for vectorized, name in ((False, "is_heading"), (True, "classify_blocks")):
+        print(f"{name:>16} {timings[vectorized]:>8.3f} {blocks / timings[vectorized]:>10.0f}")
+    print(f"\nSpeedup: {timings[False] / timings[True]:.2f}x; identical headings: {results[False] == results[True]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_hybrid_search.py
+
+import argparse
+import random
+import time
+from pathlib import Path
+import numpy as np
+
+from ingestion_logic import ingest_pdfs, load_ingestion_model
+from vector_index import build_index
+from lexical_index import BM25Index, hybrid_search, HYBRID_SHORTLIST
+
+def measure(search, queries):
+    start = time.perf_counter()
+    results = [search(i) for i in range(len(queries))]
+    return results, (time.perf_counter() - start) / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and top-k overlap of BM25-prefiltered hybrid search against dense-only search.")
+    parser.add_argument("pdf_dirs", nargs="+", help="Directories with PDFs to build the corpus from.")
+    parser.add_argument("--queries", type=int, default=100, help="Section titles sampled as keyword queries.")
+    parser.add_argument("--query", action="append", default=[], help="An extra query (repeatable).")
+    parser.add_argument("--replicate", type=int, default=1, help="Repeat the corpus this many times (with jittered embeddings) to measure at scale.")
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--shortlists", type=int, nargs="+", default=[HYBRID_SHORTLIST])
+    args = parser.parse_args()
+
+    pdf_paths = [str(p) for d in args.pdf_dirs for p in sorted(Path(d).glob("*.pdf"))]
+    model = load_ingestion_model()
+    results = ingest_pdfs(pdf_paths, model=model)
+    chunks = [chunk for p in pdf_paths if p in results for chunk in results[p][0]]
+    embeddings = np.concatenate([results[p][1] for p in pdf_paths if p in results])
+
+    rng = np.random.default_rng(0)
+    documents = [c['chunk_text'] for c in chunks] * args.replicate
+    embeddings = np.concatenate([embeddings] + [embeddings + 0.01 * rng.normal(size=embeddings.shape).astype(np.float32)
+                                                for _ in range(args.replicate - 1)])
+    titles = sorted({c['metadata']['section_title'] for c in chunks})
+    queries = random.Random(0).sample(titles, min(args.queries, len(titles))) + args.query
+    query_embeddings = model.encode(queries)
+
+    dense = build_index(embeddings, "exact")
+    start = time.perf_counter()
+    lexical = BM25Index.build(documents)
+    print(f"{len(documents)} chunks, {len(lexical.vocabulary)} terms; BM25 index built in {time.perf_counter() - start:.2f}s, "
+          f"postings {lexical.memory_bytes() / 1024:.0f} KiB; {len(queries)} queries, top-{args.top_k}\n")
+
+    truth, dense_latency = measure(lambda i: dense.search(query_embeddings[i], args.top_k), queries)
+    truth_ids = [{r['corpus_id'] for r in hits} for hits in truth]
+    print(f"{'search':>16} {'ms/query':>9} {'speedup':>8} {'overlap@k':>10} {'fallbacks':>10}")
+    print(f"{'dense':>16} {dense_latency * 1000:>9.3f} {1.0:>7.2f}x {1.0:>10.3f} {'-':>10}")
+
+    for shortlist in args.shortlists:
+        for fusion in (None, "rrf"):
+            hybrid, latency = measure(lambda i: hybrid_search(lexical, embeddings, queries[i], query_embeddings[i], args.top_k,
+                                                              shortlist_size=shortlist, fusion=fusion), queries)
+            answered = [(t, hits) for t, hits in zip(truth_ids, hybrid) if hits is not None]
+            overlap = np.mean([len(t & {r['corpus_id'] for r in hits}) / len(t) for t, hits in answered]) if answered else 0.0
+            name = f"hybrid/{shortlist}" + ("+rrf" if fusion else "")
+            print(f"{name:>16} {latency * 1000:>9.3f} {dense_latency / latency:>7.2f}x {overlap:>10.3f} "
+                  f"{len(queries) - len(answered):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_llm_scoring.py
+
+import argparse
+import time
+from pathlib import Path
+
+from analysis_logic import load_llm
+from ingestion_logic import process_single_pdf
+from verification_logic import YesNoScorer
+
+SYSTEM_PROMPT = "You are a travel planner. Your goal is to plan a fun trip for college friends. Evaluate if the following text is useful for this goal."
+QUESTION = "Is this text useful for planning a 4-day trip for college friends focused on activities, food, and nightlife? Answer only 'Yes' or 'No'."
+PROMPT_PREFIX = f"<|system|>\n{SYSTEM_PROMPT}</s>\n<|user|>\n"
+
+def prompt_suffix(chunk):
+    return (f"Excerpt from document '{chunk['metadata']['source_pdf']}':\n---\n{chunk['chunk_text']}\n---\n"
+            f"{QUESTION}</s>\n<|assistant|>\n")
+
+def bench_generate(llm, chunks):
+    """The sampling path: full prompt per chunk, up to 8 generated tokens."""
+    prompt_tokens, verdicts = 0, []
+    start = time.perf_counter()
+    for chunk in chunks:
+        # reset() disables llama.cpp's own prefix reuse so every call pays the full prompt, as a fresh context would
+        llm.reset()
+        output = llm(PROMPT_PREFIX + prompt_suffix(chunk), max_tokens=8, temperature=0.0, stop=["</s>", "\n"])
+        prompt_tokens += output['usage']['prompt_tokens']
+        verdicts.append('yes' in output['choices'][0]['text'].strip().lower())
+    return prompt_tokens, time.perf_counter() - start, verdicts
+
+def bench_logits(llm, chunks):
+    """The single-forward-pass path: cached prefix, suffix only, Yes/No logits."""
+    scorer = YesNoScorer(llm, PROMPT_PREFIX)
+    start = time.perf_counter()
+    verdicts = [scorer.score(prompt_suffix(chunk)) >= 0.5 for chunk in chunks]
+    return scorer.stats['suffix_tokens'], time.perf_counter() - start, verdicts
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare generate-based and logit-based LLM verification.")
+    parser.add_argument("pdf_dir", help="Directory with PDFs to take sample chunks from.")
+    parser.add_argument("--chunks", type=int, default=15, help="Number of chunks to verify.")
+    args = parser.parse_args()
+
+    chunks = []
+    for pdf_path in sorted(Path(args.pdf_dir).glob("*.pdf")):
+        chunks.extend(process_single_pdf(str(pdf_path))[1])
+        if len(chunks) >= args.chunks:
+            break
+    chunks = chunks[:args.chunks]
+
+    llm = load_llm()
+    results = {"generate": bench_generate(llm, chunks), "logits": bench_logits(llm, chunks)}
+
+    for name, (tokens, seconds, _) in results.items():
+        print(f"{name:>8}: {tokens / len(chunks):7.1f} prompt tokens evaluated/chunk, "
+              f"{seconds / len(chunks) * 1000:7.1f} ms/chunk")
+    agreement = sum(a == b for a, b in zip(results["generate"][2], results["logits"][2])) / len(chunks)
+    print(f"Verdict agreement: {agreement:.0%} over {len(chunks)} chunks")
+
+if __name__ == "__main__":
+    main()
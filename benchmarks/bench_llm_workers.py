@@ -0,0 +1,41 @@
+# benchmarks/bench_llm_workers.py
+
+import argparse
+import time
+from pathlib import Path
+
+from analysis_logic import LLM_MODEL_PATH, LLM_CONTEXT_SIZE
+from ingestion_logic import process_single_pdf
+from verification_logic import LLMWorkerPool
+from benchmarks.bench_llm_scoring import PROMPT_PREFIX, prompt_suffix
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure LLM verification throughput against the number of worker processes.")
+    parser.add_argument("pdf_dir", help="Directory with PDFs to take sample chunks from.")
+    parser.add_argument("--chunks", type=int, default=32, help="Number of chunks to verify per configuration.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to try.")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Fix the threads per worker instead of splitting the cores.")
+    parser.add_argument("--mode", choices=["logits", "generate"], default="logits")
+    args = parser.parse_args()
+
+    chunks = []
+    for pdf_path in sorted(Path(args.pdf_dir).glob("*.pdf")):
+        chunks.extend(process_single_pdf(str(pdf_path))[1])
+        if len(chunks) >= args.chunks:
+            break
+    suffixes = [prompt_suffix(chunk) for chunk in chunks[:args.chunks]]
+
+    print(f"{'workers':>7} {'threads':>7} {'chunks/s':>9} {'speedup':>8}")
+    baseline = None
+    for num_workers in args.workers:
+        with LLMWorkerPool(LLM_MODEL_PATH, LLM_CONTEXT_SIZE, num_workers, args.threads_per_worker) as pool:
+            # Warm-up: loads the model and evaluates the prompt prefix in every worker
+            pool.verify(args.mode, PROMPT_PREFIX, suffixes[:num_workers])
+            start = time.perf_counter()
+            pool.verify(args.mode, PROMPT_PREFIX, suffixes)
+            throughput = len(suffixes) / (time.perf_counter() - start)
+        baseline = baseline or throughput
+        print(f"{num_workers:>7} {pool.threads_per_worker:>7} {throughput:>9.2f} {throughput / baseline:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
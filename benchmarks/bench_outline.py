@@ -0,0 +1,55 @@
+# benchmarks/bench_outline.py
+
+import argparse
+import time
+from collections import Counter
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from extract_outline import PDFOutlineExtractor
+
+def count_layout_passes(pdf_path):
+    """Runs extract_outline once and counts how many times each page was text-extracted."""
+    calls = Counter()
+    original_get_text = fitz.Page.get_text
+
+    def counting_get_text(page, *args, **kwargs):
+        calls[page.number] += 1
+        return original_get_text(page, *args, **kwargs)
+
+    fitz.Page.get_text = counting_get_text
+    try:
+        start = time.perf_counter()
+        PDFOutlineExtractor().extract_outline(pdf_path)
+        elapsed = time.perf_counter() - start
+    finally:
+        fitz.Page.get_text = original_get_text
+
+    with fitz.open(pdf_path) as doc:
+        num_pages = len(doc)
+    return num_pages, sum(calls.values()), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure text-extraction passes per page in PDFOutlineExtractor.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories containing PDFs.")
+    args = parser.parse_args()
+
+    pdf_paths = []
+    for p in map(Path, args.paths):
+        pdf_paths.extend(sorted(p.glob("*.pdf")) if p.is_dir() else [p])
+
+    total_pages, total_passes, total_time = 0, 0, 0.0
+    for pdf_path in pdf_paths:
+        num_pages, passes, elapsed = count_layout_passes(str(pdf_path))
+        total_pages += num_pages
+        total_passes += passes
+        total_time += elapsed
+        print(f"{pdf_path.name}: {num_pages} pages, {passes / max(num_pages, 1):.2f} passes/page, {elapsed * 1000:.1f} ms")
+
+    if total_pages:
+        print(f"\nTotal: {total_pages} pages, {total_passes / total_pages:.2f} passes/page, "
+              f"{total_pages / total_time:.1f} pages/sec")
+
+if __name__ == "__main__":
+    main()
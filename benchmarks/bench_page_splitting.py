@@ -0,0 +1,42 @@
+# benchmarks/bench_page_splitting.py
+
+import argparse
+import os
+import tempfile
+import time
+
+import ingestion_logic
+from ingestion_logic import parse_pdfs
+from benchmarks.synthetic_pdfs import make_corpus
+
+def time_parse(pdf_paths, pages_per_task, max_workers):
+    ingestion_logic.SPLIT_PAGES_PER_TASK = pages_per_task
+    start = time.perf_counter()
+    results = dict(parse_pdfs(pdf_paths, max_workers=max_workers))
+    return time.perf_counter() - start, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Wall-clock parse time of a skewed corpus with and without page-range splitting.")
+    parser.add_argument("--large-pages", type=int, default=400, help="Pages of the one large PDF.")
+    parser.add_argument("--small", type=int, default=10, help="Number of small PDFs.")
+    parser.add_argument("--small-pages", type=int, default=5)
+    parser.add_argument("--pages-per-task", type=int, default=ingestion_logic.SPLIT_PAGES_PER_TASK)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_paths = make_corpus(tmp_dir, [args.large_pages] + [args.small_pages] * args.small)
+        total_pages = args.large_pages + args.small * args.small_pages
+        print(f"Corpus: 1 x {args.large_pages} pages + {args.small} x {args.small_pages} pages, {args.workers} workers\n")
+
+        # One task per file, as before splitting existed
+        unsplit_seconds, unsplit = time_parse(pdf_paths, total_pages + 1, args.workers)
+        split_seconds, split = time_parse(pdf_paths, args.pages_per_task, args.workers)
+
+    print(f"{'mode':>22} {'seconds':>8} {'pages/s':>8}")
+    print(f"{'one task per PDF':>22} {unsplit_seconds:>8.2f} {total_pages / unsplit_seconds:>8.1f}")
+    print(f"{f'{args.pages_per_task}-page ranges':>22} {split_seconds:>8.2f} {total_pages / split_seconds:>8.1f}")
+    print(f"\nSpeedup: {unsplit_seconds / split_seconds:.2f}x; identical chunks: {unsplit == split}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_prompt_packing.py
+
+import argparse
+import time
+from pathlib import Path
+
+from analysis_logic import load_embedding_model, load_llm
+from chunk_store import ChunkStore
+from ingestion_logic import process_single_pdf
+from prompt_builder import PromptBuilder
+from verification_logic import YesNoScorer
+
+SYSTEM_PROMPT = "You are a travel planner. Your goal is to plan a fun trip for college friends. Evaluate if the following text is useful for this goal."
+QUERY = "Activities, food, nightlife and affordable restaurants for a 4-day trip with a group of college friends."
+QUESTION = "Is this text useful for planning a 4-day trip for college friends focused on activities, food, and nightlife? Answer only 'Yes' or 'No'."
+PACKED_QUESTION = "Is Excerpt {number} useful for planning a 4-day trip for college friends focused on activities, food, and nightlife? Answer only 'Yes' or 'No'."
+PROMPT_PREFIX = f"<|system|>\n{SYSTEM_PROMPT}</s>\n<|user|>\n"
+
+def prompt_suffix(chunks, corpus_id, text):
+    return (f"Excerpt from document '{chunks.metadata(corpus_id)['source_pdf']}':\n---\n{text}\n---\n"
+            f"{QUESTION}</s>\n<|assistant|>\n")
+
+def bench(llm, chunks, builder, pack):
+    """Logit verification of every chunk; `builder` None pastes the full chunk text. Returns (tokens, seconds, verdicts, prompts)."""
+    scorer = YesNoScorer(llm, PROMPT_PREFIX)
+    results = [{'corpus_id': i} for i in range(len(chunks))]
+    if builder is not None:
+        # Trimming is part of the cost: it tokenizes and embeds the sentences of long chunks
+        builder = PromptBuilder(builder.tokenize, chunks, builder.embedding_model, builder.query, builder.token_budget)
+    start = time.perf_counter()
+    groups = builder.pack(results) if pack else [[r] for r in results]
+    p_yes = []
+    for group in groups:
+        if len(group) == 1:
+            corpus_id = group[0]['corpus_id']
+            text = builder.excerpt(corpus_id) if builder is not None else chunks.text(corpus_id)
+            p_yes.append(scorer.score(prompt_suffix(chunks, corpus_id, text)))
+            continue
+        excerpts = "".join(f"Excerpt {number} from document '{chunks.metadata(r['corpus_id'])['source_pdf']}':\n"
+                           f"---\n{builder.excerpt(r['corpus_id'])}\n---\n" for number, r in enumerate(group, 1))
+        p_yes.extend(scorer.score_many(excerpts, [f"{PACKED_QUESTION.format(number=number)}</s>\n<|assistant|>\n"
+                                                  for number in range(1, len(group) + 1)]))
+    seconds = time.perf_counter() - start
+    return scorer.stats['suffix_tokens'], seconds, [p >= 0.5 for p in p_yes], len(groups)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens and time per verified chunk with full, trimmed and packed prompts.")
+    parser.add_argument("pdf_dir", help="Directory with PDFs to take sample chunks from.")
+    parser.add_argument("--chunks", type=int, default=15, help="Number of chunks to verify.")
+    parser.add_argument("--budget", type=int, default=None, help="Excerpt token budget (default: EXCERPT_TOKEN_BUDGET).")
+    args = parser.parse_args()
+
+    stores = []
+    for pdf_path in sorted(Path(args.pdf_dir).glob("*.pdf")):
+        stores.append(process_single_pdf(str(pdf_path))[1])
+        if sum(len(s) for s in stores) >= args.chunks:
+            break
+    chunks = ChunkStore.concat(stores)[:args.chunks]
+
+    llm, embedding_model = load_llm(), load_embedding_model()
+    builder = PromptBuilder(lambda text: llm.tokenize(text.encode("utf-8"), add_bos=False), chunks,
+                            embedding_model, embedding_model.encode(QUERY))
+    if args.budget is not None:
+        builder.token_budget = args.budget
+    results = {"full": bench(llm, chunks, None, False),
+               "trimmed": bench(llm, chunks, builder, False),
+               "packed": bench(llm, chunks, builder, True)}
+
+    for name, (tokens, seconds, verdicts, prompts) in results.items():
+        agreement = sum(a == b for a, b in zip(results["full"][2], verdicts)) / len(chunks)
+        print(f"{name:>8}: {tokens / len(chunks):7.1f} tokens evaluated/chunk, {seconds / len(chunks) * 1000:7.1f} ms/chunk, "
+              f"{prompts:3d} prompts, verdict agreement with full text {agreement:.0%}")
+
+if __name__ == "__main__":
+    main()
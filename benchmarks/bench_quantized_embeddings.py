@@ -0,0 +1,57 @@
+# benchmarks/bench_quantized_embeddings.py
+
+import argparse
+import random
+import time
+from pathlib import Path
+import numpy as np
+
+from ingestion_logic import load_ingestion_model, make_chunk_encoder, parse_pdfs
+from initialize_model import load_quantized_embedding_model
+from vector_index import build_index, normalize
+
+def encode(model, texts, repeat):
+    """Best-of-`repeat` chunk encoding through the ingestion encoder; returns (embeddings, seconds, tokens)."""
+    best = None
+    for _ in range(repeat):
+        encode_chunks, embedder = make_chunk_encoder(model)
+        start = time.perf_counter()
+        embeddings = encode_chunks(texts)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return embeddings, best, embedder.stats["tokens"] if embedder is not None else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode throughput and top-k retrieval agreement of the int8 embedding model against fp32.")
+    parser.add_argument("pdf_dirs", nargs="+", help="Directories with PDFs; each is measured as its own corpus (e.g. the sample collections).")
+    parser.add_argument("--queries", type=int, default=50, help="Section titles sampled per corpus as queries.")
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=2, help="Encoding runs per model; the fastest is reported.")
+    args = parser.parse_args()
+
+    models = {"fp32": load_ingestion_model(), "int8": load_quantized_embedding_model()}
+    print(f"\n{'corpus':>24} {'model':>6} {'chunks/s':>9} {'tokens/s':>9} {'speedup':>8} {'cosine':>8} {'overlap@k':>10}")
+    for pdf_dir in args.pdf_dirs:
+        pdf_paths = [str(p) for p in sorted(Path(pdf_dir).glob("*.pdf"))]
+        chunks = [chunk for _, store in parse_pdfs(pdf_paths) for chunk in store]
+        texts = [chunk['chunk_text'] for chunk in chunks]
+        titles = sorted({chunk['metadata']['section_title'] for chunk in chunks})
+        queries = random.Random(0).sample(titles, min(args.queries, len(titles)))
+
+        results = {}
+        for name, model in models.items():
+            embeddings, seconds, tokens = encode(model, texts, args.repeat)
+            # Each model embeds its own queries, as the analysis step would with that model selected
+            hits = [{r['corpus_id'] for r in build_index(embeddings).search(q, args.top_k)} for q in model.encode(queries)]
+            results[name] = (embeddings, seconds, tokens, hits)
+
+        reference, fp32_seconds, _, fp32_hits = results["fp32"]
+        for name, (embeddings, seconds, tokens, hits) in results.items():
+            cosine = float(np.mean(np.sum(normalize(reference) * normalize(embeddings), axis=1)))
+            overlap = np.mean([len(a & b) / max(len(a), 1) for a, b in zip(fp32_hits, hits)])
+            tokens_per_second = f"{tokens / seconds:>9.0f}" if tokens else f"{'-':>9}"
+            print(f"{Path(pdf_dir).parent.name or pdf_dir:>24} {name:>6} {len(texts) / seconds:>9.1f} {tokens_per_second} "
+                  f"{fp32_seconds / seconds:>7.2f}x {cosine:>8.5f} {overlap:>10.3f}")
+
+if __name__ == "__main__":
+    main()
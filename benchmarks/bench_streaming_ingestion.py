@@ -0,0 +1,40 @@
+# benchmarks/bench_streaming_ingestion.py
+
+import argparse
+import time
+from pathlib import Path
+
+import ingestion_logic
+from ingestion_logic import load_ingestion_model, ingest_pdfs
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two-phase and streaming ingestion (parse + embed) end to end.")
+    parser.add_argument("pdf_dirs", nargs="+", help="Directories with PDFs to ingest.")
+    parser.add_argument("--repeat", type=int, default=2, help="Runs per mode; the best time is reported.")
+    args = parser.parse_args()
+
+    pdf_paths = [str(p) for d in args.pdf_dirs for p in sorted(Path(d).glob("*.pdf"))]
+    # Every run must parse and embed from scratch
+    ingestion_logic.USE_EMBEDDING_CACHE = False
+    # Loaded once up front, so both modes are measured without the model load
+    model = load_ingestion_model()
+
+    timings = {}
+    for streaming in (False, True):
+        ingestion_logic.STREAMING_INGESTION = streaming
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = ingest_pdfs(pdf_paths, model=model)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings["streaming" if streaming else "two-phase"] = best
+
+    num_chunks = sum(len(chunks) for chunks, _ in results.values())
+    print(f"\n{len(pdf_paths)} PDFs, {num_chunks} chunks")
+    for name, seconds in timings.items():
+        print(f"{name:>10}: {seconds:6.2f}s  ({num_chunks / seconds:7.1f} chunks/s)")
+    print(f"   speedup: {timings['two-phase'] / timings['streaming']:.2f}x")
+
+if __name__ == "__main__":
+    main()
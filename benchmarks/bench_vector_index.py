@@ -0,0 +1,73 @@
+# benchmarks/bench_vector_index.py
+
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+
+from vector_index import ExactIndex, IVFIndex, QuantizedIndex
+
+def synthetic_embeddings(num_vectors, dim, num_topics, seed=0):
+    """Clustered vectors that loosely imitate sentence embeddings of a topical corpus."""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(num_topics, dim))
+    vectors = topics[rng.integers(0, num_topics, num_vectors)] + 1.5 * rng.normal(size=(num_vectors, dim))
+    return vectors.astype(np.float32)
+
+def cached_embeddings(cache_dir):
+    """All embeddings stored in the ingestion cache, e.g. after running the sample collections."""
+    arrays = [np.load(p) for p in sorted(Path(cache_dir).glob("*/embeddings.npy"))]
+    return np.concatenate(arrays) if arrays else None
+
+def measure(index, queries, top_k, **search_args):
+    start = time.perf_counter()
+    results = [index.search(q, top_k, **search_args) for q in queries]
+    return results, (time.perf_counter() - start) / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall, latency and memory of the IVF and quantized indexes against exact search.")
+    parser.add_argument("--vectors", type=int, default=200_000, help="Number of synthetic vectors.")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--from-cache", metavar="CACHE_DIR", help="Use the embeddings from an ingestion cache instead.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--probes", type=int, nargs="+", default=[2, 4, 8, 16, 32])
+    parser.add_argument("--quantized", nargs="*", default=["int8", "float16"], help="Quantized stores to compare.")
+    args = parser.parse_args()
+
+    embeddings = cached_embeddings(args.from_cache) if args.from_cache else synthetic_embeddings(args.vectors, args.dim, args.topics)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, so every query has genuine near neighbours
+    queries = embeddings[rng.integers(0, len(embeddings), args.queries)] + 0.3 * rng.normal(size=(args.queries, embeddings.shape[1]))
+
+    exact = ExactIndex(embeddings)
+    start = time.perf_counter()
+    ivf = IVFIndex.build(embeddings)
+    print(f"{len(embeddings)} vectors; IVF build with {len(ivf.centroids)} lists took {time.perf_counter() - start:.2f}s\n")
+
+    truth, exact_latency = measure(exact, queries, args.top_k)
+    exact_bytes = exact.vectors.nbytes
+    print(f"{'index':>12} {'recall@k':>9} {'same order':>10} {'ms/query':>9} {'speedup':>8} {'RAM':>6}")
+    print(f"{'exact':>12} {1.0:>9.3f} {1.0:>10.3f} {exact_latency * 1000:>9.2f} {1.0:>7.1f}x {1.0:>5.2f}x")
+    truth_ids = [[r['corpus_id'] for r in hits] for hits in truth]
+
+    def report(name, results, latency, memory_bytes):
+        recall = np.mean([len(set(t) & {r['corpus_id'] for r in hits}) / len(t) for t, hits in zip(truth_ids, results)])
+        same_order = np.mean([t == [r['corpus_id'] for r in hits] for t, hits in zip(truth_ids, results)])
+        print(f"{name:>12} {recall:>9.3f} {same_order:>10.3f} {latency * 1000:>9.2f} "
+              f"{exact_latency / latency:>7.1f}x {memory_bytes / exact_bytes:>5.2f}x")
+
+    ivf_bytes = ivf.vectors.nbytes + ivf.centroids.nbytes + ivf.list_ids.nbytes
+    for n_probe in args.probes:
+        results, latency = measure(ivf, queries, args.top_k, n_probe=n_probe)
+        report(f"ivf/{n_probe}", results, latency, ivf_bytes)
+
+    for kind in args.quantized:
+        store = QuantizedIndex.build(embeddings, kind)
+        results, latency = measure(store, queries, args.top_k)
+        report(kind, results, latency, store.memory_bytes())
+        del store
+
+if __name__ == "__main__":
+    main()
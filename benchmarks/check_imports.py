@@ -0,0 +1,66 @@
+# benchmarks/check_imports.py
+
+import argparse
+import subprocess
+import sys
+
+# --- CONFIGURATION ---
+# Packages that only the embedding and LLM stages may load
+HEAVY_PACKAGES = ("torch", "sentence_transformers", "transformers", "llama_cpp")
+# Wall-clock budget for `import run_challenge` in a fresh interpreter
+IMPORT_BUDGET_SECONDS = 0.25
+
+def loaded_heavy_packages():
+    """Heavy packages imported by the current process; submitted to PDF workers to inspect them."""
+    return sorted({name.split(".")[0] for name in sys.modules} & set(HEAVY_PACKAGES))
+
+def measure_cli_import(module="run_challenge"):
+    """Imports `module` in a fresh interpreter; returns (seconds, heavy packages it loaded)."""
+    code = (f"import time, sys; start = time.perf_counter(); import {module}; elapsed = time.perf_counter() - start; "
+            f"print(elapsed); print(','.join(sorted({{n.split('.')[0] for n in sys.modules}} & set({HEAVY_PACKAGES!r}))))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.splitlines()
+    # The last two lines; PyMuPDF may print a deprecation notice first
+    return float(output[-2]), [name for name in output[-1].split(",") if name]
+
+def check_pdf_worker(pdf_path, load_parent_model):
+    """
+    Parses `pdf_path` in a PDF worker started the way ingestion starts them and returns the heavy
+    packages loaded in that worker. With `load_parent_model`, the parent imports torch and
+    sentence_transformers first, as it does when streaming ingestion loads the model.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from ingestion_logic import pdf_worker_context, process_single_pdf
+    # Imported by module name so the worker can unpickle it even when this file runs as __main__
+    from benchmarks.check_imports import loaded_heavy_packages as probe
+
+    if load_parent_model:
+        import sentence_transformers
+    with ProcessPoolExecutor(1, mp_context=pdf_worker_context()) as executor:
+        executor.submit(process_single_pdf, pdf_path).result()
+        return executor.submit(probe).result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check CLI import time and that PDF workers stay free of torch. Exits non-zero on failure.")
+    parser.add_argument("pdf_path", help="A PDF for the worker check.")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="Import time budget in seconds.")
+    args = parser.parse_args()
+
+    failures = []
+    seconds, heavy = measure_cli_import()
+    print(f"import run_challenge: {seconds:.3f}s (budget {args.budget:.2f}s), heavy packages: {heavy or 'none'}")
+    if seconds > args.budget:
+        failures.append(f"importing run_challenge took {seconds:.3f}s")
+    if heavy:
+        failures.append(f"importing run_challenge loaded {', '.join(heavy)}")
+
+    worker_heavy = check_pdf_worker(args.pdf_path, load_parent_model=True)
+    print(f"PDF worker (parent with torch loaded): heavy packages: {worker_heavy or 'none'}")
+    if worker_heavy:
+        failures.append(f"PDF worker loaded {', '.join(worker_heavy)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/check_memory_bound.py
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# --- CONFIGURATION ---
+PAGE_COUNTS = [250, 1000, 2000]
+# Peak RSS the windowed worker may gain from the shortest to the longest document. What remains
+# proportional to page count is the chunk text itself, a few KiB per page of the synthetic PDFs.
+ALLOWED_GROWTH_MB = 24
+
+def child(mode, pdf_path):
+    """Parses `pdf_path` in this process the way a PDF worker would; prints chunks and peak RSS in MiB."""
+    from ingestion_logic import process_single_pdf, process_windowed_pdf
+    process = process_windowed_pdf if mode == "windowed" else process_single_pdf
+    _, chunks, _ = process(pdf_path)
+    # ru_maxrss is in KiB on Linux
+    print(len(chunks), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+def peak_rss(mode, pdf_path):
+    """Runs `child` in a fresh interpreter, so every measurement starts from the same footprint."""
+    output = subprocess.run([sys.executable, "-m", "benchmarks.check_memory_bound", "--child", mode, str(pdf_path)],
+                            capture_output=True, text=True, check=True).stdout.split()
+    # The last two fields; PyMuPDF may print a deprecation notice first
+    return int(output[-2]), float(output[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the peak RSS of windowed PDF parsing stays flat as page count grows. Exits non-zero on failure.")
+    parser.add_argument("--pages", type=int, nargs="+", default=PAGE_COUNTS, help="Page counts of the synthetic PDFs.")
+    parser.add_argument("--allowed-growth", type=float, default=ALLOWED_GROWTH_MB, help="Allowed peak RSS growth in MiB.")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    from benchmarks.synthetic_pdfs import make_synthetic_pdf
+    peaks = {"whole": [], "windowed": []}
+    print(f"{'pages':>6} {'chunks':>7} {'whole MiB':>10} {'windowed MiB':>13}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for pages in sorted(args.pages):
+            pdf_path = Path(tmp_dir) / f"synthetic_{pages}.pdf"
+            make_synthetic_pdf(pdf_path, pages, font_tiers=3)
+            chunks, whole = peak_rss("whole", pdf_path)
+            windowed_chunks, windowed = peak_rss("windowed", pdf_path)
+            assert chunks == windowed_chunks, "windowed parsing changed the chunks"
+            peaks["whole"].append(whole)
+            peaks["windowed"].append(windowed)
+            print(f"{pages:>6} {chunks:>7} {whole:>10.1f} {windowed:>13.1f}")
+
+    growth = peaks["windowed"][-1] - peaks["windowed"][0]
+    print(f"Windowed peak RSS grew by {growth:.1f} MiB (allowed {args.allowed_growth:.0f} MiB), "
+          f"whole-document parsing by {peaks['whole'][-1] - peaks['whole'][0]:.1f} MiB")
+    if growth > args.allowed_growth:
+        print(f"FAIL: windowed peak RSS grew by {growth:.1f} MiB")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# benchmarks/run_suite.py
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+import fitz  # PyMuPDF
+
+import ingestion_logic
+from extract_outline import PDFOutlineExtractor
+from ingestion_logic import chunk_document, load_ingestion_model, make_chunk_encoder
+from vector_index import build_index
+from benchmarks.synthetic_pdfs import make_corpus
+from benchmarks.bench_vector_index import synthetic_embeddings
+
+# --- CONFIGURATION ---
+BENCHMARKS = ("outline", "chunking", "embedding", "retrieval")
+REGRESSION_TOLERANCE = 0.10 # A throughput this much below the baseline's is reported as a regression
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+def best_of(repeat, fn):
+    """Runs `fn` `repeat` times; returns (fastest wall time, result of the last run)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_outline(pdf_paths, repeat):
+    """`PDFOutlineExtractor.extract_outline` over the corpus, one document at a time."""
+    extractor = PDFOutlineExtractor()
+    seconds, outlines = best_of(repeat, lambda: [extractor.extract_outline(p) for p in pdf_paths])
+    pages = 0
+    for pdf_path in pdf_paths:
+        with fitz.open(pdf_path) as doc:
+            pages += len(doc)
+    return {
+        "metric": "pages_per_second", "value": pages / seconds, "seconds": seconds, "pages": pages,
+        "headings": sum(len(o["outline"]) for o in outlines),
+    }
+
+def bench_chunking(pdf_paths, repeat):
+    """The ingestion chunker alone, on outlines and page layouts extracted beforehand. Returns (result, chunks)."""
+    extractor = PDFOutlineExtractor()
+    parsed = [(p, *extractor.extract_outline_and_layouts(p)) for p in pdf_paths]
+    seconds, chunks = best_of(repeat, lambda: [c for p, outline, layouts in parsed for c in chunk_document(p, outline, layouts)])
+    return {"metric": "chunks_per_second", "value": len(chunks) / seconds, "seconds": seconds, "chunks": len(chunks)}, chunks
+
+def bench_embedding(texts, repeat):
+    """Chunk embedding the way ingestion does it (`make_chunk_encoder`). Returns (result, embeddings)."""
+    model = load_ingestion_model()
+    encode, embedder = make_chunk_encoder(model)
+    encode(texts[:8]) # Warm-up, so the first timed run does not pay for lazy initialization
+    if embedder is not None:
+        embedder.stats = dict.fromkeys(embedder.stats, 0)
+    seconds, embeddings = best_of(repeat, lambda: encode(texts))
+    result = {"metric": "chunks_per_second", "value": len(texts) / seconds, "seconds": seconds, "chunks": len(texts)}
+    if embedder is not None:
+        tokens = embedder.stats["tokens"] / repeat
+        result.update(tokens=tokens, tokens_per_second=tokens / seconds)
+    return result, embeddings
+
+def bench_retrieval(embeddings, num_vectors, num_queries, top_k, index_kind, repeat, seed=0):
+    """
+    `index.search` with the configured index over `num_vectors` vectors: the chunk embeddings,
+    replicated with noise up to that size, or clustered synthetic vectors if there are none.
+    """
+    rng = np.random.default_rng(seed)
+    if embeddings is None or not len(embeddings):
+        corpus = synthetic_embeddings(num_vectors, 384, max(num_vectors // 400, 1), seed=seed)
+    else:
+        corpus = embeddings[rng.integers(0, len(embeddings), num_vectors)]
+        corpus = corpus + 0.05 * rng.normal(size=corpus.shape).astype(np.float32)
+    queries = corpus[rng.integers(0, len(corpus), num_queries)] + 0.3 * rng.normal(size=(num_queries, corpus.shape[1]))
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        index = build_index(corpus, index_kind, index_dir=index_dir)
+        build_seconds = time.perf_counter() - start
+        seconds, _ = best_of(repeat, lambda: [index.search(q, top_k) for q in queries])
+    return {
+        "metric": "queries_per_second", "value": num_queries / seconds, "seconds": seconds, "queries": num_queries,
+        "vectors": num_vectors, "index": index.kind, "build_seconds": build_seconds,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, tolerance):
+    """Compares each benchmark's throughput with the baseline's; returns the names of the regressed benchmarks."""
+    if baseline["corpus"] != results["corpus"]:
+        print("Warning: the baseline was measured on a different corpus; ratios may not be meaningful.")
+    regressions = []
+    print(f"\n{'benchmark':>10} {'metric':>20} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None or base["metric"] != result["metric"]:
+            continue
+        ratio = result["value"] / base["value"]
+        regressed = ratio < 1 - tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:>10} {result['metric']:>20} {base['value']:>10.1f} {result['value']:>10.1f} {ratio:>6.2f}x"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark outline extraction, chunking, embedding and retrieval on a synthetic PDF corpus. "
+                                                 "Exits non-zero if a throughput regressed against --baseline.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS), help="Benchmarks to run.")
+    parser.add_argument("--pdfs", type=int, default=20, help="Number of synthetic PDFs.")
+    parser.add_argument("--pages", type=int, default=30, help="Pages per PDF.")
+    parser.add_argument("--headings-per-page", type=int, default=3)
+    parser.add_argument("--lines-per-section", type=int, default=6)
+    parser.add_argument("--font-tiers", type=int, default=2, help="Number of heading font sizes (1-4).")
+    parser.add_argument("--unnumbered", action="store_true", help="Headings without '1.2'-style prefixes, leveled by font size only.")
+    parser.add_argument("--no-footers", action="store_true")
+    parser.add_argument("--forms", type=int, default=1, help="How many of the PDFs are forms.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--retrieval-vectors", type=int, default=50_000)
+    parser.add_argument("--index", default=ingestion_logic.VECTOR_INDEX, help="Vector index kind for retrieval.")
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the fastest is reported.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the results JSON.")
+    parser.add_argument("--baseline", help="A results JSON from an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    corpus = {
+        "pdfs": args.pdfs, "pages": args.pages, "headings_per_page": args.headings_per_page,
+        "lines_per_section": args.lines_per_section, "font_tiers": args.font_tiers, "numbered": not args.unnumbered,
+        "footers": not args.no_footers, "forms": args.forms, "seed": args.seed,
+    }
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "corpus": corpus,
+        "benchmarks": {},
+    }
+    benchmarks = results["benchmarks"]
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        print(f"Generating {args.pdfs} synthetic PDFs of {args.pages} pages...")
+        pdf_paths = make_corpus(corpus_dir, [args.pages] * args.pdfs, seed=args.seed, num_forms=args.forms,
+                                sections_per_page=args.headings_per_page, lines_per_section=args.lines_per_section,
+                                font_tiers=args.font_tiers, numbered=not args.unnumbered, footer=not args.no_footers)
+
+        if "outline" in args.only:
+            benchmarks["outline"] = bench_outline(pdf_paths, args.repeat)
+        chunks = []
+        if "chunking" in args.only or "embedding" in args.only:
+            chunking, chunks = bench_chunking(pdf_paths, args.repeat)
+            if "chunking" in args.only:
+                benchmarks["chunking"] = chunking
+
+    embeddings = None
+    if "embedding" in args.only:
+        if not Path(ingestion_logic.MODEL_PATH).exists():
+            print(f"Skipping embedding: no model at {ingestion_logic.MODEL_PATH} (run initialize_model.py first).")
+        else:
+            benchmarks["embedding"], embeddings = bench_embedding([c['chunk_text'] for c in chunks], args.repeat)
+    if "retrieval" in args.only:
+        benchmarks["retrieval"] = bench_retrieval(embeddings, args.retrieval_vectors, args.queries, args.top_k, args.index, args.repeat, args.seed)
+
+    print(f"\n{'benchmark':>10} {'metric':>20} {'value':>10} {'seconds':>8}")
+    for name, result in benchmarks.items():
+        print(f"{name:>10} {result['metric']:>20} {result['value']:>10.1f} {result['seconds']:>8.3f}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"FAIL: {', '.join(regressions)} regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
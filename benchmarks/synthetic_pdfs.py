@@ -0,0 +1,90 @@
+# benchmarks/synthetic_pdfs.py
+
+import random
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+WORDS = ("travel city museum recipe dinner budget beach hotel market festival form signature export "
+         "document share review train coast village wine cheese hike night club ticket guide").split()
+
+# --- CONFIGURATION ---
+BODY_FONT_SIZE = 10
+HEADING_FONT_SIZES = [14, 18, 16, 12] # Tier 1 is the size the original generator used; further tiers are 2+ points apart
+PAGE_MARGIN = 72
+
+def write_body_line(page, y, words, spans_per_line):
+    """Writes one body line at baseline `y` as `spans_per_line` runs alternating regular and italic."""
+    if spans_per_line <= 1:
+        page.insert_text((PAGE_MARGIN, y), " ".join(words), fontsize=BODY_FONT_SIZE)
+        return
+    x = PAGE_MARGIN
+    run_length = -(-len(words) // spans_per_line)
+    for run in range(spans_per_line):
+        text = " ".join(words[run * run_length:(run + 1) * run_length]) + " "
+        fontname = "heit" if run % 2 else "helv"
+        page.insert_text((x, y), text, fontsize=BODY_FONT_SIZE, fontname=fontname)
+        x += fitz.get_text_length(text, fontname=fontname, fontsize=BODY_FONT_SIZE)
+
+def make_synthetic_pdf(path, num_pages, seed=0, sections_per_page=3, lines_per_section=6,
+                       font_tiers=1, numbered=True, footer=True, form=False, spans_per_line=1):
+    """
+    Writes a PDF that exercises the outline heuristics: a large title, bold headings, body
+    paragraphs and a recurring footer with page numbers.
+    `sections_per_page` sets the heading density, `font_tiers` how many heading sizes are used
+    (cycling through HEADING_FONT_SIZES), `numbered` whether headings carry "1.2"-style prefixes,
+    `footer` whether each page has the footer, and `form` whether the first page gets a fillable
+    text field, which makes PyMuPDF report the document as a form. With `spans_per_line` > 1, body
+    lines alternate between regular and italic runs, so each line is that many spans.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(num_pages):
+        page = doc.new_page()
+        bottom = page.rect.height - PAGE_MARGIN
+        y = PAGE_MARGIN
+        if page_num == 0:
+            page.insert_text((150, y), f"Synthetic Guide {seed}", fontsize=22, fontname="hebo")
+            y += 40
+        for section in range(sections_per_page):
+            tier = section % font_tiers
+            # Larger headings get more room above them, so PyMuPDF keeps them out of the preceding paragraph
+            y += 2 * max(HEADING_FONT_SIZES[tier] - HEADING_FONT_SIZES[0], 0)
+            if y + 22 + 13 > bottom:
+                break
+            heading = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)}"
+            if numbered:
+                heading = f"{page_num + 1}.{section + 1} {heading}"
+            page.insert_text((PAGE_MARGIN, y), heading, fontsize=HEADING_FONT_SIZES[tier], fontname="hebo")
+            y += 22
+            for _ in range(lines_per_section):
+                if y > bottom:
+                    break
+                write_body_line(page, y, [rng.choice(WORDS) for _ in range(12)], spans_per_line)
+                y += 13
+            y += 10
+        if footer:
+            page.insert_text((PAGE_MARGIN, page.rect.height - 30), "Synthetic Corpus Confidential Report", fontsize=8)
+            page.insert_text((500, page.rect.height - 30), str(page_num + 1), fontsize=8)
+        if form and page_num == 0:
+            widget = fitz.Widget()
+            widget.field_name = "signature"
+            widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+            widget.rect = fitz.Rect(PAGE_MARGIN, bottom - 20, 300, bottom)
+            page.add_widget(widget)
+    doc.save(str(path))
+    doc.close()
+
+def make_corpus(out_dir, page_counts, seed=0, num_forms=0, **pdf_options):
+    """
+    Writes one synthetic PDF per entry of `page_counts` into `out_dir` and returns their paths.
+    The last `num_forms` PDFs are forms; `pdf_options` are passed on to `make_synthetic_pdf`.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, num_pages in enumerate(page_counts):
+        path = out_dir / f"synthetic_{i:03d}_{num_pages}p.pdf"
+        make_synthetic_pdf(path, num_pages, seed=seed + i, form=i >= len(page_counts) - num_forms, **pdf_options)
+        paths.append(str(path))
+    return paths
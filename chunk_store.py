@@ -0,0 +1,225 @@
+# chunk_store.py
+
+import hashlib
+import json
+import os
+import shutil
+from collections.abc import Sequence
+from pathlib import Path
+import numpy as np
+
+# --- CONFIGURATION ---
+# Arrays of a stored ChunkStore, one .npy file each, so every column can be memory-mapped on its own
+COLUMNS = ("text_buffer", "text_offsets", "title_buffer", "title_offsets", "doc_ids", "pages", "level_ids")
+STRINGS_FILE = "strings.json" # The interned source PDF names and heading levels
+
+def _pack(strings):
+    """Returns (UTF-8 buffer, int64 offsets) for a list of strings; string i is buffer[offsets[i]:offsets[i + 1]]."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def _intern(values, table):
+    """Maps `values` to ids in `table` (value -> id), adding the ones it does not hold yet."""
+    return [table.setdefault(value, len(table)) for value in values]
+
+class ChunkStore(Sequence):
+    """
+    Columnar store of chunks: texts and section titles live in two contiguous UTF-8 buffers with
+    offsets, source PDFs and heading levels are interned ids into short string tables, and page
+    numbers are an int32 array. A million chunks are a handful of arrays instead of a million dicts,
+    pickle as a few buffers from the PDF workers, and can be saved and memory-mapped back.
+
+    It still reads like the list of chunk dicts it replaces (a Sequence: `len`, indexing and
+    iteration yield {'chunk_text', 'metadata'}, a slice is a new store), but hot paths should use
+    `text(i)` and `metadata(i)`, which only decode the one chunk they are asked for.
+    """
+
+    def __init__(self, text_buffer, text_offsets, title_buffer, title_offsets, doc_ids, pages, level_ids, sources, levels):
+        self.text_buffer = text_buffer
+        self.text_offsets = text_offsets
+        self.title_buffer = title_buffer
+        self.title_offsets = title_offsets
+        self.doc_ids = doc_ids
+        self.pages = pages
+        self.level_ids = level_ids
+        self.sources = sources
+        self.levels = levels
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Packs chunk dicts ({'chunk_text', 'metadata'}) as produced by the chunkers."""
+        sources, levels = {}, {}
+        metadatas = [chunk['metadata'] for chunk in chunks]
+        text_buffer, text_offsets = _pack([chunk['chunk_text'] for chunk in chunks])
+        title_buffer, title_offsets = _pack([m['section_title'] for m in metadatas])
+        return cls(
+            text_buffer, text_offsets, title_buffer, title_offsets,
+            np.asarray(_intern([m['source_pdf'] for m in metadatas], sources), dtype=np.int32),
+            np.asarray([m['page_number'] for m in metadatas], dtype=np.int32),
+            np.asarray(_intern([m['heading_level'] for m in metadatas], levels), dtype=np.int8),
+            list(sources), list(levels),
+        )
+
+    @classmethod
+    def concat(cls, stores):
+        """One store holding the chunks of `stores`, in order; ids are re-interned into shared tables."""
+        stores = list(stores)
+        sources, levels = {}, {}
+        doc_ids, level_ids = [], []
+        for store in stores:
+            # An id remap per store turns its local ids into ids of the shared tables
+            doc_ids.append(np.asarray(_intern(store.sources, sources), dtype=np.int32)[store.doc_ids])
+            level_ids.append(np.asarray(_intern(store.levels, levels), dtype=np.int8)[store.level_ids])
+
+        def concat_buffers(buffer_name, offsets_name):
+            buffers = [np.asarray(getattr(store, buffer_name)) for store in stores]
+            starts = np.cumsum([0] + [len(buffer) for buffer in buffers])
+            offsets = [np.asarray(getattr(store, offsets_name))[:-1] + start for store, start in zip(stores, starts)]
+            return np.concatenate(buffers or [np.zeros(0, dtype=np.uint8)]), np.concatenate(offsets + [starts[-1:]]).astype(np.int64)
+
+        text_buffer, text_offsets = concat_buffers("text_buffer", "text_offsets")
+        title_buffer, title_offsets = concat_buffers("title_buffer", "title_offsets")
+        return cls(
+            text_buffer, text_offsets, title_buffer, title_offsets,
+            np.concatenate(doc_ids or [np.zeros(0, dtype=np.int32)]),
+            np.concatenate([np.asarray(store.pages) for store in stores] or [np.zeros(0, dtype=np.int32)]),
+            np.concatenate(level_ids or [np.zeros(0, dtype=np.int8)]),
+            list(sources), list(levels),
+        )
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def text(self, i) -> str:
+        return self.text_buffer[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode("utf-8")
+
+    def metadata(self, i) -> dict:
+        """The metadata dict of chunk `i`, in the shape the chunkers produce it."""
+        return {
+            'source_pdf': self.sources[self.doc_ids[i]],
+            'page_number': int(self.pages[i]),
+            'section_title': self.title_buffer[self.title_offsets[i]:self.title_offsets[i + 1]].tobytes().decode("utf-8"),
+            'heading_level': self.levels[self.level_ids[i]],
+        }
+
+    def texts(self):
+        """Yields the chunk texts in order, decoding one at a time."""
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ChunkStore.from_chunks([self[j] for j in range(*i.indices(len(self)))])
+        if not -len(self) <= i < len(self):
+            raise IndexError("chunk index out of range")
+        i %= len(self)
+        return {'chunk_text': self.text(i), 'metadata': self.metadata(i)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if not isinstance(other, ChunkStore):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def with_source(self, source_pdf: str):
+        """This store with every chunk attributed to `source_pdf` (the columns are shared, not copied)."""
+        return ChunkStore(self.text_buffer, self.text_offsets, self.title_buffer, self.title_offsets, np.zeros_like(self.doc_ids),
+                          self.pages, self.level_ids, [source_pdf], self.levels)
+
+    def with_levels(self, levels: list[str]):
+        """This store with `levels[i]` as the heading level of chunk i (the other columns are shared)."""
+        table = {}
+        level_ids = np.asarray(_intern(levels, table), dtype=np.int8).reshape(-1)
+        return ChunkStore(self.text_buffer, self.text_offsets, self.title_buffer, self.title_offsets, self.doc_ids,
+                          self.pages, level_ids, self.sources, list(table))
+
+    def memory_bytes(self):
+        """Size of the column arrays (the two short string tables are not counted)."""
+        return sum(np.asarray(getattr(self, name)).nbytes for name in COLUMNS)
+
+    def fingerprint(self) -> str:
+        """Hash of every chunk's text and metadata."""
+        digest = hashlib.sha256(json.dumps([self.sources, self.levels]).encode("utf-8"))
+        for name in COLUMNS:
+            digest.update(name.encode("utf-8"))
+            digest.update(memoryview(np.ascontiguousarray(getattr(self, name))).cast("B"))
+        return digest.hexdigest()
+
+    def save(self, directory):
+        """Writes the store as one .npy file per column into `directory`, which only appears once complete."""
+        directory = Path(directory)
+        tmp_dir = directory.with_name(f".{directory.name}.{os.getpid()}.tmp")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            for name in COLUMNS:
+                np.save(tmp_dir / f"{name}.npy", np.asarray(getattr(self, name)))
+            with open(tmp_dir / STRINGS_FILE, "w", encoding="utf-8") as f:
+                json.dump({"sources": self.sources, "levels": self.levels}, f)
+            os.replace(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Loads a saved store; with `mmap`, the columns are memory-mapped instead of read into RAM."""
+        directory = Path(directory)
+        with open(directory / STRINGS_FILE, "r", encoding="utf-8") as f:
+            strings = json.load(f)
+        columns = [np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None) for name in COLUMNS]
+        return cls(*columns, strings["sources"], strings["levels"])
+
+class ChunkCorpus(Sequence):
+    """
+    The chunks of many documents as one read-only sequence: their ChunkStores stay separate behind
+    an offset index instead of being concatenated, so stores memory-mapped from the embedding
+    cache are never copied into RAM. Reads like a ChunkStore (`text(i)`, `metadata(i)`, `texts()`).
+    """
+
+    def __init__(self, stores):
+        self.stores = list(stores)
+        # starts[d] is the corpus index of the first chunk of store d; starts[-1] is the total
+        self.starts = np.cumsum([0] + [len(store) for store in self.stores]).astype(np.int64)
+
+    def locate(self, i):
+        """Returns (store, index within that store) of corpus chunk `i`."""
+        if not -len(self) <= i < len(self):
+            raise IndexError("chunk index out of range")
+        i %= len(self)
+        d = int(np.searchsorted(self.starts, i, side="right")) - 1
+        return self.stores[d], i - int(self.starts[d])
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def text(self, i) -> str:
+        store, j = self.locate(i)
+        return store.text(j)
+
+    def metadata(self, i) -> dict:
+        store, j = self.locate(i)
+        return store.metadata(j)
+
+    def texts(self):
+        """Yields the chunk texts in order, decoding one at a time."""
+        for store in self.stores:
+            yield from store.texts()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ChunkStore.from_chunks([self[j] for j in range(*i.indices(len(self)))])
+        store, j = self.locate(i)
+        return store[j]
+
+    def __iter__(self):
+        for store in self.stores:
+            yield from store
+
+    def memory_bytes(self):
+        """Size of the column arrays of every store, memory-mapped ones included."""
+        return sum(store.memory_bytes() for store in self.stores)
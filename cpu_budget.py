@@ -0,0 +1,152 @@
+# cpu_budget.py
+
+import math
+import os
+from pathlib import Path
+
+import pipeline_profiler
+
+# --- CONFIGURATION ---
+CPU_BUDGET = None # CPUs the pipeline may use; None (or "auto") detects them from the cgroup CPU quota and the affinity mask
+CPU_BUDGET_ENV = "PIPELINE_CPUS" # Environment variable that overrides the detected budget, e.g. "4" or "2.5" (rounded down)
+USE_CPU_BUDGET = True # False sizes every stage from os.cpu_count(), as before the budget existed
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Native thread pools (OpenMP, OpenBLAS, MKL) that size themselves from the host's cores when imported
+NATIVE_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+_detected = None # (cpus, description), computed once per process
+_logged = set() # Stages whose allocation has been printed
+
+def _read_quota(path: Path):
+    """Quota in CPUs from a cgroup v2 cpu.max or v1 cpu.cfs_quota_us file in `path`, or None if unlimited or absent."""
+    try:
+        if (path / "cpu.max").is_file():
+            quota, period = (path / "cpu.max").read_text().split()
+            return None if quota == "max" else int(quota) / int(period)
+        if (path / "cpu.cfs_quota_us").is_file():
+            quota = int((path / "cpu.cfs_quota_us").read_text())
+            period = int((path / "cpu.cfs_period_us").read_text())
+            return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def cgroup_cpu_quota():
+    """
+    The CPU quota of this process's cgroup (and its parents) in CPUs, e.g. 2.5, or None if unlimited.
+    Reads cgroup v2 (cpu.max) and v1 (cpu.cfs_quota_us), as mounted in Docker containers.
+    """
+    try:
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return None
+    quotas = []
+    for line in lines:
+        _, controllers, cgroup_path = line.split(":", 2)
+        if controllers == "":
+            mounts = [Path(CGROUP_ROOT)]
+        elif "cpu" in controllers.split(","):
+            mounts = [Path(CGROUP_ROOT) / controllers, Path(CGROUP_ROOT) / "cpu", Path(CGROUP_ROOT) / "cpu,cpuacct"]
+        else:
+            continue
+        for mount in mounts:
+            # Inside a container the cgroup path may not exist under the mount; the mount root is its own cgroup then
+            path = mount / cgroup_path.lstrip("/")
+            while True:
+                quota = _read_quota(path)
+                if quota is not None:
+                    quotas.append(quota)
+                if path == mount or mount not in path.parents:
+                    break
+                path = path.parent
+    return min(quotas) if quotas else None
+
+def _parse_cpus(value):
+    """A CPU budget such as 4, "4" or "2.5" as a whole number of CPUs (rounded down, at least 1), or None if it is not one."""
+    try:
+        return max(math.floor(float(value)), 1)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def detect_cpus():
+    """Returns (cpus, description): the CPUs this process may actually use, and how that was determined."""
+    global _detected
+    if _detected is not None:
+        return _detected
+
+    host = os.cpu_count() or 1
+    override = os.environ.get(CPU_BUDGET_ENV) or CPU_BUDGET
+    if override and str(override).strip().lower() != "auto":
+        source = CPU_BUDGET_ENV if os.environ.get(CPU_BUDGET_ENV) else "CPU_BUDGET"
+        cpus = _parse_cpus(override)
+        if cpus is not None:
+            _detected = (cpus, f"set by {source}, {host} host CPUs")
+            return _detected
+        # A typo must not stop the pipeline at import time; the detected budget is a safe default
+        print(f"Warning: ignoring {source}={override!r}, which is not a number of CPUs; detecting the budget instead.")
+
+    affinity = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else host
+    quota = cgroup_cpu_quota()
+    cpus = affinity
+    if quota is not None:
+        # Rounded down: threads beyond the quota are throttled, not run
+        cpus = min(cpus, max(math.floor(quota), 1))
+    quota_text = f"cgroup quota {quota:g}" if quota is not None else "no cgroup quota"
+    _detected = (cpus, f"{affinity} of {host} host CPUs in the affinity mask, {quota_text}")
+    return _detected
+
+def allocate(stage: str, streaming: bool = False, num_workers: int = 1) -> int:
+    """
+    Returns the processes or threads `stage` may use:
+      "pdf_workers"        PDF parsing processes (single-threaded each)
+      "embedding_threads"  torch intra-op threads for chunk embedding
+      "llm_threads"        llama.cpp threads, per worker when `num_workers` > 1
+      "outline_workers"    processes of the standalone outline extractor
+    With `streaming`, PDF parsing and embedding run at the same time and split the budget;
+    otherwise each stage runs alone and gets all of it. The first allocation of each stage is
+    printed and recorded in the profile.
+    """
+    host = os.cpu_count() or 1
+    if not USE_CPU_BUDGET:
+        # The sizes each stage picked for itself before the budget existed
+        legacy = {"pdf_workers": host, "embedding_threads": host, "llm_threads": max(host - 1, 1) // num_workers, "outline_workers": host}
+        return max(legacy[stage], 1)
+
+    cpus, description = detect_cpus()
+    if stage in ("pdf_workers", "outline_workers"):
+        count = cpus - cpus // 2 if streaming else cpus
+    elif stage == "embedding_threads":
+        count = cpus // 2 if streaming else cpus
+    elif stage == "llm_threads":
+        count = cpus // max(num_workers, 1)
+    else:
+        raise ValueError(f"Unknown stage: '{stage}'")
+    count = max(count, 1)
+
+    key = (stage, streaming, num_workers)
+    if key not in _logged:
+        _logged.add(key)
+        detail = ", shared with embedding" if streaming and stage == "pdf_workers" else ", shared with PDF parsing" if streaming else ""
+        per_worker = f" x {num_workers} workers" if num_workers > 1 else ""
+        print(f"CPU budget: {cpus} ({description}) -> {stage} = {count}{per_worker}{detail}")
+        pipeline_profiler.record("cpu_allocation", stage=stage, count=count, num_workers=num_workers, streaming=streaming, cpus=cpus)
+    return count
+
+def set_torch_threads(count: int):
+    """Sizes torch's intra-op thread pool (torch is imported by the caller's stage anyway)."""
+    if not USE_CPU_BUDGET:
+        return # torch keeps its own default
+    import torch
+    if torch.get_num_threads() != count:
+        torch.set_num_threads(count)
+
+def limit_native_threads():
+    """
+    Caps the OpenMP/BLAS thread pools at the CPU budget through their environment variables. Call
+    it before NumPy or torch are imported; variables that are already set are left alone.
+    """
+    if not USE_CPU_BUDGET:
+        return
+    cpus, _ = detect_cpus()
+    for name in NATIVE_THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(cpus))
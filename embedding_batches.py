@@ -0,0 +1,105 @@
+# embedding_batches.py
+
+import time
+import numpy as np
+import torch
+
+# --- CONFIGURATION ---
+BATCH_TOKEN_BUDGET = 4096 # Padded tokens per forward pass (sequences in the batch x longest sequence)
+MAX_BATCH_SIZE = 128
+WINDOW_OVERLAP = 32 # Tokens shared by consecutive windows of a chunk longer than the model's limit
+
+def split_windows(token_ids, window_size, overlap=WINDOW_OVERLAP):
+    """Splits token ids into windows of at most `window_size` tokens, consecutive windows sharing `overlap`."""
+    if len(token_ids) <= window_size:
+        return [token_ids]
+    step = window_size - overlap
+    return [token_ids[start:start + window_size] for start in range(0, len(token_ids) - overlap, step)]
+
+def plan_batches(lengths, token_budget=BATCH_TOKEN_BUDGET, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Groups sequence indices into batches of similar length: sequences are sorted longest first and
+    a batch is closed once its padded size (size x longest sequence) would exceed `token_budget`.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches, batch = [], []
+    for i in order:
+        if batch and (len(batch) >= max_batch_size or (len(batch) + 1) * lengths[batch[0]] > token_budget):
+            batches.append(batch)
+            batch = []
+        batch.append(int(i))
+    if batch:
+        batches.append(batch)
+    return batches
+
+class TokenBudgetEmbedder:
+    """
+    Embeds chunks with a SentenceTransformer in length-sorted batches under a padded-token budget,
+    instead of `model.encode` over fixed-size batches in input order, where a few long chunks make
+    every batch mostly padding. Texts are tokenized once and the model runs on the token ids
+    directly. Chunks longer than the model's sequence limit are not truncated: they are embedded as
+    overlapping windows whose embeddings are averaged (weighted by window length) back into one
+    normalized vector for the chunk.
+    """
+
+    def __init__(self, model, token_budget=BATCH_TOKEN_BUDGET, max_batch_size=MAX_BATCH_SIZE):
+        self.model = model
+        self.tokenizer = model.tokenizer
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.window_size = model.max_seq_length - 2 # Room for [CLS] and [SEP]
+        self.stats = {"chunks": 0, "windows": 0, "tokens": 0, "padded_tokens": 0, "batches": 0, "seconds": 0.0}
+
+    def forward(self, sequences):
+        """Runs the model on token id sequences (without special tokens); returns float32 embeddings."""
+        # BERT-style models like all-MiniLM-L6-v2 wrap a single sequence as [CLS] tokens [SEP]
+        input_ids = [[self.tokenizer.cls_token_id, *s, self.tokenizer.sep_token_id] for s in sequences]
+        features = self.tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="pt")
+        features = {name: tensor.to(self.model.device) for name, tensor in features.items()}
+        with torch.inference_mode():
+            embeddings = self.model(features)["sentence_embedding"]
+        self.stats["padded_tokens"] += features["input_ids"].numel()
+        return embeddings.float().cpu().numpy()
+
+    def tokenize(self, texts):
+        """Token ids of each text, without special tokens and not truncated."""
+        start = time.perf_counter()
+        token_ids = self.tokenizer(list(texts), add_special_tokens=False, truncation=False, verbose=False)["input_ids"]
+        self.stats["seconds"] += time.perf_counter() - start
+        return token_ids
+
+    def embed(self, texts):
+        """Returns one float32 embedding per text, in input order."""
+        return self.embed_tokens(self.tokenize(texts))
+
+    def embed_tokens(self, token_ids):
+        """`embed` for texts already tokenized by `tokenize`."""
+        start = time.perf_counter()
+        windows, owners = [], []
+        for text_index, ids in enumerate(token_ids):
+            for window in split_windows(ids, self.window_size):
+                windows.append(window)
+                owners.append(text_index)
+        lengths = [len(w) + 2 for w in windows]
+
+        window_embeddings = None
+        for batch in plan_batches(lengths, self.token_budget, self.max_batch_size):
+            batch_embeddings = self.forward([windows[i] for i in batch])
+            if window_embeddings is None:
+                window_embeddings = np.empty((len(windows), batch_embeddings.shape[1]), dtype=np.float32)
+            window_embeddings[batch] = batch_embeddings
+            self.stats["batches"] += 1
+
+        if window_embeddings is None:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Length-weighted mean of each text's windows, renormalized; a single window is just normalized
+        embeddings = np.zeros((len(token_ids), window_embeddings.shape[1]), dtype=np.float32)
+        np.add.at(embeddings, owners, window_embeddings * np.asarray(lengths, dtype=np.float32)[:, None])
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        self.stats["chunks"] += len(token_ids)
+        self.stats["windows"] += len(windows)
+        self.stats["tokens"] += sum(lengths)
+        self.stats["seconds"] += time.perf_counter() - start
+        return embeddings
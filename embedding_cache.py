@@ -0,0 +1,78 @@
+# embedding_cache.py
+
+import errno
+import hashlib
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+
+from chunk_store import ChunkStore
+
+# --- CONFIGURATION ---
+CACHE_DIR = './cache/embeddings'
+HASH_BLOCK_SIZE = 1 << 20 # Read PDFs in 1 MiB blocks while hashing
+CACHE_FORMAT = "2" # Bump whenever the layout of a cache entry changes (2: columnar chunk store)
+
+def document_cache_key(pdf_path: str, pipeline_version: str) -> str:
+    """
+    Returns the cache key of a PDF: a hash of its bytes combined with the version string of
+    every stage that shapes its cached data (extractor, chunker, embedding model).
+    """
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    digest.update(pipeline_version.encode("utf-8"))
+    digest.update(CACHE_FORMAT.encode("utf-8"))
+    return digest.hexdigest()
+
+def corpus_cache_key(documents, pipeline_version: str) -> str:
+    """
+    Returns the key of a corpus from its documents' (file name, cache key) pairs, in order. The
+    document keys already hash every PDF's bytes, so no chunk or embedding is read to compute it.
+    """
+    digest = hashlib.sha256(pipeline_version.encode("utf-8"))
+    for source_pdf, cache_key in documents:
+        digest.update(f"\0{source_pdf}\0{cache_key}".encode("utf-8"))
+    return digest.hexdigest()
+
+def load_cached_document(cache_key: str, source_pdf: str, cache_dir: str = CACHE_DIR):
+    """
+    Loads the chunks (a ChunkStore) and embeddings cached under `cache_key`, or returns None on
+    a miss. Both are memory-mapped rather than read into RAM. `source_pdf` replaces the stored
+    file name, since identical bytes may have been cached under another name.
+    """
+    entry_dir = Path(cache_dir) / cache_key
+    chunks_dir = entry_dir / "chunks"
+    embeddings_path = entry_dir / "embeddings.npy"
+    if not (chunks_dir.is_dir() and embeddings_path.is_file()):
+        return None
+
+    try:
+        chunks = ChunkStore.load(chunks_dir)
+        embeddings = np.load(embeddings_path, mmap_mode='r')
+    except (OSError, ValueError, KeyError) as e:
+        print(f"  - Warning: Ignoring unreadable cache entry {cache_key[:12]}: {e}")
+        return None
+
+    if len(chunks) != len(embeddings):
+        return None
+    return chunks.with_source(source_pdf), embeddings
+
+def save_cached_document(cache_key: str, chunks: ChunkStore, embeddings: np.ndarray, cache_dir: str = CACHE_DIR):
+    """Writes one document's chunks and embeddings; the entry only becomes visible once complete."""
+    entry_dir = Path(cache_dir) / cache_key
+    tmp_dir = Path(cache_dir) / f".{cache_key}.{os.getpid()}.tmp"
+    try:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        chunks.save(tmp_dir / "chunks")
+        np.save(tmp_dir / "embeddings.npy", np.asarray(embeddings, dtype=np.float32))
+        os.replace(tmp_dir, entry_dir)
+    except OSError as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if e.errno in (errno.EEXIST, errno.ENOTEMPTY) and entry_dir.is_dir():
+            # Another process stored the same document first; either copy is valid
+            return
+        # E.g. a full disk or missing permissions: the run goes on, but later runs will not find this document
+        print(f"  - Warning: Could not write cache entry {cache_key[:12]}: {e}")
@@ -1,12 +1,45 @@
 # extract_outline.py
 
 import fitz  # PyMuPDF
+import argparse
+import glob
 import json
+import os
 import re
+import time
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, Counter
 import logging
 import statistics
+import collections
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from cpu_budget import allocate
+
+# Bump whenever a change to the heuristics can change the outline of a document;
+# it is part of the ingestion cache key.
+EXTRACTOR_VERSION = "2"
+# Classify a document's blocks at once with NumPy masks (`classify_blocks`) instead of calling
+# `is_heading` per block; both apply the same rules and give the same headings.
+VECTORIZED_HEADINGS = True
+# Command line: tasks submitted per worker before waiting for results, and how often progress is printed
+TASKS_IN_FLIGHT_PER_WORKER = 4
+PROGRESS_EVERY = 500
+# Documents with more pages are read PAGE_WINDOW pages at a time (`read_outline_windowed`), so
+# memory stays flat however long they are; their layouts are read twice instead of held at once
+WINDOWED_PAGES = 500
+PAGE_WINDOW = 16
+# MuPDF keeps every object it has parsed until a document is closed, so windowed reading reopens it this often
+REOPEN_EVERY_PAGES = 256
+
+# MuPDF reports a failed allocation as a RuntimeError such as "code=2: realloc (6144 bytes) failed"
+_failed_allocation = re.compile(r"\b(?:m|c|re)alloc\b.*\bfailed\b")
+
+def is_out_of_memory(error) -> bool:
+    """True for a MemoryError and for an allocation that failed inside MuPDF."""
+    return isinstance(error, MemoryError) or _failed_allocation.search(str(error)) is not None
 
 class PDFOutlineExtractor:
     def __init__(self):
@@ -24,22 +57,65 @@ class PDFOutlineExtractor:
         # This pattern uses common structural words ("Chapter", "Appendix") alongside a generic
         # numbering pattern (\d+(\.\d+)*) to reliably identify headings.
         self.numbered_heading_pattern = re.compile(r'^(\d+(\.\d+)*)\s+.*|^(Chapter\s+\d+):.*|^(Appendix\s+[A-Z]):.*', re.IGNORECASE)
+        self._bold_fonts = {} # Font name -> whether its name marks it bold, filled as fonts are seen
         
         # These are configurable heuristics, not hardcoded content values.
         self.min_heading_length = 3
         self.max_heading_length = 250 
 
-    def analyze_text_properties(self, doc):
-        """Analyze text properties to determine the most common (body) font size."""
+    def load_page_layouts(self, doc, start=0, stop=None):
+        """
+        Performs the single layout pass over a document. Each page is parsed once with
+        `get_text("dict")` and reduced to the block/line/span fields the heuristics use,
+        so font statistics, footers, title and headings are all computed from this cache.
+        """
+        stop = len(doc) if stop is None else min(stop, len(doc))
+        layouts = []
+        for page_num in range(start, stop):
+            page = doc[page_num]
+            # TEXTFLAGS_TEXT skips image blocks, which none of the heuristics look at
+            page_dict = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)
+            blocks = []
+            for block in page_dict["blocks"]:
+                if "lines" not in block: continue
+                blocks.append({
+                    "number": block["number"],
+                    "bbox": tuple(block["bbox"]),
+                    "lines": [{
+                        "bbox": tuple(line["bbox"]),
+                        "spans": [{
+                            "text": span["text"],
+                            "size": span["size"],
+                            "font": span["font"],
+                            "flags": span["flags"],
+                            "origin": tuple(span["origin"]),
+                        } for span in line["spans"]],
+                    } for line in block["lines"]],
+                })
+            # Same ordering as get_text("dict", sort=True)
+            blocks.sort(key=lambda b: (b["bbox"][3], b["bbox"][0]))
+            layouts.append({
+                "page_num": page_num,
+                "width": page.rect.width,
+                "height": page.rect.height,
+                "blocks": blocks,
+            })
+        return layouts
+
+    def count_font_sizes(self, layouts):
+        """Counts the characters set in each (rounded) font size."""
         font_sizes = defaultdict(int)
-        
-        for page in doc:
-            blocks = page.get_text("dict")["blocks"]
-            for block in blocks:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            font_sizes[round(span["size"])] += len(span["text"].strip())
+        for layout in layouts:
+            for block in layout["blocks"]:
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        font_sizes[round(span["size"])] += len(span["text"].strip())
+        return font_sizes
+
+    def analyze_text_properties(self, layouts, font_sizes=None):
+        """Analyze text properties to determine the most common (body) font size."""
+        if font_sizes is None:
+            font_sizes = self.count_font_sizes(layouts)
 
         body_font_size = 10.0 # A sensible default if analysis fails
         if font_sizes:
@@ -49,22 +125,37 @@ class PDFOutlineExtractor:
 
         return body_font_size
 
-    def identify_footers(self, doc, page_threshold=0.5):
-        """Identify recurring text at the bottom of pages to exclude it from content."""
+    def footer_zone_text(self, layout):
+        """Returns the text in the bottom 15% of a page, in reading order, from the layout cache."""
+        zone_top = layout["height"] * 0.85
+        text = ""
+        for block in sorted(layout["blocks"], key=lambda b: b["number"]):
+            for line in block["lines"]:
+                # A line belongs to the footer zone when its baseline lies inside it
+                if any(span["origin"][1] > zone_top for span in line["spans"]):
+                    text += "".join(span["text"] for span in line["spans"]) + "\n"
+        return text.strip()
+
+    def count_footer_candidates(self, layouts):
+        """Counts normalized footer-zone texts across pages."""
         footer_candidates = defaultdict(int)
-        num_pages = len(doc)
-        
-        for page in doc:
-            # Check the bottom 15% of the page for potential footers
-            footer_zone = fitz.Rect(0, page.rect.height * 0.85, page.rect.width, page.rect.height)
-            text = page.get_text(clip=footer_zone).strip()
+        for layout in layouts:
+            text = self.footer_zone_text(layout)
             if text:
                 # Normalize footer text by removing page numbers and common footer terms
                 normalized_text = re.sub(r'\d+$', '', text, flags=re.IGNORECASE).strip()
                 normalized_text = re.sub(r'page\s*\d+\s*of\s*\d+', '', normalized_text, flags=re.IGNORECASE).strip()
                 if len(normalized_text) > 5:
                     footer_candidates[normalized_text] += 1
-        
+        return footer_candidates
+
+    def identify_footers(self, layouts, page_threshold=0.5, footer_candidates=None, num_pages=None):
+        """Identify recurring text at the bottom of pages to exclude it from content."""
+        if footer_candidates is None:
+            footer_candidates = self.count_footer_candidates(layouts)
+        if num_pages is None:
+            num_pages = len(layouts)
+
         # A footer is text that appears on at least half the pages.
         footers = {text for text, count in footer_candidates.items() if count >= num_pages * page_threshold and len(text) > 10}
         self.logger.info(f"Identified potential footers: {footers}")
@@ -83,14 +174,13 @@ class PDFOutlineExtractor:
                     return " ".join(words[i:])
         return text
 
-    def extract_title(self, doc):
+    def extract_title(self, first_page):
         """Extract document title from the first page, merging adjacent large, centered text blocks."""
-        first_page = doc[0]
-        blocks = first_page.get_text("dict", sort=True)["blocks"]
-        page_width = first_page.rect.width
+        blocks = first_page["blocks"]
+        page_width = first_page["width"]
         
         candidates = []
-        for block in filter(lambda b: b['bbox'][1] < first_page.rect.height / 2, blocks):
+        for block in filter(lambda b: b['bbox'][1] < first_page["height"] / 2, blocks):
             if "lines" in block:
                 bbox = block["bbox"]
                 text = " ".join("".join(span["text"] for span in line["spans"]).strip() for line in block["lines"]).strip()
@@ -191,68 +281,468 @@ class PDFOutlineExtractor:
 
         return normalized_outline
 
+    def footer_lookup(self, footers):
+        """One compiled pattern that finds any of the footers in a text, or None if there are none."""
+        if not footers:
+            return None
+        return re.compile("|".join(re.escape(footer) for footer in sorted(footers)))
+
+    def block_features(self, layouts, footers):
+        """
+        Flattens the blocks of a document into the features the heading rules look at. The text
+        rules of `is_heading` (length, footers, dates, trailing period) are applied while
+        flattening; only the blocks that pass them are returned, as arrays with one row per block.
+        Span sizes and bold flags are returned flat, with the offset of each block's first span.
+        """
+        footer_pattern = self.footer_lookup(footers)
+        texts, positions, bboxes, widths, caps, numbered = [], [], [], [], [], []
+        span_sizes, span_bold, span_starts = [], [], []
+        for layout_index, layout in enumerate(layouts):
+            for block_index, block in enumerate(layout["blocks"]):
+                lines = block.get("lines")
+                if not lines: continue
+                # Same text as `is_heading` builds: split() breaks on the whitespace `\s+` matches
+                text = " ".join(" ".join("".join(span["text"] for span in line["spans"]) for line in lines).split())
+
+                if not text or len(text) < self.min_heading_length or len(text) > self.max_heading_length: continue
+                is_upper = text.isupper()
+                if text.endswith('.') and not is_upper: continue
+                if text.isdigit() or self.date_pattern.match(text): continue
+                if footer_pattern is not None and footer_pattern.search(text): continue
+
+                texts.append(text)
+                positions.append((layout_index, block_index))
+                bboxes.append(block["bbox"])
+                widths.append(layout["width"])
+                caps.append(is_upper and len(text) > 4)
+                numbered.append(self.numbered_heading_pattern.match(text) is not None)
+                span_starts.append(len(span_sizes))
+                for line in lines:
+                    for span in line["spans"]:
+                        font = span["font"]
+                        bold_font = self._bold_fonts.get(font)
+                        if bold_font is None:
+                            bold_font = self._bold_fonts[font] = "Bold" in font or "Black" in font
+                        span_sizes.append(span["size"])
+                        span_bold.append(bold_font or bool(span["flags"] & 2**4))
+
+        return {
+            "texts": texts,
+            "positions": positions,
+            "bbox": np.array(bboxes, dtype=np.float64).reshape(-1, 4),
+            "page_width": np.array(widths, dtype=np.float64),
+            "is_all_caps": np.array(caps, dtype=bool),
+            "is_numbered": np.array(numbered, dtype=bool),
+            "span_sizes": np.array(span_sizes, dtype=np.float64),
+            "span_bold": np.array(span_bold, dtype=bool),
+            "span_starts": np.array(span_starts, dtype=np.intp),
+        }
+
+    def classify_blocks(self, layouts, body_font_size, footers):
+        """
+        Vectorized `find_heading_candidates`: extracts the features of every block of the document
+        once (`block_features`) and applies the numeric rules of `is_heading` as NumPy masks.
+        """
+        features = self.block_features(layouts, footers)
+        if not features["texts"]:
+            return []
+        sizes, starts = features["span_sizes"], features["span_starts"]
+        # Every block that passed the text rules has at least one span, so no segment is empty
+        min_size = np.minimum.reduceat(sizes, starts)
+        max_size = np.maximum.reduceat(sizes, starts)
+        avg_font_size = min_size.copy()
+        # statistics.mean is exact; where a block mixes sizes it is used directly, so the sizes
+        # (and every comparison made with them) match `is_heading` to the last bit
+        ends = np.append(starts[1:], len(sizes))
+        for i in np.flatnonzero(min_size != max_size):
+            avg_font_size[i] = statistics.mean(sizes[starts[i]:ends[i]].tolist())
+        is_bold = np.logical_or.reduceat(features["span_bold"], starts)
+
+        bbox, page_width = features["bbox"], features["page_width"]
+        is_larger_than_body = avg_font_size > body_font_size * 1.1
+        is_left_aligned_short_line = (bbox[:, 0] < page_width * 0.2) & (page_width - bbox[:, 2] > page_width * 0.3)
+        is_all_caps = features["is_all_caps"]
+
+        stands_out = is_bold | is_larger_than_body
+        is_heading = ((is_left_aligned_short_line & stands_out) | (is_all_caps & stands_out)
+                      | (is_bold & is_larger_than_body) | features["is_numbered"])
+
+        headings = []
+        for i in np.flatnonzero(is_heading):
+            layout_index, block_index = features["positions"][i]
+            layout = layouts[layout_index]
+            headings.append({
+                "text": features["texts"][i], "page": layout["page_num"] + 1, "size": float(avg_font_size[i]),
+                "block_index": block_index, "bbox": layout["blocks"][block_index]["bbox"]
+            })
+        return headings
+
+    def find_heading_candidates(self, layouts, body_font_size, footers):
+        """Classifies every cached block and returns the heading candidates in page order."""
+        if VECTORIZED_HEADINGS:
+            return self.classify_blocks(layouts, body_font_size, footers)
+        headings = []
+        for layout in layouts:
+            for block_index, block in enumerate(layout["blocks"]):
+                if self.is_heading(block, body_font_size, layout["width"], footers):
+                    text = " ".join("".join(s["text"] for s in l["spans"]) for l in block["lines"]).strip()
+                    text = re.sub(r'\s+', ' ', text)
+                    
+                    spans = [s for l in block['lines'] for s in l['spans']]
+                    if not spans: continue
+                    avg_font_size = statistics.mean(s['size'] for s in spans)
+                    
+                    headings.append({
+                        "text": text, "page": layout["page_num"] + 1, "size": avg_font_size,
+                        "block_index": block_index, "bbox": block["bbox"]
+                    })
+        return headings
+
     def extract_outline(self, pdf_path):
         """Main function to extract a structured outline from a PDF."""
         try:
             with fitz.open(pdf_path) as doc:
-                if doc.is_form_pdf: 
-                    self.logger.warning(f"'{Path(pdf_path).name}' detected as a form. Extracting title only.")
-                    return {"title": self.extract_title(doc), "outline": []}
-
-                body_font_size = self.analyze_text_properties(doc)
-                footers = self.identify_footers(doc)
-                title = self.extract_title(doc)
-
-                headings = []
-                for page_num, page in enumerate(doc):
-                    blocks = page.get_text("dict", sort=True)["blocks"]
-                    for block in blocks:
-                        if self.is_heading(block, body_font_size, page.rect.width, footers):
-                            text = " ".join("".join(s["text"] for s in l["spans"]) for l in block["lines"]).strip()
-                            text = re.sub(r'\s+', ' ', text)
-                            
-                            spans = [s for l in block['lines'] for s in l['spans']]
-                            if not spans: continue
-                            avg_font_size = statistics.mean(s['size'] for s in spans)
-                            
-                            headings.append({"text": text, "page": page_num + 1, "size": avg_font_size})
-
-                if not headings:
-                    return {"title": title, "outline": []}
-
-                seen = set()
-                unique_headings = [h for h in headings if (h["text"], h["page"]) not in seen and not seen.add((h["text"], h["page"]))]
-                
-                heading_sizes = sorted(list(set(round(h['size'], 1) for h in unique_headings)), reverse=True)
-                font_size_tiers = []
-                if heading_sizes:
-                    font_size_tiers.append(heading_sizes[0])
-                    for size in heading_sizes[1:]:
-                        if font_size_tiers[-1] - size > 1.5:
-                            if len(font_size_tiers) < 5:
-                                font_size_tiers.append(size)
-                self.logger.info(f"Detected heading font size tiers: {font_size_tiers}")
-
-                outline = []
-                for h in unique_headings:
-                    numbered_level = 0
-                    match = self.numbered_heading_pattern.match(h['text'])
-                    if match:
-                        if match.group(1):
-                            numbered_level = match.group(1).count('.') + 1
-                        else:
-                            numbered_level = 1
-
-                    level = self.get_heading_level(h, font_size_tiers, numbered_level)
-                    outline.append({"level": level, "text": h["text"].strip(), "page": h["page"]})
-                
-                if outline and title and title.lower() in outline[0]['text'].lower():
-                    outline[0]['level'] = "H1"
-
-                final_outline = self.normalize_hierarchy(outline)
+                if len(doc) <= WINDOWED_PAGES:
+                    outline_data, _ = self.read_outline(doc, with_positions=False)
+                    return outline_data
+            return self.read_outline_windowed(pdf_path)
 
-                return {"title": title, "outline": final_outline}
+        except Exception as e:
+            self.logger.error(f"Error processing {pdf_path}: {str(e)}")
+            return {"title": "Error processing document", "outline": []}
+
+    def extract_outline_and_layouts(self, pdf_path, with_positions=True):
+        """
+        Extracts the outline and also returns the page layout cache it was built from,
+        so callers (e.g. the chunker) can reuse the page text without re-parsing the PDF.
+        With `with_positions`, outline items also carry the `block_index` and `bbox` of
+        their heading block on the page.
+        """
+        try:
+            with fitz.open(pdf_path) as doc:
+                return self.read_outline(doc, with_positions=with_positions)
 
         except Exception as e:
+            if is_out_of_memory(e):
+                # Left to the caller, which can retry with `read_outline_windowed`
+                raise
             self.logger.error(f"Error processing {pdf_path}: {str(e)}")
-            return {"title": "Error processing document", "outline": []}
\ No newline at end of file
+            return {"title": "Error processing document", "outline": []}, []
+
+    def read_outline(self, doc, with_positions=True):
+        """Outline and layout cache of an open document, like `extract_outline_and_layouts`, but errors are raised."""
+        if doc.is_form_pdf: 
+            self.logger.warning(f"'{Path(doc.name).name}' detected as a form. Extracting title only.")
+            return {"title": self.extract_title(self.load_page_layouts(doc, 0, 1)[0]), "outline": []}, []
+
+        layouts = self.load_page_layouts(doc)
+        return self.build_outline(layouts, with_positions=with_positions), layouts
+
+    def read_outline_windowed(self, pdf_path, window=PAGE_WINDOW, with_positions=False):
+        """
+        Outline of a document, like `read_outline`, holding at most `window` page layouts at a
+        time: one pass collects the document-wide statistics, a second classifies the blocks.
+        """
+        with fitz.open(pdf_path) as doc:
+            if doc.is_form_pdf:
+                self.logger.warning(f"'{Path(pdf_path).name}' detected as a form. Extracting title only.")
+                return {"title": self.extract_title(self.load_page_layouts(doc, 0, 1)[0]), "outline": []}
+
+        title, body_font_size, footers = self.page_statistics(pdf_path, window)
+        headings = [h for _, window_headings in self.iter_page_windows(pdf_path, body_font_size, footers, window) for h in window_headings]
+        return self.outline_from_headings(title, headings, with_positions=with_positions)
+
+    def iter_layout_windows(self, pdf_path, window=PAGE_WINDOW):
+        """Yields the page layouts of a document `window` pages at a time, reopening it every REOPEN_EVERY_PAGES pages."""
+        start, num_pages = 0, None
+        while num_pages is None or start < num_pages:
+            with fitz.open(pdf_path) as doc:
+                num_pages = len(doc)
+                reopen_at = start + REOPEN_EVERY_PAGES
+                while start < min(reopen_at, num_pages):
+                    yield self.load_page_layouts(doc, start, start + window)
+                    start += window
+
+    def page_statistics(self, pdf_path, window=PAGE_WINDOW):
+        """
+        First pass of windowed reading: the title, body font size and footers of a document, from
+        font size and footer counts summed window by window. Returns (title, body_font_size, footers).
+        """
+        font_sizes = Counter()
+        footer_candidates = Counter()
+        title = ""
+        num_pages = 0
+        for layouts in self.iter_layout_windows(pdf_path, window):
+            if num_pages == 0:
+                title = self.extract_title(layouts[0])
+            num_pages += len(layouts)
+            font_sizes.update(self.count_font_sizes(layouts))
+            footer_candidates.update(self.count_footer_candidates(layouts))
+        body_font_size = self.analyze_text_properties([], font_sizes=font_sizes)
+        footers = self.identify_footers([], footer_candidates=footer_candidates, num_pages=num_pages)
+        return title, body_font_size, footers
+
+    def iter_page_windows(self, pdf_path, body_font_size, footers, window=PAGE_WINDOW):
+        """
+        Second pass of windowed reading: yields (layouts, headings) for each `window` pages, with the
+        window's heading candidates deduplicated the way `build_outline` does. Duplicates are only
+        dropped within a page, so per-window deduplication matches the whole-document one.
+        """
+        for layouts in self.iter_layout_windows(pdf_path, window):
+            yield layouts, self.unique_headings(self.find_heading_candidates(layouts, body_font_size, footers))
+
+    def page_ranges(self, pdf_path, pages_per_range):
+        """
+        Splits a document into [start, stop) page ranges of at most `pages_per_range` pages, so its
+        layout pass can be spread over several workers. Forms and short documents stay one range,
+        (0, None). Returns (num_pages, ranges).
+        """
+        with fitz.open(pdf_path) as doc:
+            num_pages = len(doc)
+            if doc.is_form_pdf or num_pages <= pages_per_range:
+                return num_pages, [(0, None)]
+        return num_pages, [(start, min(start + pages_per_range, num_pages)) for start in range(0, num_pages, pages_per_range)]
+
+    def load_page_range(self, pdf_path, start, stop):
+        """
+        Layout pass over pages [start, stop) of a document, together with the font size and footer
+        counts of those pages, which `merge_page_ranges` sums into document-wide statistics.
+        """
+        with fitz.open(pdf_path) as doc:
+            layouts = self.load_page_layouts(doc, start, stop)
+        return {
+            "layouts": layouts,
+            "font_sizes": dict(self.count_font_sizes(layouts)),
+            "footer_candidates": dict(self.count_footer_candidates(layouts)),
+        }
+
+    def merge_page_ranges(self, parts, with_positions=True):
+        """
+        Combines the `load_page_range` results of a document (in page order) into the same outline
+        and layout cache `extract_outline_and_layouts` returns for the whole document.
+        """
+        layouts = [layout for part in parts for layout in part["layouts"]]
+        font_sizes = Counter()
+        footer_candidates = Counter()
+        for part in parts:
+            font_sizes.update(part["font_sizes"])
+            footer_candidates.update(part["footer_candidates"])
+
+        body_font_size = self.analyze_text_properties(layouts, font_sizes=font_sizes)
+        footers = self.identify_footers(layouts, footer_candidates=footer_candidates)
+        return self.build_outline(layouts, body_font_size, footers, with_positions=with_positions), layouts
+
+    def build_outline(self, layouts, body_font_size=None, footers=None, with_positions=False):
+        """Builds the title and outline of a document from its cached page layouts."""
+        if body_font_size is None:
+            body_font_size = self.analyze_text_properties(layouts)
+        if footers is None:
+            footers = self.identify_footers(layouts)
+        title = self.extract_title(layouts[0])
+
+        headings = self.find_heading_candidates(layouts, body_font_size, footers)
+        return self.outline_from_headings(title, self.unique_headings(headings), with_positions=with_positions)
+
+    def unique_headings(self, headings):
+        """Drops repeated heading candidates (same text on the same page), keeping the first."""
+        seen = set()
+        return [h for h in headings if (h["text"], h["page"]) not in seen and not seen.add((h["text"], h["page"]))]
+
+    def outline_from_headings(self, title, unique_headings, with_positions=False):
+        """Assigns levels to a document's unique heading candidates and returns its title and outline."""
+        if not unique_headings:
+            return {"title": title, "outline": []}
+
+        heading_sizes = sorted(list(set(round(h['size'], 1) for h in unique_headings)), reverse=True)
+        font_size_tiers = []
+        if heading_sizes:
+            font_size_tiers.append(heading_sizes[0])
+            for size in heading_sizes[1:]:
+                if font_size_tiers[-1] - size > 1.5:
+                    if len(font_size_tiers) < 5:
+                        font_size_tiers.append(size)
+        self.logger.info(f"Detected heading font size tiers: {font_size_tiers}")
+
+        outline = []
+        for h in unique_headings:
+            numbered_level = 0
+            match = self.numbered_heading_pattern.match(h['text'])
+            if match:
+                if match.group(1):
+                    numbered_level = match.group(1).count('.') + 1
+                else:
+                    numbered_level = 1
+
+            level = self.get_heading_level(h, font_size_tiers, numbered_level)
+            item = {"level": level, "text": h["text"].strip(), "page": h["page"]}
+            if with_positions:
+                item.update(block_index=h["block_index"], bbox=h["bbox"])
+            outline.append(item)
+        
+        if outline and title and title.lower() in outline[0]['text'].lower():
+            outline[0]['level'] = "H1"
+
+        final_outline = self.normalize_hierarchy(outline)
+
+        return {"title": title, "outline": final_outline}
+
+def outline_record(pdf_path):
+    """
+    Extracts one document's outline for the command line; run in a worker process. Returns the
+    JSON Lines record: the outline, page count and timing, or the error if extraction failed.
+    """
+    start = time.perf_counter()
+    record = {"file": pdf_path, "title": None, "outline": [], "pages": None}
+    try:
+        with fitz.open(pdf_path) as doc:
+            record["pages"] = len(doc)
+            windowed = len(doc) > WINDOWED_PAGES
+            if not windowed:
+                outline_data, _ = PDFOutlineExtractor().read_outline(doc, with_positions=False)
+        if windowed:
+            # Opens the document itself, window by window
+            outline_data = PDFOutlineExtractor().read_outline_windowed(pdf_path)
+        record.update(outline_data, error=None)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    return record
+
+def find_pdfs(inputs):
+    """Resolves files, directories (searched recursively) and glob patterns to sorted, unique absolute PDF paths."""
+    pdf_paths = set()
+    for entry in inputs:
+        if os.path.isdir(entry):
+            matches = (str(p) for p in Path(entry).rglob("*") if p.suffix.lower() == ".pdf")
+        elif os.path.isfile(entry):
+            matches = [entry]
+        else:
+            matches = (p for p in glob.glob(entry, recursive=True) if p.lower().endswith(".pdf") and os.path.isfile(p))
+        pdf_paths.update(os.path.abspath(p) for p in matches)
+    return sorted(pdf_paths)
+
+def load_done(output_path, retry_errors=False):
+    """
+    Returns the files already recorded in a JSON Lines output from an earlier (possibly crashed)
+    run. A partly written last line is cut off, so appending to the file continues cleanly.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            valid_bytes += len(line)
+            if not (retry_errors and record.get("error")):
+                done.add(record["file"])
+    if valid_bytes < os.path.getsize(output_path):
+        print(f"Discarding an incomplete record at the end of {output_path}.")
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+def crashed_record(pdf_path):
+    """The JSON Lines record of a document whose worker died while extracting it on its own."""
+    return {"file": pdf_path, "title": None, "outline": [], "pages": None,
+            "error": "BrokenProcessPool: the worker process died (e.g. killed for running out of memory)", "seconds": None}
+
+def extract_outlines(pdf_paths, output, max_workers=None, max_in_flight=None):
+    """
+    Extracts the outlines of `pdf_paths` in a process pool, writing one JSON line to `output` as
+    each document finishes. At most `max_in_flight` documents are submitted at a time, so memory
+    stays flat however many files there are. Returns (documents, errors, pages).
+    If a worker dies, the pool is replaced and the documents it was running are retried one at a
+    time; a document that takes down its worker on its own gets an error record.
+    """
+    max_workers = max_workers or allocate("outline_workers")
+    max_in_flight = max_in_flight or max_workers * TASKS_IN_FLIGHT_PER_WORKER
+    documents = errors = pages = 0
+    start = time.perf_counter()
+    queued = collections.deque(pdf_paths)
+    suspects = collections.deque()  # Documents that were running when a worker died
+    in_flight = {}  # future -> (pdf_path, executor that runs it, whether it runs alone)
+
+    def refill():
+        while True:
+            # A suspect runs alone, so that a second crash can be pinned on it
+            running_alone = any(isolated for _, _, isolated in in_flight.values())
+            if suspects and not in_flight:
+                pdf_path, isolated = suspects.popleft(), True
+            elif queued and not suspects and not running_alone and len(in_flight) < max_in_flight:
+                pdf_path, isolated = queued.popleft(), False
+            else:
+                return
+            try:
+                in_flight[executor.submit(outline_record, pdf_path)] = (pdf_path, executor, isolated)
+            except BrokenProcessPool:
+                # A worker died while idle: the document keeps its place and goes to a new pool
+                (suspects if isolated else queued).appendleft(pdf_path)
+                replace_pool(executor)
+
+    def replace_pool(broken):
+        nonlocal executor
+        if broken is executor:
+            broken.shutdown(wait=False, cancel_futures=True)
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        refill()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pdf_path, task_executor, isolated = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    replace_pool(task_executor)
+                    if not isolated:
+                        suspects.append(pdf_path)
+                        continue
+                    print(f"  - ERROR extracting {Path(pdf_path).name}: its worker process died; recording the error")
+                    record = crashed_record(pdf_path)
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                documents += 1
+                errors += record["error"] is not None
+                pages += record["pages"] or 0
+                if documents % PROGRESS_EVERY == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"  - {documents}/{len(pdf_paths)} documents ({documents / elapsed:.1f} docs/s, {errors} errors)")
+            # Each finished batch is on disk before more work is submitted, so --resume loses at most the in-flight documents
+            output.flush()
+            refill()
+    finally:
+        executor.shutdown(cancel_futures=True)
+    return documents, errors, pages
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract the title and outline of many PDFs, streaming one JSON line per document.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories (searched recursively) or glob patterns (e.g., 'corpus/**/*.pdf').")
+    parser.add_argument("-o", "--output", default="outlines.jsonl", help="JSON Lines file to write.")
+    parser.add_argument("--resume", action="store_true", help="Append to --output, skipping documents it already contains.")
+    parser.add_argument("--retry-errors", action="store_true", help="With --resume, extract documents that failed before again (the new record follows the old one).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: the CPU budget, see cpu_budget.py).")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help=f"Documents submitted at once (default: {TASKS_IN_FLIGHT_PER_WORKER} per worker).")
+    args = parser.parse_args()
+
+    pdf_paths = find_pdfs(args.inputs)
+    done = load_done(args.output, args.retry_errors) if args.resume else set()
+    todo = [p for p in pdf_paths if p not in done]
+    print(f"Found {len(pdf_paths)} PDFs; {len(pdf_paths) - len(todo)} already in {args.output}, {len(todo)} to extract.")
+
+    start = time.perf_counter()
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+        documents, errors, pages = extract_outlines(todo, output, args.workers, args.max_in_flight)
+    elapsed = time.perf_counter() - start
+    print(f"Extracted {documents} outlines ({pages} pages, {errors} errors) in {elapsed:.1f}s "
+          f"({pages / elapsed if elapsed else 0:.1f} pages/s). Output: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,146 +1,700 @@
 # ingestion_logic.py
 
-import fitz  # PyMuPDF
-from sentence_transformers import SentenceTransformer
-import os
+import collections
+import multiprocessing
 from pathlib import Path
-import re
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import fitz  # PyMuPDF
 import numpy as np
 
-from extract_outline import PDFOutlineExtractor
+from extract_outline import PDFOutlineExtractor, EXTRACTOR_VERSION, WINDOWED_PAGES, PAGE_WINDOW, is_out_of_memory
+from chunk_store import ChunkStore, ChunkCorpus
+from embedding_cache import document_cache_key, corpus_cache_key, load_cached_document, save_cached_document
+from vector_index import build_index, EmbeddingBlocks
+from lexical_index import BM25Index
+from cpu_budget import allocate, set_torch_threads
+import initialize_model
+import pipeline_profiler
 
 # --- CONFIGURATION ---
 MODEL_PATH = './models/embedding_model'
+EMBEDDING_MODEL_VERSION = 'all-MiniLM-L6-v2'
+CHUNKER_VERSION = "3" # Bump whenever a change to chunking can change the chunks of a document
 MIN_CHUNK_SIZE = 150 # Minimum number of characters for a chunk to be considered valid
+# Fold the sub-sections under a heading with too little text of its own (e.g. a recipe name directly
+# followed by an "Ingredients:" sub-heading) into its chunk, instead of cutting at every heading
+FOLD_SHORT_SECTIONS = False
+USE_EMBEDDING_CACHE = True # Reuse chunks and embeddings of unchanged PDFs from previous runs
+# "exact" (brute force), "ivf" (approximate, for large corpora), or a compact quantized store with
+# exact rescoring: "int8" (4x smaller in RAM) or "float16" (2x smaller)
+VECTOR_INDEX = "exact"
+STREAMING_INGESTION = True # Embed chunks while other PDFs are still being parsed
+EMBED_BATCH_SIZE = 64
+# Length-sorted, token-budgeted batches; over-long chunks are embedded as windows instead of truncated
+TOKEN_BUDGET_BATCHING = True
+STREAM_QUEUE_SIZE = 8 # Parsed PDFs that may wait for the embedder before parsing pauses
+# While streaming, chunks are buffered until they fill this many of the TokenBudgetEmbedder's batches
+# (EMBED_BATCH_SIZE chunks with plain `model.encode`), so it sorts and packs enough of them by length
+STREAM_EMBED_BATCHES = 4
+STREAM_STOP_POLL_SECONDS = 0.2 # How often a parser waiting on a full queue checks whether ingestion was abandoned
+SPLIT_PAGES_PER_TASK = 32 # Longer PDFs are parsed as page ranges of this size by several workers
+# PDF workers start from a fork server that has only imported this module, so they never load torch
+# ("spawn" is used where forkserver is unavailable)
+PDF_WORKER_START_METHOD = "forkserver"
+# Address-space ceiling of each PDF worker in MiB (None: unlimited). A document that hits it is
+# re-read in page windows; PDFs over WINDOWED_PAGES pages (extract_outline.py) always are
+PDF_WORKER_MEMORY_LIMIT_MB = 2048
+# Windowed chunking packs closed sections into a ChunkStore this many at a time, so chunk dicts never pile up
+WINDOWED_STORE_CHUNKS = 256
+LEXICAL_INDEX = True # Also build a BM25 index over the chunks, for hybrid retrieval in the analysis step
 
-def create_hierarchical_chunks(doc, outline, title, pdf_path):
+def block_text(block):
+    """Returns a cached layout block's text the way `page.get_text()` renders it (one line per row)."""
+    return "".join("".join(span["text"] for span in line["spans"]) + "\n" for line in block["lines"])
+
+def create_layout_chunks(layouts, outline, title, pdf_path):
     """
-    Creates structured text chunks from a PDF based on its outline.
-    Each chunk is associated with the heading it falls under.
+    Creates hierarchical chunks, one per outline heading, from the page layout cache built during
+    outline extraction. Every page is visited once and sections are cut at the position of each
+    heading block, so chunking is linear in page count.
+    Requires an outline extracted with block positions (`extract_outline_and_layouts`).
     """
-    chunks = []
-    # Add the title and intro text (before the first heading) as the first chunk
-    first_heading_page = outline[0]['page'] if outline else len(doc)
-    intro_text = ""
-    for page_num in range(first_heading_page):
-        intro_text += doc[page_num].get_text() + " "
-    
-    if intro_text.strip():
-        chunks.append({
-            'chunk_text': f"Document Title: {title}\n\n{intro_text.strip()}",
-            'metadata': {
-                'source_pdf': Path(pdf_path).name,
-                'page_number': 1,
-                'section_title': title,
-                'heading_level': 'H1'
-            }
-        })
-
-    # Process text under each heading
-    for i, heading in enumerate(outline):
-        start_page = heading['page'] - 1
-        
-        # Determine the end page for the current section
-        if i + 1 < len(outline):
-            next_heading = outline[i+1]
-            # If next heading is on the same page, text is only on that page
-            if next_heading['page'] == heading['page']:
-                end_page = start_page
-            else:
-                end_page = next_heading['page'] - 2 # Text ends on the page before the next heading
-        else:
-            end_page = len(doc) - 1 # Last heading, so text goes to the end of the doc
-
-        # Extract text for the current section
-        section_text = ""
-        for page_num in range(start_page, end_page + 1):
-            section_text += doc[page_num].get_text() + " "
-        
-        # Clean the extracted text
-        # A simple way to get text "after" a heading is to find the heading and slice the string
-        # This is not perfect but works for many documents
-        heading_pos = section_text.lower().find(heading['text'].lower())
-        if heading_pos != -1:
-            text_after_heading = section_text[heading_pos + len(heading['text']):]
-        else:
-            text_after_heading = section_text
+    return [chunk for chunk, _ in iter_section_chunks([(layouts, outline)], title, pdf_path)]
 
-        # Use a regex to remove the heading text itself from the chunk
-        cleaned_text = re.sub(re.escape(heading['text']), '', text_after_heading.strip(), flags=re.IGNORECASE).strip()
+def iter_section_chunks(windows, title, pdf_path):
+    """
+    The section cutting of `create_layout_chunks` over an iterable of (layouts, headings) page
+    windows, each with the headings on its pages. Yields (chunk, heading) as each section closes,
+    with heading None for the intro; a heading without a 'level' yet leaves 'heading_level' None.
+    """
+    source_pdf = Path(pdf_path).name
+    current_heading = None  # None while we are still in the intro, before the first heading
+    parts = []
 
-        if len(cleaned_text) > MIN_CHUNK_SIZE:
-            chunks.append({
-                'chunk_text': f"Section: {heading['text']}\n\n{cleaned_text}",
+    def close_section():
+        text = "".join(parts).strip()
+        if current_heading is None:
+            if text:
+                return {
+                    'chunk_text': f"Document Title: {title}\n\n{text}",
+                    'metadata': {
+                        'source_pdf': source_pdf,
+                        'page_number': 1,
+                        'section_title': title,
+                        'heading_level': 'H1'
+                    }
+                }
+        elif len(text) > MIN_CHUNK_SIZE:
+            return {
+                'chunk_text': f"Section: {current_heading['text']}\n\n{text}",
                 'metadata': {
-                    'source_pdf': Path(pdf_path).name,
-                    'page_number': heading['page'],
-                    'section_title': heading['text'],
-                    'heading_level': heading['level']
+                    'source_pdf': source_pdf,
+                    'page_number': current_heading['page'],
+                    'section_title': current_heading['text'],
+                    'heading_level': current_heading.get('level')
                 }
-            })
-            
-    return chunks
+            }
+        return None
+
+    for layouts, headings in windows:
+        heading_at = {(h['page'] - 1, h['block_index']): h for h in headings}
+        for layout in layouts:
+            for block_index, block in enumerate(layout["blocks"]):
+                heading = heading_at.get((layout["page_num"], block_index))
+                if heading is None:
+                    parts.append(block_text(block))
+                elif FOLD_SHORT_SECTIONS and current_heading is not None and len("".join(parts).strip()) <= MIN_CHUNK_SIZE:
+                    # Too little text under the open heading to stand alone, so the sub-section is folded into it
+                    parts.append(block_text(block))
+                else:
+                    chunk = close_section()
+                    if chunk is not None:
+                        yield chunk, current_heading
+                    current_heading = heading
+                    parts = []
+            parts.append(" ")
+    chunk = close_section()
+    if chunk is not None:
+        yield chunk, current_heading
+
+def create_windowed_chunks(pdf_path, window=PAGE_WINDOW):
+    """
+    `chunk_document` for documents too long to hold every page layout, returning a ChunkStore:
+    the document is read `window` pages at a time, twice (`page_statistics`, then
+    `iter_page_windows`), and sections are packed into the store as they close. Heading levels
+    depend on all headings of the document, so they are filled in once the last window is done.
+    """
+    extractor = PDFOutlineExtractor()
+    with fitz.open(pdf_path) as doc:
+        is_form = doc.is_form_pdf
+    if is_form:
+        print(f"  - Warning: Could not extract a valid outline from {Path(pdf_path).name}. Skipping.")
+        return ChunkStore.from_chunks([])
+    title, body_font_size, footers = extractor.page_statistics(pdf_path, window)
+    headings = []
+
+    def windows():
+        for layouts, window_headings in extractor.iter_page_windows(pdf_path, body_font_size, footers, window):
+            headings.extend(window_headings)
+            yield layouts, window_headings
+
+    stores, pending, heading_keys = [], [], []
+    for chunk, heading in iter_section_chunks(windows(), title, pdf_path):
+        pending.append(chunk)
+        heading_keys.append(None if heading is None else (heading['page'], heading['block_index']))
+        if len(pending) >= WINDOWED_STORE_CHUNKS:
+            stores.append(ChunkStore.from_chunks(pending))
+            pending = []
+    stores.append(ChunkStore.from_chunks(pending))
+
+    outline = extractor.outline_from_headings(title, headings, with_positions=True)['outline']
+    if not outline:
+        print(f"  - Warning: Could not extract a valid outline from {Path(pdf_path).name}. Skipping.")
+        return ChunkStore.from_chunks([])
+    levels = {(item['page'], item['block_index']): item['level'] for item in outline}
+    # The intro chunk (no heading) is always H1
+    return ChunkStore.concat(stores).with_levels(['H1' if key is None else levels[key] for key in heading_keys])
+
+def chunk_document(pdf_path, outline_data, layouts):
+    """Chunks a document from its extracted outline and page layouts."""
+    if not outline_data or not outline_data.get("outline"):
+        print(f"  - Warning: Could not extract a valid outline from {Path(pdf_path).name}. Skipping.")
+        return []
+    return create_layout_chunks(layouts, outline_data['outline'], outline_data['title'], pdf_path)
 
 def process_single_pdf(pdf_path: str):
     """
     Fully processes one PDF: extracts outline, creates chunks.
     This function is designed to be run in a separate process.
+    Returns (pdf_path, chunks, timing) with the chunks as a ChunkStore, which pickles as a few
+    buffers, and the page count and the seconds spent in each step.
     """
+    timing = {"pages": 0, "extract_seconds": 0.0, "chunk_seconds": 0.0}
     try:
+        start = time.perf_counter()
         extractor = PDFOutlineExtractor()
-        outline_data = extractor.extract_outline(pdf_path)
-        
-        if not outline_data or not outline_data.get("outline"):
-            print(f"  - Warning: Could not extract a valid outline from {Path(pdf_path).name}. Skipping.")
-            return pdf_path, []
+        outline_data, layouts = extractor.extract_outline_and_layouts(pdf_path)
+        timing.update(pages=len(layouts), extract_seconds=time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chunks = ChunkStore.from_chunks(chunk_document(pdf_path, outline_data, layouts))
+        timing["chunk_seconds"] = time.perf_counter() - start
+        return pdf_path, chunks, timing
+    except Exception as e:
+        if not is_out_of_memory(e):
+            print(f"  - ERROR processing {Path(pdf_path).name}: {e}")
+            return pdf_path, ChunkStore.from_chunks([]), timing
+    # Retried only here, once the exception (whose traceback keeps the page layouts alive) is gone
+    print(f"  - {Path(pdf_path).name} exceeds the PDF worker memory limit; reading it in windows of {PAGE_WINDOW} pages")
+    return process_windowed_pdf(pdf_path)
 
+def process_windowed_pdf(pdf_path: str):
+    """
+    `process_single_pdf` for very long documents: reads PAGE_WINDOW pages at a time
+    (`create_windowed_chunks`), so the worker's memory does not grow with the page count.
+    """
+    timing = {"pages": 0, "extract_seconds": 0.0, "chunk_seconds": 0.0}
+    try:
+        start = time.perf_counter()
         with fitz.open(pdf_path) as doc:
-            chunks = create_hierarchical_chunks(doc, outline_data['outline'], outline_data['title'], pdf_path)
-        
-        return pdf_path, chunks
+            timing["pages"] = len(doc)
+        chunks = create_windowed_chunks(pdf_path)
+        # Page reading and section cutting are interleaved, so all of it counts as extraction
+        timing["extract_seconds"] = time.perf_counter() - start
+        return pdf_path, chunks, timing
     except Exception as e:
         print(f"  - ERROR processing {Path(pdf_path).name}: {e}")
-        return pdf_path, []
+        return pdf_path, ChunkStore.from_chunks([]), timing
 
-def run_ingestion(document_filenames: list[str], input_pdf_dir: str):
+def limit_worker_memory(limit_mb):
     """
-    Processes PDFs from a specific directory, generates embeddings, and returns an in-memory "database".
+    PDF worker initializer: caps the worker's address space at `limit_mb` MiB, so a document that
+    needs more raises MemoryError in the worker instead of drawing the container into the OOM killer.
+    """
+    try:
+        import resource
+    except ImportError:
+        return  # Not available on Windows
+    if not limit_mb:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = limit_mb * 2**20 if hard == resource.RLIM_INFINITY else min(limit_mb * 2**20, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def process_page_range(pdf_path: str, start: int, stop: int):
+    """
+    Layout pass over one page range of a large PDF, run in a separate process.
+    Returns (pdf_path, partial result, timing); the partial result is None if the range could not be read.
+    """
+    started = time.perf_counter()
+    try:
+        part = PDFOutlineExtractor().load_page_range(pdf_path, start, stop)
+    except Exception as e:
+        print(f"  - ERROR processing pages {start + 1}-{stop} of {Path(pdf_path).name}: {e}")
+        part = None
+    return pdf_path, part, {"pages": stop - start, "extract_seconds": time.perf_counter() - started}
+
+def finish_split_pdf(pdf_path: str, ranges: list):
     """
+    Merges the (partial result, timing) pairs of a split PDF's page ranges into one outline and
+    chunks it, like `process_single_pdf`. Returns (chunks, timing) with the ranges' times included.
+    """
+    timing = {
+        "pages": sum(t["pages"] for _, t in ranges),
+        "extract_seconds": sum(t["extract_seconds"] for _, t in ranges),
+        "chunk_seconds": 0.0,
+    }
+    parts = [part for part, _ in ranges]
+    if any(part is None for part in parts):
+        return ChunkStore.from_chunks([]), timing
+    try:
+        start = time.perf_counter()
+        outline_data, layouts = PDFOutlineExtractor().merge_page_ranges(parts)
+        timing["extract_seconds"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        chunks = ChunkStore.from_chunks(chunk_document(pdf_path, outline_data, layouts))
+        timing["chunk_seconds"] = time.perf_counter() - start
+        return chunks, timing
+    except Exception as e:
+        print(f"  - ERROR processing {Path(pdf_path).name}: {e}")
+        return ChunkStore.from_chunks([]), timing
+
+def plan_parse_tasks(pdf_paths: list[str]) -> list[dict]:
+    """
+    Turns PDFs into worker tasks, largest first. PDFs longer than SPLIT_PAGES_PER_TASK pages are
+    split into page ranges, so one long document is parsed by several workers instead of keeping
+    one busy while the others sit idle. PDFs over WINDOWED_PAGES pages are not split: their
+    ranges would all be merged in this process, so one worker reads them in page windows.
+    """
+    extractor = PDFOutlineExtractor()
+    tasks = []
+    for pdf_path in pdf_paths:
+        try:
+            num_pages, ranges = extractor.page_ranges(pdf_path, SPLIT_PAGES_PER_TASK)
+        except Exception:
+            # Unreadable here; process_single_pdf reports the error
+            num_pages, ranges = 0, [(0, None)]
+        windowed = num_pages > WINDOWED_PAGES
+        if windowed:
+            ranges = [(0, None)]
+        for range_index, (start, stop) in enumerate(ranges):
+            tasks.append({
+                "pdf_path": pdf_path,
+                "start": start,
+                "stop": stop,
+                "pages": (num_pages if stop is None else stop) - start,
+                "range_index": range_index,
+                "num_ranges": len(ranges),
+                "windowed": windowed,
+            })
+    tasks.sort(key=lambda task: task["pages"], reverse=True)
+    return tasks
+
+def pdf_worker_context():
+    """
+    Multiprocessing context for the PDF workers. Forked workers would inherit whatever the parent
+    has loaded (torch and the embedding model, often with running threads). Instead, workers are
+    forked from a fork server that only preloads this module (PyMuPDF, NumPy); like spawned
+    workers they also import the parent's main module, which is why the entry points import the
+    model stages lazily.
+    """
+    method = PDF_WORKER_START_METHOD if PDF_WORKER_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        # Takes effect when the fork server starts, i.e. on first use
+        context.set_forkserver_preload([__name__])
+    return context
+
+def parse_pdfs(pdf_paths: list[str], max_workers=None, streaming=False):
+    """
+    Parses and chunks PDFs in a worker pool and yields (pdf_path, chunks) as each document
+    completes. Tasks from `plan_parse_tasks` are submitted a few at a time, and the page ranges of
+    a split PDF are merged as soon as its last range is done. The pool is sized from the CPU
+    budget, leaving part of it to the embedder when `streaming`.
+    If a worker dies (e.g. killed by the kernel for running out of memory), the pool is replaced
+    and the tasks it was running are retried one at a time, very long documents in page windows;
+    only a task that takes down its worker on its own is given up, so other PDFs are never lost.
+    """
+    max_workers = max_workers or allocate("pdf_workers", streaming=streaming)
+    queued = collections.deque(plan_parse_tasks(pdf_paths))
+    suspects = collections.deque()  # Tasks that were running when a worker died
+    split_parts = {}  # pdf_path -> {range_index: (partial result, timing)}
+    in_flight = {}  # future -> (task, executor that runs it)
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers, mp_context=pdf_worker_context(), initializer=limit_worker_memory,
+                                   initargs=(PDF_WORKER_MEMORY_LIMIT_MB,))
+
+    def submit(task):
+        if task["windowed"]:
+            future = executor.submit(process_windowed_pdf, task["pdf_path"])
+        elif task["num_ranges"] == 1:
+            future = executor.submit(process_single_pdf, task["pdf_path"])
+        else:
+            future = executor.submit(process_page_range, task["pdf_path"], task["start"], task["stop"])
+        in_flight[future] = (task, executor)
+
+    def refill():
+        while True:
+            # A suspect runs alone, so that a second crash can be pinned on it
+            running_alone = any(task.get("isolated") for task, _ in in_flight.values())
+            if suspects and not in_flight:
+                task = suspects.popleft()
+            elif queued and not suspects and not running_alone and len(in_flight) < max_workers * 2:
+                task = queued.popleft()
+            else:
+                return
+            try:
+                submit(task)
+            except BrokenProcessPool:
+                # A worker died while idle: the task keeps its place and goes to a new pool
+                (suspects if task.get("isolated") else queued).appendleft(task)
+                replace_pool(executor)
+
+    def replace_pool(broken):
+        nonlocal executor
+        if broken is executor:
+            broken.shutdown(wait=False, cancel_futures=True)
+            executor = new_pool()
+
+    def failed(task):
+        """The result of a task whose worker died while running it alone."""
+        name = Path(task["pdf_path"]).name
+        pages = "" if task["num_ranges"] == 1 else f"pages {task['start'] + 1}-{task['stop']} of "
+        print(f"  - ERROR processing {pages}{name}: its PDF worker died (e.g. out of memory); skipping it")
+        timing = {"pages": task["pages"], "extract_seconds": 0.0, "chunk_seconds": 0.0}
+        if task["num_ranges"] == 1:
+            return task["pdf_path"], ChunkStore.from_chunks([]), timing
+        return task["pdf_path"], None, timing
+
+    executor = new_pool()
+    try:
+        refill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            results = []
+            for future in done:
+                task, task_executor = in_flight.pop(future)
+                try:
+                    results.append((task, future.result()))
+                except BrokenProcessPool:
+                    replace_pool(task_executor)
+                    if task.get("isolated"):
+                        results.append((task, failed(task)))
+                    else:
+                        # Retried alone; a whole document is re-read in page windows, which needs the least memory
+                        suspects.append(dict(task, isolated=True, windowed=task["windowed"] or task["num_ranges"] == 1))
+            # Refill the pool before handing results on, so workers never wait on the caller
+            refill()
+
+            for task, result in results:
+                if task["num_ranges"] == 1:
+                    pdf_path, chunks, timing = result
+                else:
+                    pdf_path, part, timing = result
+                    ranges = split_parts.setdefault(pdf_path, {})
+                    ranges[task["range_index"]] = (part, timing)
+                    if len(ranges) < task["num_ranges"]:
+                        continue
+                    del split_parts[pdf_path]
+                    chunks, timing = finish_split_pdf(pdf_path, [ranges[i] for i in range(task["num_ranges"])])
+
+                pipeline_profiler.record("pdf", file=Path(pdf_path).name, chunks=len(chunks), page_ranges=task["num_ranges"],
+                                         windowed=task["windowed"], **timing)
+                yield pdf_path, chunks
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def pipeline_version() -> str:
+    """Version string of everything that determines a document's cached chunks and embeddings."""
+    embedder = "windows" if TOKEN_BUDGET_BATCHING else "truncate"
+    # Read from initialize_model, like every loader of the model, so the key always names the model in use
+    model = f"{EMBEDDING_MODEL_VERSION}-int8" if initialize_model.QUANTIZED_EMBEDDING_MODEL else EMBEDDING_MODEL_VERSION
+    chunker = f"{CHUNKER_VERSION}-fold" if FOLD_SHORT_SECTIONS else CHUNKER_VERSION
+    return f"extractor={EXTRACTOR_VERSION};chunker={chunker};model={model};embedder={embedder}"
+
+def resolve_pdf_paths(document_filenames: list[str], input_pdf_dir: str) -> list[str]:
+    """Maps config-file document names to existing PDF paths, warning about missing ones."""
     pdf_paths = [str(Path(input_pdf_dir) / fn) for fn in document_filenames if (Path(input_pdf_dir) / fn).exists()]
     
     if len(pdf_paths) != len(document_filenames):
         print("Warning: Some documents listed in the config file were not found in the PDFs directory.")
+    return pdf_paths
+
+def document_cache_keys(pdf_paths: list[str]) -> dict:
+    """Returns {pdf_path: embedding cache key} under the current pipeline version; reads each PDF once."""
+    version = pipeline_version()
+    return {pdf_path: document_cache_key(pdf_path, version) for pdf_path in pdf_paths}
+
+def ingest_pdfs(pdf_paths: list[str], model=None, cache_keys: dict = None) -> dict:
+    """
+    Parses and embeds a set of PDFs (possibly from several collections) through one worker pool and
+    shared embedding batches. Returns {pdf_path: (chunks, embeddings)} for every PDF that produced
+    chunks. PDFs whose content was already ingested by an earlier run are loaded from the embedding
+    cache; only new or changed files are parsed and encoded. An already-loaded embedding `model`
+    can be passed in to skip loading it, and keys from `document_cache_keys` to skip hashing the PDFs.
+    """
+    # Each document ends up as (chunks, embeddings); embeddings stay None until encoded
+    results = {}
+    if USE_EMBEDDING_CACHE:
+        with pipeline_profiler.stage("cache_lookup"):
+            if cache_keys is None:
+                cache_keys = document_cache_keys(pdf_paths)
+            for pdf_path in pdf_paths:
+                cached = load_cached_document(cache_keys[pdf_path], Path(pdf_path).name)
+                if cached is not None:
+                    results[pdf_path] = cached
+        if results:
+            print(f"Loaded {len(results)} unchanged PDF documents from the embedding cache.")
 
-    print(f"Starting parallel processing of {len(pdf_paths)} PDF documents...")
-    all_chunks = []
-    # Use ProcessPoolExecutor to run PDF processing in parallel for speed
-    with ProcessPoolExecutor() as executor:
-        futures = {executor.submit(process_single_pdf, p): p for p in pdf_paths}
-        for future in as_completed(futures):
-            pdf_path, chunks = future.result()
+    pending_paths = [p for p in pdf_paths if p not in results]
+    if pending_paths:
+        print(f"Starting parallel processing of {len(pending_paths)} PDF documents...")
+        ingest = stream_parse_and_embed if STREAMING_INGESTION else parse_then_embed
+        with pipeline_profiler.stage("parse_and_embed"):
+            for pdf_path, chunks, embeddings in ingest(pending_paths, model):
+                results[pdf_path] = (chunks, embeddings)
+                if USE_EMBEDDING_CACHE:
+                    save_cached_document(cache_keys[pdf_path], chunks, embeddings)
+                    # Read back memory-mapped, so new documents do not hold their chunks and embeddings in RAM either
+                    results[pdf_path] = load_cached_document(cache_keys[pdf_path], Path(pdf_path).name) or results[pdf_path]
+
+    return results
+
+def load_ingestion_model(model=None):
+    """Returns `model`, or loads the embedding model if none was passed in."""
+    if model is None and initialize_model.QUANTIZED_EMBEDDING_MODEL:
+        print(f"Loading embedding model from: {initialize_model.EMBEDDING_MODEL_PATH} (quantized to int8 at load time)...")
+        with pipeline_profiler.stage("load_model"):
+            model = initialize_model.load_quantized_embedding_model()
+    elif model is None:
+        print(f"Loading embedding model from: {MODEL_PATH}...")
+        with pipeline_profiler.stage("load_model"):
+            # Imported only here, so PDF workers that import this module never load torch
+            from sentence_transformers import SentenceTransformer
+            # This assumes the models are already downloaded and available at MODEL_PATH
+            model = SentenceTransformer(MODEL_PATH)
+    return model
+
+def make_chunk_encoder(model, streaming=False):
+    """
+    Returns (encode, embedder): `encode` maps a list of chunk texts to float32 embeddings;
+    `embedder` is the TokenBudgetEmbedder behind it (for its stats), or None with plain `model.encode`.
+    Torch's thread pool is sized from the CPU budget, shared with the PDF workers when `streaming`.
+    """
+    set_torch_threads(allocate("embedding_threads", streaming=streaming))
+    if TOKEN_BUDGET_BATCHING:
+        from embedding_batches import TokenBudgetEmbedder
+        embedder = TokenBudgetEmbedder(model)
+        return embedder.embed, embedder
+    def encode(texts):
+        return np.asarray(model.encode(texts, show_progress_bar=False, batch_size=EMBED_BATCH_SIZE), dtype=np.float32)
+    return encode, None
+
+def report_embedding_stats(embedder):
+    """Prints the throughput of a TokenBudgetEmbedder and records it in the profile."""
+    if embedder is None or not embedder.stats["seconds"]:
+        return
+    stats = embedder.stats
+    pipeline_profiler.record("embedding", **stats)
+    print(f"Embedded {stats['chunks']} chunks as {stats['windows']} windows of {stats['tokens']} tokens "
+          f"({stats['chunks'] / stats['seconds']:.1f} chunks/s, {stats['tokens'] / stats['seconds']:.0f} tokens/s, "
+          f"{1 - stats['tokens'] / max(stats['padded_tokens'], 1):.0%} padding)")
+
+def parse_then_embed(pdf_paths: list[str], model=None):
+    """
+    Two-phase ingestion: parses every PDF in the worker pool, then embeds all chunks at once.
+    Yields (pdf_path, chunks, embeddings) for every PDF that produced chunks.
+    """
+    parsed = {}
+    with pipeline_profiler.stage("parse"):
+        for pdf_path, chunks in parse_pdfs(pdf_paths):
             if chunks: 
                 print(f"  - Created {len(chunks)} chunks from {Path(pdf_path).name}")
-                all_chunks.extend(chunks)
+                parsed[pdf_path] = chunks
+
+    if not parsed:
+        return
+    new_documents = [text for chunks in parsed.values() for text in chunks.texts()]
+    model = load_ingestion_model(model)
+
+    encode, embedder = make_chunk_encoder(model)
+
+    print(f"Generating embeddings for {len(new_documents)} chunks...")
+    with pipeline_profiler.stage("embed"):
+        new_embeddings = encode(new_documents)
+    report_embedding_stats(embedder)
+
+    offset = 0
+    for pdf_path, chunks in parsed.items():
+        yield pdf_path, chunks, new_embeddings[offset:offset + len(chunks)]
+        offset += len(chunks)
 
-    if not all_chunks:
+def _parse_in_background(pdf_paths: list[str], parsed_queue: queue.Queue, stop: threading.Event):
+    """
+    Producer thread of the streaming ingestion: hands every parsed PDF to the embedder through
+    `parsed_queue`. Submissions to the pool are bounded, so when the embedder falls behind the
+    queue fills up and parsing pauses instead of piling chunks up in memory. Once `stop` is set
+    (the embedder failed or the caller stopped iterating) it gives up and shuts the pool down.
+    """
+    def hand_over(item):
+        """Puts `item` on the queue, waiting for room unless `stop` is set; returns whether it was put."""
+        while not stop.is_set():
+            try:
+                parsed_queue.put(item, timeout=STREAM_STOP_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    parsed = parse_pdfs(pdf_paths, streaming=True)
+    try:
+        for item in parsed:
+            if not hand_over(item):
+                return
+    except Exception as e:
+        hand_over(e)
+    finally:
+        # Shuts the worker pool down now, not whenever the generator happens to be collected
+        parsed.close()
+        hand_over(None)
+
+def stream_parse_and_embed(pdf_paths: list[str], model=None):
+    """
+    Streaming ingestion: chunks flow from the PDF workers through a bounded queue into the embedder,
+    which encodes them in batches while parsing continues, so total time approaches
+    max(parse, embed) instead of their sum. Yields (pdf_path, chunks, embeddings) as soon as each
+    PDF is fully embedded.
+    """
+    parsed_queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    stop = threading.Event()
+    producer = threading.Thread(target=_parse_in_background, args=(pdf_paths, parsed_queue, stop), daemon=True)
+    producer.start()
+    try:
+        # Loading the model overlaps with the first PDFs being parsed
+        model = load_ingestion_model(model)
+        encode, embedder = make_chunk_encoder(model, streaming=True)
+        if embedder is not None:
+            # Texts are tokenized once, as they arrive, so the buffer is measured in the embedder's padded tokens
+            prepare, encode_prepared, size = embedder.tokenize, embedder.embed_tokens, lambda ids: len(ids) + 2
+            full_buffer, idle_buffer = STREAM_EMBED_BATCHES * embedder.token_budget, embedder.token_budget
+        else:
+            prepare, encode_prepared, size = list, encode, lambda text: 1
+            full_buffer, idle_buffer = EMBED_BATCH_SIZE, 1
+
+        documents = {}  # pdf_path -> [chunks, embedding rows, rows still missing]
+        batch = []      # (pdf_path, chunk index, text or token ids) waiting to be encoded
+        buffered = 0    # Size of `batch` in tokens (in chunks with plain `model.encode`)
+        num_embedded = 0
+
+        def encode_batch():
+            nonlocal num_embedded, buffered
+            vectors = encode_prepared([prepared for _, _, prepared in batch])
+            finished = []
+            for (pdf_path, chunk_index, _), vector in zip(batch, vectors):
+                document = documents[pdf_path]
+                document[1][chunk_index] = vector
+                document[2] -= 1
+                if document[2] == 0:
+                    finished.append(pdf_path)
+            num_embedded += len(batch)
+            batch.clear()
+            buffered = 0
+            return finished
+
+        def completed(pdf_paths_done):
+            for pdf_path in pdf_paths_done:
+                chunks, rows, _ = documents.pop(pdf_path)
+                yield pdf_path, chunks, np.stack(rows)
+
+        while True:
+            try:
+                item = parsed_queue.get_nowait()
+            except queue.Empty:
+                if buffered >= idle_buffer:
+                    # Nothing new parsed yet: encode what we have instead of idling, if it fills at least one batch
+                    yield from completed(encode_batch())
+                    continue
+                item = parsed_queue.get()
+
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            pdf_path, chunks = item
+            if not chunks:
+                continue
+            print(f"  - Created {len(chunks)} chunks from {Path(pdf_path).name}")
+            documents[pdf_path] = [chunks, [None] * len(chunks), len(chunks)]
+            for chunk_index, prepared in enumerate(prepare(list(chunks.texts()))):
+                batch.append((pdf_path, chunk_index, prepared))
+                buffered += size(prepared)
+                if buffered >= full_buffer:
+                    yield from completed(encode_batch())
+
+        if batch:
+            yield from completed(encode_batch())
+        producer.join()
+        print(f"Generated embeddings for {num_embedded} chunks while parsing.")
+        report_embedding_stats(embedder)
+    finally:
+        # Reached early when loading the model or encoding fails or the caller stops iterating: the
+        # producer must not stay blocked on a full queue, holding on to the worker pool
+        stop.set()
+        while True:
+            try:
+                parsed_queue.get_nowait()
+            except queue.Empty:
+                break
+
+def build_in_memory_db(pdf_paths: list[str], results: dict, cache_keys: dict = None):
+    """
+    Assembles the per-document results of `ingest_pdfs` into one in-memory "database", in `pdf_paths`
+    order. Its "corpus_key" is derived from the documents' cache keys (see `document_cache_keys`),
+    which are computed here unless passed in.
+    """
+    # Assemble in config-file order so the database layout does not depend on worker timing
+    ingested_paths = [p for p in pdf_paths if p in results]
+    ordered = [results[p] for p in ingested_paths]
+    if not ordered:
         print("CRITICAL: No processable chunks were created from the provided PDFs. Halting.")
         return None
-        
-    documents = [chunk['chunk_text'] for chunk in all_chunks]
-    metadatas = [chunk['metadata'] for chunk in all_chunks]
-    
-    print(f"Loading embedding model from: {MODEL_PATH}...")
-    # This assumes the models are already downloaded and available at MODEL_PATH
-    model = SentenceTransformer(MODEL_PATH)
-    
-    print(f"Generating embeddings for {len(documents)} chunks...")
-    embeddings = model.encode(documents, show_progress_bar=True, batch_size=64)
+
+    # Texts and metadata stay in the per-document columnar stores (memory-mapped for cached documents);
+    # the analysis decodes only the chunks it reads
+    chunks = ChunkCorpus(chunks for chunks, _ in ordered)
+    # Likewise each document's embeddings stay their own array, memory-mapped when they come from the cache
+    embeddings = EmbeddingBlocks(embeddings for _, embeddings in ordered)
+    with pipeline_profiler.stage("build_index"):
+        index = build_index(embeddings, VECTOR_INDEX)
+    db = {
+        "embeddings": embeddings,
+        "chunks": chunks,
+        "index": index
+    }
+    if cache_keys is None:
+        cache_keys = document_cache_keys(ingested_paths)
+    # Identifies the corpus for the result cache without rehashing its chunks or embeddings
+    db["corpus_key"] = corpus_cache_key([(Path(p).name, cache_keys[p]) for p in ingested_paths], pipeline_version())
+    if LEXICAL_INDEX:
+        with pipeline_profiler.stage("build_lexical_index"):
+            db["lexical_index"] = BM25Index.build(chunks.texts())
     
     print("Ingestion complete. Data is ready in memory.")
     
-    return {
-        "embeddings": np.array(embeddings),
-        "documents": documents,
-        "metadatas": metadatas
-    }
\ No newline at end of file
+    return db
+
+def run_ingestion(document_filenames: list[str], input_pdf_dir: str, model=None):
+    """
+    Processes PDFs from a specific directory, generates embeddings, and returns an in-memory "database".
+    See `ingest_pdfs` for caching and model reuse.
+    """
+    pdf_paths = resolve_pdf_paths(document_filenames, input_pdf_dir)
+    cache_keys = document_cache_keys(pdf_paths)
+    return build_in_memory_db(pdf_paths, ingest_pdfs(pdf_paths, model=model, cache_keys=cache_keys), cache_keys)
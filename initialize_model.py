@@ -2,8 +2,7 @@
 
 import os
 import shutil
-from sentence_transformers import SentenceTransformer
-from huggingface_hub import hf_hub_download
+import warnings
 
 # --- CONFIGURATION ---
 EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
@@ -12,6 +11,10 @@ LLM_HF_FILENAME = "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"
 
 MODELS_DIR = "./models"
 EMBEDDING_MODEL_PATH = os.path.join(MODELS_DIR, "embedding_model")
+# Encode with an int8 copy of the embedding model (torch dynamic quantization of the Linear layers,
+# applied when the model is loaded): faster on CPU, embeddings differ slightly. The one switch for both the
+# ingestion and the analysis stage (they share one model object), and part of the embedding cache key
+QUANTIZED_EMBEDDING_MODEL = False
 LLM_MODEL_PATH = os.path.join(MODELS_DIR, LLM_HF_FILENAME)
 
 def download_models():
@@ -20,6 +23,9 @@ def download_models():
     Includes error handling to clean up corrupted downloads automatically.
     """
     print("--- Model Initializer ---")
+    # Imported here so that importing this module (e.g. for MODELS_DIR) stays cheap
+    from sentence_transformers import SentenceTransformer
+    from huggingface_hub import hf_hub_download
     
     os.makedirs(MODELS_DIR, exist_ok=True)
     print(f"Models will be stored in: {os.path.abspath(MODELS_DIR)}")
@@ -66,5 +72,21 @@ def download_models():
 
     print("\n--- Model initialization complete! ---")
 
+def _quantize_linear_layers(model):
+    """Swaps the model's Linear layers for dynamic int8 ones (int8 weights, activations quantized on the fly)."""
+    import torch
+    with warnings.catch_warnings():
+        # torch.ao.quantization announces its move to torchao on every call
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_quantized_embedding_model(model_path=EMBEDDING_MODEL_PATH):
+    """
+    Loads the embedding model from `model_path` and quantizes its Linear layers to int8. Quantization
+    happens on every load (dynamic quantization needs no calibration data); nothing is saved.
+    """
+    from sentence_transformers import SentenceTransformer
+    return _quantize_linear_layers(SentenceTransformer(model_path, device='cpu'))
+
 if __name__ == "__main__":
     download_models()
\ No newline at end of file
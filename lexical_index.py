@@ -0,0 +1,128 @@
+# lexical_index.py
+
+import re
+from collections import Counter
+import numpy as np
+
+from vector_index import normalize, EmbeddingBlocks
+
+# --- CONFIGURATION ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+HYBRID_SHORTLIST = 200 # Chunks kept by the BM25 prefilter for dense scoring
+RRF_K = 60 # Rank offset of reciprocal-rank fusion; larger values flatten the contribution of top ranks
+# Words that carry no topic; dropping them keeps the postings short and the prefilter selective
+STOPWORDS = frozenset("""a about after all also an and any are as at be been but by can could do does for from
+had has have how i if in into is it its i'm me my of on or our so some such than that the their them then
+there these they this to up us was we were what when where which who will with would you your""".split())
+
+_token_pattern = re.compile(r"[^\W_]+")
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased alphanumeric words of `text`, without stopwords."""
+    return [t for t in _token_pattern.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """
+    Inverted index over chunk texts for BM25 ranking. Postings are stored like a CSR matrix: for
+    term t, `doc_ids[offsets[t]:offsets[t + 1]]` are the chunks containing it and `impacts` the
+    matching BM25 term weights, precomputed at build time, so a query is a single weighted
+    bincount over the postings of its terms.
+    """
+
+    def __init__(self, vocabulary, offsets, doc_ids, impacts, num_docs):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.impacts = impacts
+        self.num_docs = num_docs
+
+    def __len__(self):
+        return self.num_docs
+
+    @classmethod
+    def build(cls, documents, k1=BM25_K1, b=BM25_B):
+        """Indexes `documents`, any iterable of texts (e.g. a generator, so they need not all be in memory at once)."""
+        vocabulary = {}
+        term_ids, doc_ids, term_freqs, doc_lengths = [], [], [], []
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable") # Postings of a term stay in document order
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        term_freqs = np.asarray(term_freqs, dtype=np.float32)[order]
+        doc_freqs = np.bincount(term_ids, minlength=len(vocabulary))
+        offsets = np.concatenate([[0], np.cumsum(doc_freqs)]).astype(np.int64)
+
+        num_docs = len(doc_lengths)
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        average_length = max(float(doc_lengths.mean()), 1.0) if num_docs else 1.0
+        length_norm = k1 * (1 - b + b * doc_lengths / average_length)
+        impacts = np.repeat(idf, doc_freqs) * term_freqs * (k1 + 1) / (term_freqs + length_norm[doc_ids])
+        return cls(vocabulary, offsets, doc_ids, impacts.astype(np.float32), num_docs)
+
+    def memory_bytes(self):
+        """Size of the postings arrays (the vocabulary dict is not counted)."""
+        return self.offsets.nbytes + self.doc_ids.nbytes + self.impacts.nbytes
+
+    def scores(self, query: str):
+        """BM25 score of every chunk for `query` (zero for chunks sharing no term with it)."""
+        postings = [slice(self.offsets[t], self.offsets[t + 1])
+                    for t in (self.vocabulary.get(term) for term in set(tokenize(query))) if t is not None]
+        if not postings:
+            return np.zeros(self.num_docs, dtype=np.float32)
+        doc_ids = np.concatenate([self.doc_ids[p] for p in postings])
+        impacts = np.concatenate([self.impacts[p] for p in postings])
+        return np.bincount(doc_ids, weights=impacts, minlength=self.num_docs)
+
+    def search(self, query: str, top_k):
+        """Returns the ids of the (at most) `top_k` best-matching chunks, best first, and their scores."""
+        scores = self.scores(query)
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) > top_k:
+            matching = matching[np.argpartition(-scores[matching], top_k - 1)[:top_k]]
+        matching = matching[np.argsort(-scores[matching], kind="stable")]
+        return matching, scores[matching]
+
+def hybrid_search(lexical_index, embeddings, query_text, query_embedding, top_k, shortlist_size=HYBRID_SHORTLIST, fusion=None):
+    """
+    Prefilters chunks by BM25 and dense-scores only that shortlist. Results are ordered by cosine
+    similarity, or with `fusion="rrf"` by reciprocal-rank fusion of the BM25 and dense ranks.
+    'score' is always the cosine similarity, since the verification thresholds are calibrated on
+    it; the fused score is returned as 'rrf_score'. Returns None when fewer than `top_k` chunks
+    share a term with the query, so the caller can fall back to dense search.
+    """
+    shortlist, _ = lexical_index.search(query_text, shortlist_size)
+    if len(shortlist) < top_k:
+        return None
+    query = normalize(query_embedding).reshape(-1)
+    if isinstance(embeddings, EmbeddingBlocks):
+        # Reads the rows block by block, in sorted order, and returns them in shortlist order
+        dense_scores = normalize(embeddings[shortlist]) @ query
+    elif isinstance(embeddings, np.memmap):
+        # Sorted rows read the memory map sequentially; scores are put back in shortlist order
+        rows = np.argsort(shortlist)
+        dense_scores = np.empty(len(shortlist), dtype=np.float32)
+        dense_scores[rows] = normalize(np.asarray(embeddings[shortlist[rows]])) @ query
+    else:
+        dense_scores = normalize(embeddings[shortlist]) @ query
+
+    dense_order = np.argsort(-dense_scores, kind="stable")
+    if fusion is None:
+        best = dense_order[:top_k]
+        return [{'corpus_id': int(shortlist[i]), 'score': float(dense_scores[i])} for i in best]
+    if fusion != "rrf":
+        raise ValueError(f"Unknown fusion: '{fusion}'")
+    # The shortlist is in BM25 order, so a chunk's position in it is its lexical rank
+    dense_rank = np.empty(len(shortlist), dtype=np.float64)
+    dense_rank[dense_order] = np.arange(len(shortlist))
+    fused = 1 / (RRF_K + 1 + np.arange(len(shortlist))) + 1 / (RRF_K + 1 + dense_rank)
+    best = np.argsort(-fused, kind="stable")[:top_k]
+    return [{'corpus_id': int(shortlist[i]), 'score': float(dense_scores[i]), 'rrf_score': float(fused[i])} for i in best]
@@ -0,0 +1,189 @@
+# pipeline_profiler.py
+
+import cProfile
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError: # Not available on Windows; peak RSS is then reported as None
+    resource = None
+
+# --- CONFIGURATION ---
+TRACE_FILENAME = "profile.json"
+CPROFILE_FILENAME = "profile.prof"
+
+_active = None # The profiler of the current run, if profiling is enabled
+
+def _peak_rss_mb(children=False):
+    """
+    High-water mark of resident memory in MB over the process's lifetime so far: of this process,
+    or with `children`, of the largest child process that has exited and been waited for.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class PipelineProfiler:
+    """
+    Collects a trace of one pipeline run: wall time, CPU time and memory for each stage, plus
+    per-item events (PDFs parsed, embedding runs, LLM calls) recorded by the stages themselves.
+    Stages may nest; each one is recorded with its path of enclosing stages. CPU time is that of
+    the main process: PDF workers report their own time through the "pdf" events.
+    Memory comes from getrusage, which only keeps lifetime high-water marks: `process_peak_rss_mb`
+    is the main process's peak so far when the stage ends (workers excluded), and
+    `process_peak_rss_growth_mb` how far the stage raised it, 0 for a stage that stayed below an
+    earlier peak. `children_peak_rss_mb` is the largest peak of any child process (PDF workers and
+    any other subprocess) that had exited by then; live ones (e.g. the LLM pool) are not counted.
+    """
+
+    def __init__(self, with_cprofile=False):
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.stages = []
+        self.events = defaultdict(list)
+        self.stack = []
+        self.cprofile = cProfile.Profile() if with_cprofile else None
+
+    @contextmanager
+    def stage(self, name):
+        self.stack.append(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        rss_before = _peak_rss_mb()
+        try:
+            yield
+        finally:
+            peak_rss = _peak_rss_mb()
+            self.stages.append({
+                "stage": "/".join(self.stack),
+                "start_seconds": wall - self.start,
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": time.process_time() - cpu,
+                "process_peak_rss_mb": peak_rss,
+                "process_peak_rss_growth_mb": peak_rss - rss_before if peak_rss is not None else None,
+                "children_peak_rss_mb": _peak_rss_mb(children=True),
+            })
+            self.stack.pop()
+
+    def record(self, kind, **fields):
+        # list.append is atomic, so worker-facing threads (e.g. the streaming parser) may record too
+        self.events[kind].append(fields)
+
+    def summary(self):
+        """Aggregates the recorded events into the throughput figures of the run."""
+        summary = {"total_wall_seconds": time.perf_counter() - self.start}
+        pdfs = self.events.get("pdf", [])
+        if pdfs:
+            pages = sum(p["pages"] for p in pdfs)
+            seconds = sum(p["extract_seconds"] + p["chunk_seconds"] for p in pdfs)
+            summary["pdfs"] = {
+                "documents": len(pdfs), "pages": pages, "chunks": sum(p["chunks"] for p in pdfs),
+                "extract_seconds": sum(p["extract_seconds"] for p in pdfs),
+                "chunk_seconds": sum(p["chunk_seconds"] for p in pdfs),
+                "windowed": sum(p.get("windowed", False) for p in pdfs),
+                "pages_per_second": pages / seconds if seconds else None,
+            }
+        embedding = self.events.get("embedding", [])
+        if embedding:
+            tokens = sum(e["tokens"] for e in embedding)
+            seconds = sum(e["seconds"] for e in embedding)
+            summary["embedding"] = {
+                "chunks": sum(e["chunks"] for e in embedding), "tokens": tokens, "seconds": seconds,
+                "tokens_per_second": tokens / seconds if seconds else None,
+            }
+        calls = self.events.get("llm_call", [])
+        if calls:
+            latencies = sorted(c["seconds"] for c in calls)
+            prompt_tokens = sum(c["prompt_tokens"] for c in calls)
+            # A packed prompt verifies several sections in one call
+            sections = sum(c.get("items", 1) for c in calls)
+            summary["llm"] = {
+                "calls": len(calls),
+                "sections": sections,
+                "prompt_tokens": prompt_tokens,
+                "prompt_tokens_per_section": prompt_tokens / sections,
+                "generated_tokens": sum(c["generated_tokens"] for c in calls),
+                "mean_latency_ms": sum(latencies) / len(latencies) * 1000,
+                "p50_latency_ms": latencies[len(latencies) // 2] * 1000,
+                "max_latency_ms": latencies[-1] * 1000,
+            }
+        return summary
+
+    def trace(self):
+        return {
+            "started_at": self.started_at,
+            "command": sys.argv,
+            "summary": self.summary(),
+            "stages": self.stages,
+            "events": dict(self.events),
+        }
+
+    def write(self, out_dir):
+        """Writes the JSON trace (and the cProfile dump, if enabled) into `out_dir`; returns the trace path."""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        trace_path = out_dir / TRACE_FILENAME
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f, indent=2)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(out_dir / CPROFILE_FILENAME)
+        return trace_path
+
+    def print_summary(self):
+        print(f"\n--- Profile ---")
+        # Lifetime high-water marks as of each stage's end, not what the stage itself used (see the class docstring)
+        print(f"{'stage':<48} {'wall s':>8} {'cpu s':>8} {'main peak MB':>13} {'children peak MB':>17}")
+        for s in sorted(self.stages, key=lambda s: s["start_seconds"]):
+            peak = f"{s['process_peak_rss_mb']:.0f}" if s["process_peak_rss_mb"] is not None else "-"
+            children = f"{s['children_peak_rss_mb']:.0f}" if s["children_peak_rss_mb"] else "-"
+            print(f"{s['stage'][-48:]:<48} {s['wall_seconds']:>8.2f} {s['cpu_seconds']:>8.2f} {peak:>13} {children:>17}")
+        summary = self.summary()
+        if "pdfs" in summary:
+            p = summary["pdfs"]
+            windowed = f" ({p['windowed']} read in page windows)" if p['windowed'] else ""
+            print(f"PDFs: {p['documents']} documents{windowed}, {p['pages']} pages, {p['pages_per_second'] or 0:.1f} pages/s per worker")
+        if "embedding" in summary:
+            e = summary["embedding"]
+            print(f"Embedding: {e['chunks']} chunks, {e['tokens']} tokens, {e['tokens_per_second'] or 0:.0f} tokens/s")
+        if "llm" in summary:
+            l = summary["llm"]
+            print(f"LLM: {l['calls']} calls for {l['sections']} sections, {l['prompt_tokens']} prompt / {l['generated_tokens']} generated tokens "
+                  f"({l['prompt_tokens_per_section']:.0f} prompt tokens per section), {l['mean_latency_ms']:.0f} ms mean, "
+                  f"{l['max_latency_ms']:.0f} ms max per call")
+
+def start(with_cprofile=False):
+    """Starts profiling the current run and returns the profiler."""
+    global _active
+    _active = PipelineProfiler(with_cprofile)
+    if _active.cprofile is not None:
+        _active.cprofile.enable()
+    return _active
+
+def stop():
+    """Stops profiling and returns the profiler (or None if profiling was not enabled)."""
+    global _active
+    profiler, _active = _active, None
+    if profiler is not None and profiler.cprofile is not None:
+        profiler.cprofile.disable()
+    return profiler
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block as a pipeline stage; does nothing unless profiling is enabled."""
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+def record(kind, **fields):
+    """Records a per-item event (e.g. kind="pdf") in the active profile, if any."""
+    if _active is not None:
+        _active.record(kind, **fields)
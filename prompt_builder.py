@@ -0,0 +1,104 @@
+# prompt_builder.py
+
+import re
+import numpy as np
+
+from vector_index import normalize
+
+# --- CONFIGURATION ---
+# Tokens of chunk text per verified section; longer chunks keep only their most query-similar sentences
+EXCERPT_TOKEN_BUDGET = 384
+# Verify several short sections in one prompt that asks for a verdict per section (logits verifier, in-process LLM)
+PACK_SHORT_EXCERPTS = False
+PACK_TOKEN_BUDGET = 768 # Excerpt tokens in one packed prompt
+MAX_PACKED_ITEMS = 4
+SHORT_EXCERPT_TOKENS = 192 # Only excerpts up to this size are packed; longer ones are verified alone
+
+# Sentence ends, blank lines, and line breaks before a bullet
+_sentence_boundary = re.compile(r"(?<=[.!?])\s+|\n\s*\n|\n(?=\s*[•●▪\-*]\s)")
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _sentence_boundary.split(text) if s and s.strip()]
+
+class PromptBuilder:
+    """
+    Fits the chunk text pasted into a verification prompt to a token budget, counted with the LLM's
+    own tokenizer. A chunk within the budget is used whole; a longer one keeps its "Section: ..."
+    header and the sentences most similar to the search query (embedded with the search model),
+    in their original order. `pack` groups short excerpts so several sections share one prompt.
+    """
+
+    def __init__(self, tokenize, chunks, embedding_model, query_embedding, token_budget=EXCERPT_TOKEN_BUDGET):
+        # tokenize(text) -> token ids, without BOS
+        self.tokenize = tokenize
+        self.chunks = chunks
+        self.embedding_model = embedding_model
+        self.query = normalize(np.asarray(query_embedding)).reshape(-1)
+        self.token_budget = token_budget
+        self._excerpts = {} # corpus_id -> (excerpt, tokens)
+        self.stats = {"sections": 0, "trimmed": 0, "chunk_tokens": 0, "excerpt_tokens": 0}
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenize(text))
+
+    def excerpt(self, corpus_id) -> str:
+        """The text of chunk `corpus_id`, cut to the token budget."""
+        if corpus_id not in self._excerpts:
+            text = self.chunks.text(corpus_id)
+            tokens = self.count_tokens(text)
+            self.stats["sections"] += 1
+            self.stats["chunk_tokens"] += tokens
+            if tokens > self.token_budget:
+                text = self._trim(text)
+                tokens = self.count_tokens(text)
+                self.stats["trimmed"] += 1
+            self.stats["excerpt_tokens"] += tokens
+            self._excerpts[corpus_id] = (text, tokens)
+        return self._excerpts[corpus_id][0]
+
+    def excerpt_tokens(self, corpus_id) -> int:
+        self.excerpt(corpus_id)
+        return self._excerpts[corpus_id][1]
+
+    def _trim(self, text):
+        header, _, body = text.partition("\n\n")
+        sentences = split_sentences(body)
+        budget = self.token_budget - self.count_tokens(header)
+        if not sentences or budget <= 0:
+            return header
+        lengths = [self.count_tokens(s) for s in sentences]
+        similarity = normalize(self.embedding_model.encode(sentences, show_progress_bar=False)) @ self.query
+
+        chosen, used = [], 0
+        for i in np.argsort(-similarity, kind="stable"):
+            if used + lengths[i] <= budget:
+                chosen.append(i)
+                used += lengths[i]
+        if not chosen:
+            # Even the best sentence is over budget: keep the share of its characters that fits
+            best = int(np.argmax(similarity))
+            return f"{header}\n\n{sentences[best][:len(sentences[best]) * budget // lengths[best]]}"
+        return f"{header}\n\n" + " ".join(sentences[i] for i in sorted(chosen))
+
+    def pack(self, results, token_budget=PACK_TOKEN_BUDGET, max_items=MAX_PACKED_ITEMS, short_tokens=SHORT_EXCERPT_TOKENS):
+        """
+        Splits search results into consecutive groups, in rank order: short excerpts are grouped
+        while the group stays within `token_budget` and `max_items`; a longer excerpt is a group of its own.
+        """
+        groups, group, used = [], [], 0
+        for result in results:
+            tokens = self.excerpt_tokens(result['corpus_id'])
+            if tokens > short_tokens:
+                if group:
+                    groups.append(group)
+                groups.append([result])
+                group, used = [], 0
+                continue
+            if group and (len(group) >= max_items or used + tokens > token_budget):
+                groups.append(group)
+                group, used = [], 0
+            group.append(result)
+            used += tokens
+        if group:
+            groups.append(group)
+        return groups
@@ -0,0 +1,117 @@
+# result_cache.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# --- CONFIGURATION ---
+CACHE_PATH = './cache/results.sqlite'
+OUTPUT_CACHE_MAX_BYTES = 64 << 20 # Final outputs, keyed by corpus, persona, job and settings
+VERDICT_CACHE_MAX_BYTES = 32 << 20 # Per-section LLM verdicts, keyed by prompt and chunk
+
+_open_caches = {} # Cache path -> (output cache, verdict cache), shared by every run in the process
+_open_lock = threading.Lock()
+
+def hash_key(*parts) -> str:
+    """SHA-256 of the given parts (strings, or anything JSON-serializable), kept distinct from one another."""
+    digest = hashlib.sha256()
+    for part in parts:
+        text = part if isinstance(part, str) else json.dumps(part, sort_keys=True)
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class LRUCache:
+    """
+    JSON values stored in one table of a SQLite file. Once the stored values exceed `max_bytes`,
+    the least recently used entries are evicted. Several processes may share the file.
+    """
+
+    def __init__(self, connection, table, max_bytes, lock=None):
+        self.connection = connection
+        self.table = table
+        self.max_bytes = max_bytes
+        self.lock = lock or threading.Lock() # Shared by every cache on the same connection
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+
+    def get_many(self, keys) -> dict:
+        """Returns {key: value} for the keys that are cached, marking them as recently used."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.lock, self.connection:
+            for start in range(0, len(keys), 500): # SQLite caps the number of query parameters
+                batch = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            now = time.time()
+            self.connection.executemany(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss."""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: dict):
+        """Stores {key: value}, then evicts least recently used entries beyond `max_bytes`."""
+        rows = [(key, json.dumps(value)) for key, value in items.items()]
+        with self.lock, self.connection:
+            now = time.time()
+            self.connection.executemany(f"INSERT OR REPLACE INTO {self.table} (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                                        [(key, value, len(value), now) for key, value in rows])
+            self.stats["stores"] += len(rows)
+            self._evict()
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def _evict(self):
+        total = self.connection.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.connection.execute(f"SELECT key, size FROM {self.table} ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.connection.executemany(f"DELETE FROM {self.table} WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+
+def open_result_caches(cache_path: str = CACHE_PATH):
+    """
+    Returns the (output cache, verdict cache) pair stored in `cache_path`, opening it on first use.
+    Later calls in the same process return the same pair, so their hit counts accumulate.
+    """
+    with _open_lock:
+        if cache_path not in _open_caches:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            # The server's analysis thread may not be the one that opened the caches; the lock serializes access
+            connection = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            lock = threading.Lock()
+            _open_caches[cache_path] = (
+                LRUCache(connection, "outputs", OUTPUT_CACHE_MAX_BYTES, lock),
+                LRUCache(connection, "verdicts", VERDICT_CACHE_MAX_BYTES, lock),
+            )
+        return _open_caches[cache_path]
+
+def cache_stats() -> dict:
+    """Hit, miss, store and eviction counts of the caches opened in this process."""
+    with _open_lock:
+        caches = list(_open_caches.values())
+    stats = {"outputs": Counter(), "verdicts": Counter()}
+    for output_cache, verdict_cache in caches:
+        stats["outputs"].update(output_cache.stats)
+        stats["verdicts"].update(verdict_cache.stats)
+    return {name: dict(counts) for name, counts in stats.items()}
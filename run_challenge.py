@@ -2,71 +2,222 @@
 
 import os
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+import cpu_budget
+# Before NumPy or torch are imported, so their thread pools start at the CPU budget
+cpu_budget.limit_native_threads()
 
 import json
 import argparse
+import glob
 from pathlib import Path
-from ingestion_logic import run_ingestion
-from analysis_logic import run_analysis
 from initialize_model import download_models, MODELS_DIR
+import pipeline_profiler
+# The stage modules (ingestion_logic: PyMuPDF, NumPy; analysis_logic: the models) are imported by the
+# functions that run those stages, so argument and config errors are reported before any of them load
 
-def main():
-    parser = argparse.ArgumentParser(description="Run a specific document analysis collection.")
-    parser.add_argument("collection_name", type=str, help="The name of the collection directory to process (e.g., 'Collection 1').")
-    args = parser.parse_args()
+# --- CONFIGURATION ---
+# Configuration file names, in order of preference (Collections 2 and 3 ship the second form)
+CONFIG_FILENAMES = ["input.json", "challenge1b_input.json"]
+DEFAULT_COLLECTION_GLOB = "Collection */"
 
-    # --- Pre-computation Step: Check for models ---
+def ensure_models():
+    """Downloads the models on first use."""
     if not os.path.exists(MODELS_DIR):
         print("Models directory not found. Running model initializer...")
         download_models()
     else:
         print("Models directory found. Skipping download.")
 
-    collection_path = Path(args.collection_name)
-    # UPDATED: Look for 'input.json' as the configuration file
-    config_path = collection_path / "input.json"
+def find_config(collection_path: Path):
+    """Returns the path of the collection's configuration file, or None if it has none."""
+    for filename in CONFIG_FILENAMES:
+        if (collection_path / filename).is_file():
+            return collection_path / filename
+    return None
+
+def load_collection(collection_name: str, persona_info: dict = None, job_info: dict = None, output_file_path: str = None):
+    """
+    Reads a collection's configuration and resolves its PDF paths. `persona_info` and `job_info`
+    override the values from the config file. Returns a dict describing the run, or None (after
+    printing why) if the collection cannot be processed.
+    """
+    collection_path = Path(collection_name)
+    # UPDATED: Look for 'input.json' (or 'challenge1b_input.json') as the configuration file
+    config_path = find_config(collection_path)
     input_pdf_dir = collection_path / "PDFs"
     # UPDATED: Save results to 'output.json' to mirror the input file name
-    output_file_path = collection_path / "output.json"
+    if output_file_path is None:
+        output_file_path = collection_path / "output.json"
+
+    if config_path is None:
+        print(f"Error: Configuration file not found in '{collection_path.resolve()}'")
+        print(f"Please ensure the collection '{collection_name}' exists and contains one of: {', '.join(CONFIG_FILENAMES)}.")
+        return None
 
-    if not config_path.is_file():
-        print(f"Error: Configuration file not found at '{config_path.resolve()}'")
-        print(f"Please ensure the collection '{args.collection_name}' exists and contains 'input.json'.")
-        return
-        
     print(f"Loading configuration from: {config_path}")
+    from ingestion_logic import resolve_pdf_paths
 
     with open(config_path, "r", encoding="utf-8") as f:
         config = json.load(f)
 
-    challenge_id = config.get("challenge_info", {}).get("challenge_id", "default_challenge")
     documents_to_process = [doc["filename"] for doc in config.get("documents", [])]
-    persona_info = config.get("persona", {})
-    job_info = config.get("job_to_be_done", {})
+    persona_info = persona_info or config.get("persona", {})
+    job_info = job_info or config.get("job_to_be_done", {})
 
     if not all([documents_to_process, persona_info, job_info]):
         print("Error: The JSON config file is missing required keys (documents, persona, job_to_be_done).")
-        return
+        return None
+
+    return {
+        "name": collection_name,
+        "challenge_id": config.get("challenge_info", {}).get("challenge_id", "default_challenge"),
+        "documents": config.get("documents", []),
+        "pdf_paths": resolve_pdf_paths(documents_to_process, str(input_pdf_dir)),
+        "input_pdf_dir": input_pdf_dir,
+        "persona": persona_info,
+        "job": job_info,
+        "output_file_path": str(output_file_path),
+    }
 
-    print(f"\n--- Phase 1: Ingesting Documents from '{input_pdf_dir}' ---")
-    in_memory_db = run_ingestion(documents_to_process, input_pdf_dir=str(input_pdf_dir))
+def analyze_collection(collection: dict, in_memory_db: dict, embedding_model=None, llm=None):
+    """Runs the analysis phase for a loaded collection and returns the output dict."""
+    from analysis_logic import run_analysis
+    print(f"\n--- Phase 2: Analyzing Documents for Persona and Job ---")
+    with pipeline_profiler.stage(f"analysis[{collection['name']}]"):
+        final_output = run_analysis(
+            challenge_id=collection["challenge_id"],
+            persona_dict=collection["persona"],
+            job_dict=collection["job"],
+            document_list=collection["documents"],
+            in_memory_db=in_memory_db,
+            output_file_path=collection["output_file_path"],
+            embedding_model=embedding_model,
+            llm=llm
+        )
+    print("--- Analysis Complete ---")
+    print(f"\nChallenge '{collection['challenge_id']}' in collection '{collection['name']}' finished successfully.")
+    return final_output
+
+def run_collection(collection_name: str, persona_info: dict = None, job_info: dict = None, output_file_path: str = None,
+                   embedding_model=None, llm=None):
+    """
+    Runs ingestion and analysis for one collection directory. `persona_info` and `job_info`
+    override the values from the collection's config file. Already-loaded models can be passed
+    in to skip loading them. Returns the output dict, or None if the run could not complete.
+    """
+    collection = load_collection(collection_name, persona_info, job_info, output_file_path)
+    if collection is None:
+        return None
+    return ingest_and_analyze(collection, embedding_model=embedding_model, llm=llm)
+
+def ingest_and_analyze(collection: dict, embedding_model=None, llm=None):
+    """Runs ingestion and analysis for a collection returned by `load_collection`."""
+    from ingestion_logic import ingest_pdfs, build_in_memory_db, document_cache_keys
+    if embedding_model is None:
+        # Loaded once here and shared, as in run_batch, instead of once by each phase
+        from analysis_logic import load_embedding_model
+        with pipeline_profiler.stage("load_embedding_model"):
+            embedding_model = load_embedding_model()
+    print(f"\n--- Phase 1: Ingesting Documents from '{collection['input_pdf_dir']}' ---")
+    with pipeline_profiler.stage("ingestion"):
+        cache_keys = document_cache_keys(collection["pdf_paths"])
+        results = ingest_pdfs(collection["pdf_paths"], model=embedding_model, cache_keys=cache_keys)
+        in_memory_db = build_in_memory_db(collection["pdf_paths"], results, cache_keys)
     print("--- Ingestion Complete ---")
-    
+
     if not in_memory_db:
         print("Halting pipeline due to ingestion failure.")
-        return
-
-    print("\n--- Phase 2: Analyzing Documents for Persona and Job ---")
-    run_analysis(
-        challenge_id=challenge_id,
-        persona_dict=persona_info,
-        job_dict=job_info,
-        document_list=config.get("documents", []),
-        in_memory_db=in_memory_db,
-        output_file_path=str(output_file_path)
-    )
-    print("--- Analysis Complete ---")
-    print(f"\nChallenge '{challenge_id}' in collection '{args.collection_name}' finished successfully.")
+        return None
+
+    return analyze_collection(collection, in_memory_db, embedding_model=embedding_model, llm=llm)
+
+def discover_collections(pattern: str = DEFAULT_COLLECTION_GLOB) -> list[str]:
+    """Returns every directory matching `pattern` that contains a configuration file, sorted by name."""
+    return sorted(p.rstrip("/\\") for p in glob.glob(pattern) if Path(p).is_dir() and find_config(Path(p)))
+
+def run_batch(collection_names: list[str]):
+    """
+    Processes many collections in one invocation: all of their PDFs are ingested through one
+    worker pool and shared embedding batches, then each collection is analyzed against the same
+    loaded models, writing its output.json as soon as it finishes. Returns the collections that
+    were loaded.
+    """
+    collections = [c for c in map(load_collection, collection_names) if c is not None]
+    if not collections:
+        print("No processable collections found.")
+        return collections
+
+    ensure_models()
+    from ingestion_logic import ingest_pdfs, build_in_memory_db, document_cache_keys
+    from analysis_logic import load_embedding_model, load_llm
+    print(f"\nLoading models once for {len(collections)} collections...")
+    with pipeline_profiler.stage("load_models"):
+        embedding_model = load_embedding_model()
+        llm = load_llm()
+
+    try:
+        all_pdf_paths = list(dict.fromkeys(p for c in collections for p in c["pdf_paths"]))
+        print(f"\n--- Phase 1: Ingesting {len(all_pdf_paths)} Documents from {len(collections)} Collections ---")
+        with pipeline_profiler.stage("ingestion"):
+            cache_keys = document_cache_keys(all_pdf_paths)
+            results = ingest_pdfs(all_pdf_paths, model=embedding_model, cache_keys=cache_keys)
+        print("--- Ingestion Complete ---")
+
+        for collection in collections:
+            print(f"\n=== Collection '{collection['name']}' ===")
+            with pipeline_profiler.stage(f"assemble[{collection['name']}]"):
+                in_memory_db = build_in_memory_db(collection["pdf_paths"], results, cache_keys)
+            if not in_memory_db:
+                print(f"Skipping '{collection['name']}' due to ingestion failure.")
+                continue
+            analyze_collection(collection, in_memory_db, embedding_model=embedding_model, llm=llm)
+    finally:
+        # Stops the LLM worker processes when LLM_WORKERS > 1
+        llm.close()
+    return collections
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a specific document analysis collection.")
+    parser.add_argument("collection_name", type=str, nargs="?", help="The name of the collection directory to process (e.g., 'Collection 1').")
+    parser.add_argument("--all", action="store_true", help=f"Process every collection matching '{DEFAULT_COLLECTION_GLOB}' in one run.")
+    parser.add_argument("--glob", dest="pattern", help="Process every collection directory matching this glob in one run (e.g., 'Collection [12]').")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Record wall time, CPU time and peak RSS per stage and write a JSON trace ({pipeline_profiler.TRACE_FILENAME}) "
+                             "next to output.json (in batch mode, in the collections' common parent directory).")
+    parser.add_argument("--cprofile", action="store_true",
+                        help=f"With --profile, also write a cProfile dump ({pipeline_profiler.CPROFILE_FILENAME}) next to the trace.")
+    args = parser.parse_args()
+
+    if not args.collection_name and not (args.all or args.pattern):
+        parser.error("provide a collection name, --all or --glob")
+
+    if args.profile:
+        pipeline_profiler.start(with_cprofile=args.cprofile)
+
+    # Collections are checked before the models, so a mistyped name fails without loading anything
+    collections = []
+    try:
+        if args.all or args.pattern:
+            collection_names = discover_collections(args.pattern or DEFAULT_COLLECTION_GLOB)
+            if args.collection_name:
+                collection_names = list(dict.fromkeys([args.collection_name] + collection_names))
+            print(f"Batch mode: {len(collection_names)} collections: {', '.join(collection_names)}")
+            collections = run_batch(collection_names)
+        else:
+            collection = load_collection(args.collection_name)
+            if collection is None:
+                return
+            collections = [collection]
+            # --- Pre-computation Step: Check for models ---
+            ensure_models()
+            ingest_and_analyze(collection)
+    finally:
+        profiler = pipeline_profiler.stop()
+        if profiler is not None and collections:
+            # Written even when a stage failed, since that is when the trace is most useful
+            out_dir = os.path.commonpath([str(Path(c["output_file_path"]).parent.resolve()) for c in collections])
+            profiler.print_summary()
+            print(f"Profile trace saved to: {profiler.write(out_dir)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
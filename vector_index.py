@@ -0,0 +1,294 @@
+# vector_index.py
+
+import hashlib
+import os
+from pathlib import Path
+import numpy as np
+
+# --- CONFIGURATION ---
+INDEX_DIR = './cache/indexes'
+IVF_MIN_VECTORS = 4096 # Below this, an IVF index is not worth building; exact search is used instead
+IVF_TRAINING_SAMPLE = 32 # Training vectors per list used for k-means
+IVF_ITERATIONS = 10
+IVF_DEFAULT_PROBES = 8 # Lists scanned per query; higher is slower but closer to exact
+RESCORE_FACTOR = 4 # Quantized search shortlists top_k * RESCORE_FACTOR candidates for exact rescoring
+SCAN_BLOCK_SIZE = 1024 # Quantized vectors are widened to float32 in blocks of this many rows per query
+INDEX_CACHE_MAX_BYTES = 256 << 20 # Saved index files beyond this are evicted, least recently used first
+
+def normalize(vectors):
+    """Returns L2-normalized float32 vectors (rows), so dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class EmbeddingBlocks:
+    """
+    The embeddings of many documents as one matrix for the indexes, without concatenating them:
+    each document's array (memory-mapped for documents from the embedding cache) stays as it is,
+    behind an offset index, the way ChunkCorpus keeps the chunk stores. `blocks[ids]` reads rows.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = [block for block in blocks if len(block)]
+        # starts[d] is the row of the first vector of block d; starts[-1] is the total
+        self.starts = np.cumsum([0] + [len(block) for block in self.blocks]).astype(np.int64)
+        self.shape = (int(self.starts[-1]), self.blocks[0].shape[1] if self.blocks else 0)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(block.nbytes for block in self.blocks)
+
+    def iter_blocks(self):
+        """Yields (first row, block) for every document's array."""
+        for start, block in zip(self.starts, self.blocks):
+            yield int(start), block
+
+    def __getitem__(self, ids):
+        """The float32 rows `ids` (an int or an array of ints), in the order asked for."""
+        if np.ndim(ids) == 0:
+            return self[np.asarray([ids])][0]
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.empty((len(ids), self.shape[1]), dtype=np.float32)
+        # Sorted rows read each memory map sequentially
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        owners = np.searchsorted(self.starts, sorted_ids, side="right") - 1
+        for d in np.unique(owners):
+            mine = owners == d
+            rows[order[mine]] = self.blocks[d][sorted_ids[mine] - self.starts[d]]
+        return rows
+
+    def norms(self):
+        """The L2 norm of every row, at least 1e-12, computed one block at a time."""
+        if not self.blocks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([np.maximum(np.linalg.norm(np.asarray(block, dtype=np.float32), axis=1), 1e-12)
+                               for block in self.blocks]).astype(np.float32)
+
+def as_blocks(embeddings):
+    """`embeddings` as EmbeddingBlocks; a single array becomes one block (not copied)."""
+    return embeddings if isinstance(embeddings, EmbeddingBlocks) else EmbeddingBlocks([embeddings])
+
+def _top_k(scores, ids, top_k):
+    """Returns [{'corpus_id', 'score'}] for the `top_k` highest scores, best first (util.semantic_search format)."""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return []
+    best = np.argpartition(-scores, top_k - 1)[:top_k]
+    best = best[np.lexsort((ids[best], -scores[best]))] # Equal scores (duplicate chunks) keep the lower id first
+    return [{'corpus_id': int(ids[i]), 'score': float(scores[i])} for i in best]
+
+class ExactIndex:
+    """
+    Brute-force cosine search over all vectors; the reference every other index is measured against.
+    The vectors are scored where they are, block by block, and divided by norms computed once,
+    instead of being copied into one normalized matrix.
+    """
+
+    kind = "exact"
+
+    def __init__(self, embeddings):
+        self.vectors = as_blocks(embeddings)
+        self.norms = self.vectors.norms()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, query_embedding, top_k):
+        query = normalize(query_embedding).reshape(-1)
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start, block in self.vectors.iter_blocks():
+            scores[start:start + len(block)] = block @ query
+        scores /= self.norms
+        return _top_k(scores, np.arange(len(scores)), top_k)
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are clustered with spherical k-means, and a query only scores the
+    vectors in the `n_probe` lists whose centroids are closest to it. Lists are stored as one
+    permutation array plus offsets, so the index itself is three NumPy arrays; the vectors stay in
+    their per-document blocks, like ExactIndex's.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors, centroids, list_ids, list_offsets, n_probe=IVF_DEFAULT_PROBES):
+        self.vectors = as_blocks(vectors)
+        self.norms = self.vectors.norms()
+        self.centroids = centroids
+        self.list_ids = list_ids
+        self.list_offsets = list_offsets
+        self.n_probe = n_probe
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, seed=0):
+        vectors = as_blocks(embeddings)
+        n_lists = n_lists or max(int(2 * np.sqrt(len(vectors))), 1)
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(len(vectors), n_lists * IVF_TRAINING_SAMPLE)
+        sample = normalize(vectors[rng.choice(len(vectors), sample_size, replace=False)])
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(IVF_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assignment, minlength=n_lists)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            filled = counts > 0
+            sums = np.zeros_like(centroids)
+            sums[filled] = np.add.reduceat(sample[np.argsort(assignment, kind="stable")], starts[filled])
+            empty = ~filled
+            # Re-seed empty lists with random training vectors
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assignment = np.concatenate([np.argmax(normalize(block) @ centroids.T, axis=1) for _, block in vectors.iter_blocks()])
+        list_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))]).astype(np.int64)
+        return cls(vectors, centroids, list_ids, list_offsets)
+
+    def search(self, query_embedding, top_k, n_probe=None):
+        query = normalize(query_embedding).reshape(-1)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        ids = np.concatenate([self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in probed])
+        scores = (self.vectors[ids] @ query) / self.norms[ids]
+        return _top_k(scores, ids, top_k)
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, list_ids=self.list_ids, list_offsets=self.list_offsets)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, embeddings):
+        with np.load(path) as data:
+            return cls(embeddings, data["centroids"], data["list_ids"], data["list_offsets"])
+
+class QuantizedIndex:
+    """
+    Compact in-memory store of normalized embeddings as float16, or as int8 with one scale per
+    vector (2x / 4x smaller than float32). A query first ranks every vector on the quantized codes,
+    then rescores a shortlist against the full-precision vectors, which stay in their per-document
+    blocks (memory-mapped for documents from the embedding cache).
+    """
+
+    def __init__(self, codes, scales, full_vectors, norms, kind):
+        self.codes = codes
+        self.scales = scales
+        self.full_vectors = full_vectors
+        self.norms = norms
+        self.kind = kind
+
+    def __len__(self):
+        return len(self.codes)
+
+    @staticmethod
+    def quantize(vectors, kind):
+        """Returns (codes, per-vector scales or None) for normalized float32 vectors."""
+        if kind == "float16":
+            return vectors.astype(np.float16), None
+        if kind == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        raise ValueError(f"Unknown quantization: '{kind}'")
+
+    @classmethod
+    def build(cls, embeddings, kind):
+        """Quantizes one document's block at a time into preallocated codes, so no normalized copy of the corpus is made."""
+        if kind not in ("float16", "int8"):
+            raise ValueError(f"Unknown quantization: '{kind}'")
+        vectors = as_blocks(embeddings)
+        norms = vectors.norms()
+        codes = np.empty(vectors.shape, dtype=np.float16 if kind == "float16" else np.int8)
+        scales = np.empty(len(vectors), dtype=np.float32) if kind == "int8" else None
+        for start, block in vectors.iter_blocks():
+            end = start + len(block)
+            block_codes, block_scales = cls.quantize(np.asarray(block, dtype=np.float32) / norms[start:end, None], kind)
+            codes[start:end] = block_codes
+            if scales is not None:
+                scales[start:end] = block_scales
+        return cls(codes, scales, vectors, norms, kind)
+
+    def memory_bytes(self):
+        """Resident size of the quantized store (the full-precision vectors are not counted)."""
+        return self.codes.nbytes + self.norms.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def search(self, query_embedding, top_k, rescore_factor=RESCORE_FACTOR):
+        query = normalize(query_embedding).reshape(-1)
+        coarse = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_BLOCK_SIZE):
+            block = self.codes[start:start + SCAN_BLOCK_SIZE]
+            coarse[start:start + len(block)] = block.astype(np.float32) @ query
+        if self.scales is not None:
+            coarse *= self.scales
+
+        shortlist = [r['corpus_id'] for r in _top_k(coarse, np.arange(len(coarse)), top_k * rescore_factor)]
+        shortlist = np.sort(np.asarray(shortlist, dtype=np.int64)) # Sorted rows read each memory map sequentially
+        scores = (self.full_vectors[shortlist] @ query) / self.norms[shortlist]
+        return _top_k(scores, shortlist, top_k)
+
+def embeddings_fingerprint(embeddings) -> str:
+    """Hash of the exact embedding matrix an IVF index was built for; names its saved file."""
+    embeddings = as_blocks(embeddings)
+    digest = hashlib.sha256(str(embeddings.shape).encode("utf-8"))
+    for _, block in embeddings.iter_blocks():
+        digest.update(memoryview(np.ascontiguousarray(block, dtype=np.float32)).cast("B"))
+    return digest.hexdigest()
+
+def evict_index_files(index_dir=INDEX_DIR, max_bytes=INDEX_CACHE_MAX_BYTES, keep=None):
+    """Deletes the least recently used index files (by mtime, refreshed on load) until `index_dir` fits in `max_bytes`."""
+    files = []
+    # Every finished file counts, including full-precision vector files older versions wrote here
+    for path in Path(index_dir).glob("*.np[yz]"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue # Evicted by another process meanwhile
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files, key=lambda f: f[0]):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+
+def build_index(embeddings, kind="exact", index_dir=INDEX_DIR):
+    """
+    Builds the vector index used by the search step: "exact", "ivf", or a quantized store ("int8",
+    "float16"). IVF index files are persisted under `index_dir`, keyed by a fingerprint of the
+    embeddings, and reused on later runs over the same corpus; the directory is kept under
+    INDEX_CACHE_MAX_BYTES by evicting the least recently used ones.
+    """
+    if kind == "exact":
+        return ExactIndex(embeddings)
+    if kind in ("int8", "float16"):
+        return QuantizedIndex.build(embeddings, kind)
+    if kind != "ivf":
+        raise ValueError(f"Unknown vector index kind: '{kind}'")
+    if len(embeddings) < IVF_MIN_VECTORS:
+        return ExactIndex(embeddings)
+
+    index_path = Path(index_dir) / f"{embeddings_fingerprint(embeddings)}.ivf.npz"
+    if index_path.is_file():
+        try:
+            os.utime(index_path) # Marks the file as recently used
+            return IVFIndex.load(index_path, embeddings)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  - Warning: Rebuilding unreadable index {index_path.name}: {e}")
+
+    index = IVFIndex.build(embeddings)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    index.save(index_path)
+    evict_index_files(index_dir, keep=index_path)
+    return index
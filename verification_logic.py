@@ -0,0 +1,278 @@
+# verification_logic.py
+
+import math
+import multiprocessing
+import time
+import numpy as np
+
+from cpu_budget import allocate
+import pipeline_profiler
+
+# --- CONFIGURATION ---
+# Search hits at or above this cosine score are accepted without asking the LLM, e.g. 0.80 (None: every hit is verified)
+AUTO_ACCEPT_SCORE = None
+# Search hits below this cosine score are rejected without asking the LLM, e.g. 0.15 (None: every hit is verified)
+AUTO_REJECT_SCORE = None
+# Minimum P("Yes") for the logit scorer to call a section relevant
+LLM_RELEVANCE_THRESHOLD = 0.5
+# Spellings whose first token counts as a "Yes" / "No" answer
+YES_ANSWERS = ["Yes", " Yes", "yes", " yes"]
+NO_ANSWERS = ["No", " No", "no", " no"]
+
+class VerificationScheduler:
+    """
+    Decides which search hits are relevant while spending as few LLM calls as possible.
+    Hits are taken in rank order; if auto-accept or auto-reject thresholds are set (both are off by
+    default), hits whose similarity score is beyond them are decided without the LLM. The rest are
+    passed to `verify_batch` (in groups of `batch_size`), and scheduling stops as soon as
+    `num_required` hits are accepted.
+    With `cached_verdicts`, hits verified in an earlier run reuse their verdict instead.
+    """
+
+    def __init__(self, verify_batch, num_required, accept_score=AUTO_ACCEPT_SCORE, reject_score=AUTO_REJECT_SCORE, batch_size=1,
+                 cached_verdicts=None):
+        # verify_batch(list_of_search_results) -> list of booleans, one per result
+        self.verify_batch = verify_batch
+        # cached_verdicts(list_of_search_results) -> list of stored booleans, None where there is none
+        self.cached_verdicts = cached_verdicts
+        self.num_required = num_required
+        self.accept_score = accept_score
+        self.reject_score = reject_score
+        self.batch_size = max(batch_size, 1)
+        self.stats = {"llm_calls": 0, "cached": 0, "auto_accepted": 0, "auto_rejected": 0, "not_needed": 0}
+
+    def _pre_decide(self, result):
+        """Returns True/False for hits decided by score alone, None for hits that need the LLM."""
+        if self.accept_score is not None and result['score'] >= self.accept_score:
+            return True
+        if self.reject_score is not None and result['score'] < self.reject_score:
+            return False
+        return None
+
+    def run(self, search_results):
+        """
+        Returns (result, is_relevant, decided_by) for every hit that was decided, in rank order,
+        where `decided_by` is "llm", "cache" or "score". Hits after the last needed one are left out.
+        """
+        decisions = []
+        accepted = 0
+        pending = []
+
+        def flush():
+            nonlocal accepted
+            cached = self.cached_verdicts(list(pending)) if self.cached_verdicts else [None] * len(pending)
+            missing = [result for result, verdict in zip(pending, cached) if verdict is None]
+            fresh = iter(self.verify_batch(missing) if missing else [])
+            # Only the hits that reach `verify_batch` cost an LLM call
+            self.stats["llm_calls"] += len(missing)
+            self.stats["cached"] += len(pending) - len(missing)
+            for result, verdict in zip(pending, cached):
+                is_relevant, decided_by = (next(fresh), "llm") if verdict is None else (verdict, "cache")
+                decisions.append((result, bool(is_relevant), decided_by))
+                accepted += bool(is_relevant)
+            pending.clear()
+
+        for position, result in enumerate(search_results):
+            if accepted >= self.num_required:
+                self.stats["not_needed"] += len(search_results) - position
+                break
+
+            verdict = self._pre_decide(result)
+            if verdict is None:
+                pending.append(result)
+                # Only ask for as many verdicts as could still be needed
+                if len(pending) >= min(self.batch_size, self.num_required - accepted):
+                    flush()
+                continue
+
+            if pending:
+                flush()
+                if accepted >= self.num_required:
+                    self.stats["not_needed"] += len(search_results) - position
+                    break
+            self.stats["auto_accepted" if verdict else "auto_rejected"] += 1
+            decisions.append((result, verdict, "score"))
+            accepted += verdict
+        else:
+            if pending:
+                flush()
+
+        return decisions
+
+    @property
+    def skipped_llm_calls(self):
+        return self.stats["cached"] + self.stats["auto_accepted"] + self.stats["auto_rejected"] + self.stats["not_needed"]
+
+class YesNoScorer:
+    """
+    Scores prompts as P("Yes") from one forward pass of a `llama_cpp.Llama` model instead of
+    generating an answer. The fixed prompt prefix is evaluated once; every `score` call rewinds the
+    model to the end of that prefix, so its KV cache is reused and only the per-chunk suffix is
+    evaluated. The next-token logits of the "Yes" and "No" tokens are compared directly.
+    """
+
+    def __init__(self, llm, prefix: str):
+        import llama_cpp
+        self._get_logits = llama_cpp.llama_get_logits
+        self.llm = llm
+        self.prefix = prefix
+        self.prefix_tokens = llm.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+        self.yes_ids = self._first_token_ids(YES_ANSWERS)
+        self.no_ids = self._first_token_ids(NO_ANSWERS)
+        self.stats = {"calls": 0, "items": 0, "prefix_tokens": len(self.prefix_tokens), "suffix_tokens": 0, "seconds": 0.0}
+
+        llm.reset()
+        llm.eval(self.prefix_tokens)
+
+    def _first_token_ids(self, answers):
+        return sorted({self.llm.tokenize(a.encode("utf-8"), add_bos=False)[0] for a in answers})
+
+    def _tokenize(self, text):
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+
+    def _eval_from(self, position, tokens):
+        """Evaluates `tokens` after the first `position` tokens of the context; returns P("Yes") for the next token."""
+        # Rewinding n_tokens makes the next eval() drop the KV cells past `position` and reuse the rest,
+        # the same mechanism Llama.generate uses for prompt-prefix matching
+        self.llm.n_tokens = position
+        self.llm.eval(tokens)
+        logits = np.ctypeslib.as_array(self._get_logits(self.llm.ctx), shape=(self.llm.n_vocab(),))
+        yes = _logsumexp(logits[self.yes_ids])
+        no = _logsumexp(logits[self.no_ids])
+        return 1.0 / (1.0 + math.exp(no - yes))
+
+    def _record(self, start, tokens, items):
+        seconds = time.perf_counter() - start
+        self.stats["calls"] += 1
+        self.stats["items"] += items
+        self.stats["suffix_tokens"] += tokens
+        self.stats["seconds"] += seconds
+        # Forward passes over the suffix only; the answer is read from the logits, nothing is generated
+        pipeline_profiler.record("llm_call", mode="logits", prompt_tokens=tokens, generated_tokens=0, seconds=seconds, items=items)
+
+    def score(self, suffix: str) -> float:
+        """Returns P("Yes") for prefix + suffix, renormalized over the Yes/No tokens."""
+        start = time.perf_counter()
+        suffix_tokens = self._tokenize(suffix)
+        max_suffix = self.llm.n_ctx() - len(self.prefix_tokens)
+        if len(suffix_tokens) > max_suffix:
+            # Keep the end of the prompt (question and assistant tag) when an excerpt overflows the context
+            suffix_tokens = suffix_tokens[-max_suffix:]
+        p_yes = self._eval_from(len(self.prefix_tokens), suffix_tokens)
+        self._record(start, len(suffix_tokens), 1)
+        return p_yes
+
+    def score_many(self, shared: str, questions: list[str]) -> list[float]:
+        """
+        Returns P("Yes") for each of prefix + shared + question: `shared` (e.g. several excerpts) is
+        evaluated once after the prefix, and every question only adds its own tokens after it.
+        """
+        start = time.perf_counter()
+        shared_tokens = self._tokenize(shared)
+        question_tokens = [self._tokenize(q) for q in questions]
+        max_shared = self.llm.n_ctx() - len(self.prefix_tokens) - max(len(q) for q in question_tokens)
+        if len(shared_tokens) > max_shared:
+            shared_tokens = shared_tokens[-max_shared:]
+
+        self.llm.n_tokens = len(self.prefix_tokens)
+        self.llm.eval(shared_tokens)
+        position = len(self.prefix_tokens) + len(shared_tokens)
+        p_yes = [self._eval_from(position, tokens) for tokens in question_tokens]
+        self._record(start, len(shared_tokens) + sum(len(q) for q in question_tokens), len(questions))
+        return p_yes
+
+def _logsumexp(values):
+    peak = float(np.max(values))
+    return peak + math.log(float(np.sum(np.exp(values - peak))))
+
+# --- Parallel verification across llama.cpp worker processes ---
+
+_worker_llm = None
+_worker_scorer = None
+
+def _init_llm_worker(model_path, n_ctx, n_threads):
+    """Pool initializer: every worker process holds its own model instance."""
+    global _worker_llm
+    import llama_cpp
+    _worker_llm = llama_cpp.Llama(
+        model_path=model_path,
+        n_ctx=n_ctx,
+        n_threads=n_threads,
+        n_threads_batch=n_threads,
+        n_gpu_layers=0,
+        verbose=False
+    )
+
+def _verify_in_worker(task):
+    """
+    Verifies one prompt in a worker; returns (P(yes) or None, verdict, prompt tokens evaluated,
+    generated tokens, seconds).
+    """
+    global _worker_scorer
+    mode, prefix, suffix = task
+    start = time.perf_counter()
+    if mode == "logits":
+        # A worker keeps the scorer (and its evaluated prefix) until a request with another prefix arrives
+        if _worker_scorer is None or _worker_scorer.prefix != prefix:
+            _worker_scorer = YesNoScorer(_worker_llm, prefix)
+        tokens_before = _worker_scorer.stats["suffix_tokens"]
+        p_yes = _worker_scorer.score(suffix)
+        tokens = _worker_scorer.stats["suffix_tokens"] - tokens_before
+        return p_yes, p_yes >= LLM_RELEVANCE_THRESHOLD, tokens, 0, time.perf_counter() - start
+
+    _worker_scorer = None # generate() moves the context away from the cached prefix
+    output = _worker_llm(prefix + suffix, max_tokens=8, temperature=0.0, stop=["</s>", "\n"])
+    verdict = 'yes' in output['choices'][0]['text'].strip().lower()
+    return None, verdict, output['usage']['prompt_tokens'], output['usage']['completion_tokens'], time.perf_counter() - start
+
+class LLMWorkerPool:
+    """
+    Runs LLM verification in `num_workers` processes, each with its own llama.cpp model using
+    `threads_per_worker` threads. Prompts are fanned out to the workers and results come back in
+    the order they were submitted (i.e. rank order).
+    """
+
+    def __init__(self, model_path, n_ctx, num_workers, threads_per_worker=None):
+        self.model_path = model_path
+        self.num_workers = max(num_workers, 1)
+        self._vocab = None
+        self.threads_per_worker = threads_per_worker or allocate("llm_threads", num_workers=self.num_workers)
+        self.stats = {"calls": 0, "prompt_tokens": 0, "seconds": 0.0}
+        # Spawned (not forked) workers: they only import this module, not torch or the embedding model
+        self.pool = multiprocessing.get_context("spawn").Pool(
+            processes=self.num_workers,
+            initializer=_init_llm_worker,
+            initargs=(model_path, n_ctx, self.threads_per_worker)
+        )
+
+    def verify(self, mode, prefix, suffixes):
+        """Returns [(P(yes) or None, verdict)] for each suffix, in input order."""
+        results = self.pool.map(_verify_in_worker, [(mode, prefix, s) for s in suffixes], chunksize=1)
+        for _, _, tokens, generated_tokens, seconds in results:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += tokens
+            self.stats["seconds"] += seconds
+            pipeline_profiler.record("llm_call", mode=mode, prompt_tokens=tokens, generated_tokens=generated_tokens,
+                                     seconds=seconds, items=1, worker=True)
+        return [(p_yes, verdict) for p_yes, verdict, _, _, _ in results]
+
+    def tokenize(self, text: bytes, add_bos=True, special=False):
+        """Tokenizes like `Llama.tokenize`, with a vocabulary-only copy of the model in this process."""
+        if self._vocab is None:
+            import llama_cpp
+            self._vocab = llama_cpp.Llama(model_path=self.model_path, vocab_only=True, verbose=False)
+        return self._vocab.tokenize(text, add_bos=add_bos, special=special)
+
+    def close(self):
+        """Lets the workers finish and exit; the pool cannot verify anything afterwards."""
+        self.pool.close()
+        self.pool.join()
+        if self._vocab is not None:
+            self._vocab.close()
+            self._vocab = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()